@@ -0,0 +1,91 @@
+"""
+Account Snapshot Cache - short-lived cache of MetaTrader account info and positions
+
+Account info and open positions are fetched together in one broker call and
+served from memory for ACCOUNT_SNAPSHOT_TTL seconds. Concurrent requests for
+the same account share one fetch, and any order or close on the account
+invalidates its snapshot immediately.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+# How long a snapshot is served from memory (seconds)
+ACCOUNT_SNAPSHOT_TTL = float(os.getenv("ACCOUNT_SNAPSHOT_TTL", "0.5"))
+
+class AccountSnapshotCache:
+    """Per-account cache of {"account": ..., "positions": ...} snapshots"""
+
+    def __init__(self, ttl: float = ACCOUNT_SNAPSHOT_TTL):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds a snapshot stays valid
+        """
+        self.ttl = ttl
+        self._snapshots: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, account_id: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Get the snapshot of an account.
+
+        Args:
+            account_id: The account identifier
+            fetch: Coroutine function returning {"success", "account", "positions"}
+
+        Returns:
+            The snapshot (failed fetches are returned but never cached)
+        """
+        cached = self._snapshots.get(account_id)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self.hits += 1
+            return cached[1]
+
+        inflight = self._inflight.get(account_id)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        generation = self._generations.get(account_id, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[account_id] = future
+        try:
+            snapshot = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when no other request awaited it
+            future.exception()
+            raise
+        else:
+            future.set_result(snapshot)
+            # Only store the snapshot if the account was not modified meanwhile
+            if snapshot.get("success", False) and self._generations.get(account_id, 0) == generation:
+                self._snapshots[account_id] = (time.monotonic(), snapshot)
+            return snapshot
+        finally:
+            if self._inflight.get(account_id) is future:
+                del self._inflight[account_id]
+
+    def invalidate(self, account_id: str) -> None:
+        """Drop the snapshot of an account after an order, close or reconnect"""
+        self._generations[account_id] = self._generations.get(account_id, 0) + 1
+        self._snapshots.pop(account_id, None)
+        self._inflight.pop(account_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._snapshots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,199 @@
+"""
+Firebase ID token cache
+
+Verified tokens are kept in a bounded LRU cache until their `exp` claim, so
+repeat requests with the same token skip signature verification. Tokens are
+verified with google-auth against Google's signing certificates, which are
+fetched through an HTTP cache that a background thread keeps warm so a
+verification miss does not wait on a certificate download.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import cachecontrol
+import firebase_admin
+import google.auth.transport.requests
+import google.oauth2.id_token
+import requests
+
+# Maximum number of cached tokens
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# How often the signing certificates are refreshed (seconds)
+AUTH_KEY_REFRESH_INTERVAL = float(os.getenv("AUTH_KEY_REFRESH_INTERVAL", "600"))
+
+# Certificates signing Firebase ID tokens and the issuer prefix of the tokens
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+class TokenCache:
+    """Bounded LRU cache of decoded ID token claims, valid until each token's expiry"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of tokens kept in memory
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.verify_count = 0
+        self.verify_seconds = 0.0
+        self.verify_max_seconds = 0.0
+        self.key_refreshes = 0
+        self.key_refresh_errors = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Get cached claims for a token, or None if missing or expired"""
+        with self._lock:
+            claims = self._entries.get(token)
+            if claims is None:
+                self.misses += 1
+                return None
+            if claims.get("exp", 0) <= time.time():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache the claims of a verified token"""
+        if claims.get("exp", 0) <= time.time():
+            return
+        with self._lock:
+            self._entries[token] = claims
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_verify(self, seconds: float) -> None:
+        """Record the latency of a full token verification"""
+        with self._lock:
+            self.verify_count += 1
+            self.verify_seconds += seconds
+            self.verify_max_seconds = max(self.verify_max_seconds, seconds)
+
+    def record_key_refresh(self, success: bool) -> None:
+        """Count a signing certificate refresh"""
+        with self._lock:
+            if success:
+                self.key_refreshes += 1
+            else:
+                self.key_refresh_errors += 1
+
+    def clear(self) -> None:
+        """Remove all cached tokens"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache and verification metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "verify_count": self.verify_count,
+                "verify_avg_ms": (self.verify_seconds / self.verify_count * 1000) if self.verify_count else 0.0,
+                "verify_max_ms": self.verify_max_seconds * 1000,
+                "key_refreshes": self.key_refreshes,
+                "key_refresh_errors": self.key_refresh_errors
+            }
+
+token_cache = TokenCache()
+
+# HTTP transport caching the signing certificates according to their Cache-Control headers
+_cert_request = google.auth.transport.requests.Request(session=cachecontrol.CacheControl(requests.Session()))
+
+def _verify(token: str) -> Dict[str, Any]:
+    """
+    Verify a Firebase ID token's signature, expiry, audience, issuer and subject.
+
+    Returns:
+        The token's claims, with `uid` set to the subject like the Admin SDK does
+
+    Raises:
+        ValueError: If the token is invalid or no Firebase project ID is configured
+    """
+    project_id = firebase_admin.get_app().project_id
+    if not project_id:
+        raise ValueError("Firebase project ID is not configured")
+
+    claims = google.oauth2.id_token.verify_token(
+        token, _cert_request, audience=project_id, certs_url=ID_TOKEN_CERT_URL
+    )
+    if claims.get("iss") != ID_TOKEN_ISSUER_PREFIX + project_id:
+        raise ValueError(f"Token has incorrect issuer: {claims.get('iss')}")
+    subject = claims.get("sub")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise ValueError("Token has an invalid subject")
+    claims["uid"] = subject
+    return claims
+
+def verify_and_cache(token: str) -> Dict[str, Any]:
+    """
+    Verify a Firebase ID token and cache its claims.
+
+    Raises whatever verification raises for invalid tokens; failures are
+    never cached.
+    """
+    start = time.perf_counter()
+    try:
+        claims = _verify(token)
+    finally:
+        token_cache.record_verify(time.perf_counter() - start)
+    token_cache.put(token, claims)
+    return claims
+
+def verify_id_token(token: str) -> Dict[str, Any]:
+    """Verify a Firebase ID token, using the cache for tokens seen before"""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    return verify_and_cache(token)
+
+def refresh_signing_keys() -> bool:
+    """
+    Fetch Google's ID token signing certificates through the verification HTTP cache.
+
+    The certificates are cached according to their Cache-Control headers;
+    fetching them here keeps that cache warm so verification misses do not
+    block on a download.
+    """
+    try:
+        response = _cert_request(ID_TOKEN_CERT_URL, method="GET")
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        token_cache.record_key_refresh(True)
+        return True
+    except Exception as e:
+        token_cache.record_key_refresh(False)
+        print(f"Error refreshing Firebase signing keys: {str(e)}")
+        return False
+
+_refresh_thread = None
+
+def start_key_refresh(interval: float = AUTH_KEY_REFRESH_INTERVAL) -> None:
+    """Refresh the signing certificates now and then every `interval` seconds"""
+    global _refresh_thread
+    if _refresh_thread and _refresh_thread.is_alive():
+        return
+
+    def run():
+        while True:
+            refresh_signing_keys()
+            time.sleep(interval)
+
+    _refresh_thread = threading.Thread(target=run, name="firebase-key-refresh", daemon=True)
+    _refresh_thread.start()
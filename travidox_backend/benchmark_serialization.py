@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Serialization benchmark for the Travidox API
+
+Compares FastAPI's default response path (jsonable_encoder + json.dumps) with
+FastJSONResponse (orjson) for payloads shaped like each endpoint's response.
+
+Usage:
+    python benchmark_serialization.py [--symbols 5000] [--history 2000] [--repeat 20]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from responses import FastJSONResponse
+
+def make_symbols(count):
+    """Build a /symbols payload with `count` symbols"""
+    categories = ["forex", "crypto", "index", "commodity", "stock", "other"]
+    return [
+        {
+            "name": f"SYM{i:05d}",
+            "description": f"Synthetic symbol number {i}",
+            "base_currency": "USD",
+            "profit_currency": "EUR",
+            "digits": 5,
+            "trade_mode": "4",
+            "spread": 12,
+            "tick_size": 0.00001,
+            "volume_min": 0.01,
+            "volume_max": 200.0,
+            "volume_step": 0.01,
+            "category": categories[i % len(categories)]
+        }
+        for i in range(count)
+    ]
+
+def make_positions(count):
+    """Build a /virtual-positions payload with `count` positions"""
+    return {
+        "success": True,
+        "positions": [
+            {
+                "position_id": f"pos_{i}",
+                "user_id": "benchmark-user",
+                "symbol": "EURUSD",
+                "order_type": "BUY" if i % 2 else "SELL",
+                "volume": 0.1,
+                "open_price": 1.08123,
+                "current_price": 1.08456,
+                "stop_loss": None,
+                "take_profit": None,
+                "profit_loss": 3.33,
+                "closed": False,
+                "open_time": datetime.now().isoformat(),
+                "created_at": time.time(),
+                "updated_at": time.time()
+            }
+            for i in range(count)
+        ]
+    }
+
+def make_history(count):
+    """Build a /virtual-history payload with `count` closed trades"""
+    return {
+        "success": True,
+        "history": [
+            {
+                "user_id": "benchmark-user",
+                "position_id": f"pos_{i}",
+                "symbol": "GBPUSD",
+                "order_type": "BUY",
+                "volume": 0.5,
+                "open_price": 1.26712,
+                "close_price": 1.26801,
+                "profit_loss": 4.45,
+                "open_time": datetime.now().isoformat(),
+                "close_time": time.time(),
+                "created_at": time.time()
+            }
+            for i in range(count)
+        ]
+    }
+
+def make_account():
+    """Build a /virtual-account payload"""
+    return {
+        "success": True,
+        "account": {
+            "balance": 1000.0,
+            "equity": 1012.5,
+            "margin": 10.8,
+            "free_margin": 989.2,
+            "margin_level": 0.0,
+            "floating_pnl": 12.5,
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat()
+        }
+    }
+
+def default_render(payload):
+    """FastAPI's default path for endpoints returning plain dicts/lists"""
+    return JSONResponse(jsonable_encoder(payload)).body
+
+def fast_render(payload):
+    """Endpoints returning FastJSONResponse directly"""
+    return FastJSONResponse(payload).body
+
+def time_call(func, payload, repeat):
+    """Return the best per-call time in milliseconds over `repeat` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payload)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    """Run the benchmark and print a table of results"""
+    parser = argparse.ArgumentParser(description="Benchmark API response serialization")
+    parser.add_argument('--symbols', type=int, default=5000, help='Number of symbols in the /symbols payload')
+    parser.add_argument('--history', type=int, default=2000, help='Number of trades in the /virtual-history payload')
+    parser.add_argument('--positions', type=int, default=100, help='Number of positions in the /virtual-positions payload')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed runs per endpoint')
+    args = parser.parse_args()
+
+    payloads = {
+        "/symbols": make_symbols(args.symbols),
+        "/virtual-history": make_history(args.history),
+        "/virtual-positions": make_positions(args.positions),
+        "/virtual-account": make_account()
+    }
+
+    print(f"{'Endpoint':<22}{'Size (KB)':>12}{'Default (ms)':>15}{'orjson (ms)':>14}{'Speedup':>10}")
+    print("-" * 73)
+    for endpoint, payload in payloads.items():
+        assert json.loads(default_render(payload)) == json.loads(fast_render(payload))
+
+        size_kb = len(fast_render(payload)) / 1024
+        default_ms = time_call(default_render, payload, args.repeat)
+        fast_ms = time_call(fast_render, payload, args.repeat)
+        print(f"{endpoint:<22}{size_kb:>12.1f}{default_ms:>15.3f}{fast_ms:>14.3f}{default_ms / fast_ms:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
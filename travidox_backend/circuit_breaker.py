@@ -0,0 +1,142 @@
+"""
+Circuit Breaker - fast-fail wrapper for external dependencies
+
+A breaker opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures of its
+dependency (VPS host, Firestore, Alpha Vantage). While open, calls fail fast
+(or callers serve fallback data) instead of waiting for the dependency to
+time out. After CIRCUIT_RECOVERY_TIMEOUT seconds one probe call is let
+through (half-open); its success closes the breaker, its failure reopens it.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Consecutive failures that open a breaker
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Seconds a breaker stays open before letting a probe through
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit is open"""
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker"""
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Dependency name, used in errors and metrics
+            failure_threshold: Consecutive failures that open the breaker
+            recovery_timeout: Seconds to wait before probing an open dependency
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go to the dependency now.
+
+        Callers that get True must report the outcome with record_success()
+        or record_failure().
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                # Let exactly one probe through
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        """Report a successful call"""
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self._probing = False
+
+    def record_failure(self, error: Optional[Exception] = None) -> None:
+        """Report a failed call"""
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if error is not None:
+                self.last_error = str(error)
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call func through the breaker.
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get breaker metrics"""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+            "last_error": self.last_error
+        }
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get or create the breaker of a dependency"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+def all_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """Get the metrics of every breaker"""
+    return {name: breaker.stats() for name, breaker in list(_breakers.items())}
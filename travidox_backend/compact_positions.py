@@ -0,0 +1,29 @@
+"""
+Closed Position Compaction
+
+One-off job that moves closed virtual positions out of the open-position
+store (Firestore `virtual_positions` and local virtual_positions.json) into
+the closed-position archive. New closes are archived automatically; this
+only migrates data written before that.
+"""
+
+from dotenv import load_dotenv
+
+def main():
+    """Compact the Firestore store when Firestore is configured, and always the local store"""
+    # Load environment variables before the database module reads them
+    load_dotenv()
+
+    from db import db, firestore_db, simple_db
+
+    if db:
+        moved = firestore_db.compact_closed_positions()
+        print(f"✅ Firestore: moved {moved} closed positions from virtual_positions to closed_virtual_positions")
+    else:
+        print("⚠️ Firestore is not configured; only local storage is compacted")
+
+    moved = simple_db.compact_closed_positions()
+    print(f"✅ Local storage: moved {moved} closed positions from virtual_positions.json to closed_positions.json")
+
+if __name__ == "__main__":
+    main()
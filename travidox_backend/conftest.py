@@ -0,0 +1,27 @@
+"""
+Shared pytest fixtures
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """The FastAPI app module, for endpoint tests with TestClient"""
+    # MetaTrader5 only exists on Windows and is only used in DEV_MODE
+    try:
+        import MetaTrader5  # noqa: F401
+    except ImportError:
+        sys.modules["MetaTrader5"] = types.ModuleType("MetaTrader5")
+
+    # Importing main creates its local stores in the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("main"))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
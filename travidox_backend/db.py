@@ -1,10 +1,20 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+import functools
 import json
 import os
+import threading
 import time
+import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+from circuit_breaker import get_breaker
+from fallback_outbox import FallbackOutbox, OutboxReplayer
+from responses import json_fields
+from instrumentation import instrument_methods
+from position_replica import POSITION_REPLICA_ENABLED, ReplicaManager
+from user_account_cache import UserAccountCache
 
 # Initialize Firebase Admin SDK if not already initialized
 if not firebase_admin._apps:
@@ -24,8 +34,54 @@ db = firestore.client() if firebase_admin._apps else None
 users_collection = "users"
 virtual_accounts_collection = "virtual_accounts"
 virtual_positions_collection = "virtual_positions"
+# Closed positions are moved here so the open-position collection only holds open ones
+closed_virtual_positions_collection = "closed_virtual_positions"
 trading_history_collection = "trading_history"
 
+# Batched close attempts; each retry drops the positions another request closed first
+CLOSE_BATCH_ATTEMPTS = 3
+
+# Account fields replayed as increments when fallback writes are synced to Firestore
+# (equity and floating_pnl are derived from prices and written as absolutes, so they are replayed as sets)
+account_balance_fields = ("balance", "margin", "free_margin")
+
+# Firestore calls share one circuit breaker; while it is open FirestoreDB
+# serves the SimpleDB fallback without waiting for Firestore to fail
+firestore_breaker = get_breaker("firestore")
+_firestore_call_state = threading.local()
+
+def firestore_call(method):
+    """Run a FirestoreDB method through the Firestore circuit breaker
+    
+    The method's error handler reports Firestore errors with _firestore_failed.
+    Calls nested in another FirestoreDB method (same thread) are part of the
+    same breaker call.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(_firestore_call_state, "active", False):
+            return method(self, *args, **kwargs)
+        
+        if not self.db or not firestore_breaker.allow():
+            return getattr(self.fallback, method.__name__)(*args, **kwargs)
+        
+        _firestore_call_state.active = True
+        _firestore_call_state.failed = False
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception as e:
+            # Not handled by the method: still report it, so a half-open probe is released
+            if not _firestore_call_state.failed:
+                firestore_breaker.record_failure(e)
+            raise
+        finally:
+            _firestore_call_state.active = False
+        
+        if not _firestore_call_state.failed:
+            firestore_breaker.record_success()
+        return result
+    return wrapper
+
 # Firebase Firestore database class
 class FirestoreDB:
     """Firebase Firestore database for virtual trading"""
@@ -33,23 +89,71 @@ class FirestoreDB:
     def __init__(self):
         """Initialize FirestoreDB with Firestore client"""
         self.db = db
-        self.fallback = SimpleDB()
+        # Fallback writes are recorded in the outbox and replayed once Firestore recovers
+        self.outbox = FallbackOutbox() if db else None
+        self.fallback = SimpleDB(outbox=self.outbox)
+        self.outbox_replayer = OutboxReplayer(self.outbox, db, firestore_breaker) if db else None
+        # Listener replicas of active users' open positions and accounts
+        self.replicas = ReplicaManager(db, virtual_positions_collection, virtual_accounts_collection) if db and POSITION_REPLICA_ENABLED else None
+    
+    def _firestore_failed(self, error: Exception) -> None:
+        """Report a Firestore error to the circuit breaker"""
+        _firestore_call_state.failed = True
+        firestore_breaker.record_failure(error)
     
+    def _note_write(self, user_id: str, write_results, positions: bool = True, account: bool = False) -> None:
+        """Report a write to the user's replica so the next read includes it"""
+        if self.replicas:
+            self.replicas.note_write(user_id, write_results, positions=positions, account=account)
+    
+    @firestore_call
+    def get_user_account(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get the MetaTrader account linked to a user"""
+        if not self.db:
+            return self.fallback.get_user_account(user_id)
+        
+        try:
+            user_doc = self.db.collection(users_collection).document(user_id).get()
+            return user_doc.to_dict().get("mt_account") if user_doc.exists else None
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error getting Firestore user account: {e}")
+            return self.fallback.get_user_account(user_id)
+    
+    @firestore_call
+    def set_user_account(self, user_id: str, account_data: Dict[str, Any]) -> bool:
+        """Link a MetaTrader account to a user"""
+        if not self.db:
+            return self.fallback.set_user_account(user_id, account_data)
+        
+        try:
+            user_ref = self.db.collection(users_collection).document(user_id)
+            user_ref.set({"mt_account": account_data}, merge=True)
+            return True
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error setting Firestore user account: {e}")
+            return self.fallback.set_user_account(user_id, account_data)
+    
+    @firestore_call
     def get_virtual_account(self, user_id: str) -> Dict[str, Any]:
         """Get user's virtual trading account"""
         if not self.db:
             return self.fallback.get_virtual_account(user_id)
         
         try:
+            if self.replicas:
+                account_data = self.replicas.get_account(user_id)
+                if account_data is not None:
+                    return account_data
+            
             account_ref = self.db.collection(virtual_accounts_collection).document(user_id)
             account_doc = account_ref.get()
             
             if account_doc.exists:
                 account_data = account_doc.to_dict()
                 # Convert any Sentinel objects to strings to make it JSON serializable
-                for key, value in list(account_data.items()):
-                    if not isinstance(value, (str, int, float, bool, list, dict)) or value is None:
-                        account_data[key] = str(value)
+                json_fields(account_data)
                 return account_data
             
             # Create default account with $1000 if it doesn't exist
@@ -63,12 +167,14 @@ class FirestoreDB:
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat()
             }
-            account_ref.set(default_account)
+            self._note_write(user_id, account_ref.set(default_account), positions=False, account=True)
             return default_account
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error getting Firestore virtual account: {e}")
             return self.fallback.get_virtual_account(user_id)
     
+    @firestore_call
     def update_virtual_account(self, user_id: str, data: Dict[str, Any]) -> bool:
         """Update user's virtual trading account"""
         if not self.db:
@@ -77,12 +183,35 @@ class FirestoreDB:
         try:
             data["updated_at"] = datetime.now().isoformat()
             account_ref = self.db.collection(virtual_accounts_collection).document(user_id)
-            account_ref.set(data, merge=True)
+            self._note_write(user_id, account_ref.set(data, merge=True), positions=False, account=True)
             return True
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error updating Firestore virtual account: {e}")
             return self.fallback.update_virtual_account(user_id, data)
     
+    @firestore_call
+    def adjust_virtual_account(self, user_id: str, deltas: Dict[str, float]) -> bool:
+        """Add amounts to balance fields of a user's virtual account
+        
+        The amounts are applied as Firestore increments, so concurrent orders
+        and closes do not overwrite each other's balance and margin changes.
+        """
+        if not self.db:
+            return self.fallback.adjust_virtual_account(user_id, deltas)
+        
+        try:
+            data = {field: firestore.Increment(delta) for field, delta in deltas.items()}
+            data["updated_at"] = datetime.now().isoformat()
+            account_ref = self.db.collection(virtual_accounts_collection).document(user_id)
+            self._note_write(user_id, account_ref.set(data, merge=True), positions=False, account=True)
+            return True
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error adjusting Firestore virtual account: {e}")
+            return self.fallback.adjust_virtual_account(user_id, deltas)
+    
+    @firestore_call
     def add_virtual_position(self, user_id: str, position_data: Dict[str, Any]) -> str:
         """Add a new virtual position for a user"""
         if not self.db:
@@ -98,19 +227,51 @@ class FirestoreDB:
             
             # Store the Firestore document ID in the position data
             position_data["position_id"] = position_ref.id
-            position_ref.update({"position_id": position_ref.id})
+            self._note_write(user_id, position_ref.update({"position_id": position_ref.id}))
             
             return position_ref.id
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error adding Firestore virtual position: {e}")
             return self.fallback.add_virtual_position(user_id, position_data)
     
+    @firestore_call
+    def add_virtual_positions(self, user_id: str, positions: List[Dict[str, Any]]) -> List[str]:
+        """Add several virtual positions for a user in one batched write"""
+        if not self.db:
+            return self.fallback.add_virtual_positions(user_id, positions)
+        
+        try:
+            batch = self.db.batch()
+            position_ids = []
+            for position_data in positions:
+                position_ref = self.db.collection(virtual_positions_collection).document()
+                position_data["created_at"] = datetime.now().isoformat()
+                position_data["updated_at"] = datetime.now().isoformat()
+                position_data["user_id"] = user_id
+                position_data["position_id"] = position_ref.id
+                batch.set(position_ref, position_data)
+                position_ids.append(position_ref.id)
+            
+            self._note_write(user_id, batch.commit())
+            return position_ids
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error adding Firestore virtual positions: {e}")
+            return self.fallback.add_virtual_positions(user_id, positions)
+    
+    @firestore_call
     def get_virtual_positions(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all virtual positions for a user"""
         if not self.db:
             return self.fallback.get_virtual_positions(user_id)
         
         try:
+            if self.replicas:
+                positions = self.replicas.get_positions(user_id)
+                if positions is not None:
+                    return positions
+            
             positions_ref = self.db.collection(virtual_positions_collection).where("user_id", "==", user_id).where("closed", "==", False)
             positions = positions_ref.stream()
             
@@ -118,54 +279,128 @@ class FirestoreDB:
             for pos in positions:
                 pos_dict = pos.to_dict()
                 # Convert any Sentinel objects to strings to make it JSON serializable
-                for key, value in list(pos_dict.items()):
-                    if not isinstance(value, (str, int, float, bool, list, dict)) or value is None:
-                        pos_dict[key] = str(value)
+                json_fields(pos_dict)
                 result.append(pos_dict)
             
             return result
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error getting Firestore virtual positions: {e}")
             return self.fallback.get_virtual_positions(user_id)
     
-    def close_virtual_position(self, user_id: str, position_id: str, close_price: float, profit_loss: float) -> bool:
-        """Close a virtual position and update account balance"""
+    @firestore_call
+    def get_virtual_position(self, user_id: str, position_id: str) -> Optional[Dict[str, Any]]:
+        """Get one open virtual position of a user (None if missing, closed or not the user's)"""
         if not self.db:
-            return self.fallback.close_virtual_position(user_id, position_id, close_price, profit_loss)
+            return self.fallback.get_virtual_position(user_id, position_id)
         
         try:
-            # Get position
-            position_ref = self.db.collection(virtual_positions_collection).document(position_id)
-            position_doc = position_ref.get()
+            if self.replicas:
+                positions = self.replicas.get_positions(user_id)
+                if positions is not None:
+                    return next((pos for pos in positions if pos.get("position_id") == position_id), None)
             
+            position_doc = self.db.collection(virtual_positions_collection).document(position_id).get()
             if not position_doc.exists:
-                # Try to find by position_id field
-                positions_ref = self.db.collection(virtual_positions_collection).where("position_id", "==", position_id).limit(1)
-                positions = positions_ref.stream()
-                position_docs = list(positions)
-                
-                if not position_docs:
-                    return False
-                
-                position_ref = position_docs[0].reference
-                position = position_docs[0].to_dict()
-            else:
-                position = position_doc.to_dict()
+                return None
+            
+            position = position_doc.to_dict()
+            if position.get("user_id") != user_id or position.get("closed", False):
+                return None
             
-            # Check if position belongs to user
-            if position.get("user_id") != user_id:
+            # Convert any Sentinel objects to strings to make it JSON serializable
+            json_fields(position)
+            return position
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error getting Firestore virtual position: {e}")
+            return self.fallback.get_virtual_position(user_id, position_id)
+    
+    def close_virtual_position(self, user_id: str, position_id: str, close_price: float, profit_loss: float,
+                               position: Optional[Dict[str, Any]] = None) -> bool:
+        """Close a virtual position and update account balance
+        
+        Pass the open `position` (from get_virtual_position) to skip reading it
+        again; the close then costs one account read and one batched write.
+        """
+        if position is None:
+            position = self.get_virtual_position(user_id, position_id)
+            if position is None:
                 return False
+        
+        closes = [{"position": position, "close_price": close_price, "profit_loss": profit_loss}]
+        return position_id in self.close_virtual_positions(user_id, closes)
+    
+    @firestore_call
+    def close_virtual_positions(self, user_id: str, closes: List[Dict[str, Any]]) -> List[str]:
+        """
+        Close several virtual positions in one batched write.
+        
+        Each entry of `closes` holds the open "position" (as returned by
+        get_virtual_positions), its "close_price" and "profit_loss". The account
+        is updated once for the whole batch, with increments so concurrent
+        closes and orders do not overwrite each other's balance changes.
+        Positions already closed by another request are left out and the
+        others are still closed.
+        
+        Returns:
+            IDs of the closed positions
+        """
+        if not self.db:
+            return self.fallback.close_virtual_positions(user_id, closes)
+        
+        try:
+            remaining = closes
+            for _ in range(CLOSE_BATCH_ATTEMPTS):
+                try:
+                    return self._commit_closes(user_id, remaining)
+                except (NotFound, FailedPrecondition) as e:
+                    # A position was closed by another request and nothing was written:
+                    # drop the positions that are gone and close the rest
+                    refs = [self.db.collection(virtual_positions_collection).document(close["position"]["position_id"])
+                            for close in remaining]
+                    still_open = {snapshot.id for snapshot in self.db.get_all(refs) if snapshot.exists}
+                    remaining = [close for close in remaining if close["position"]["position_id"] in still_open]
+                    print(f"Firestore virtual positions already closed, retrying with {len(remaining)}: {e}")
+                    if not remaining:
+                        return []
+            return []
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error closing Firestore virtual positions: {e}")
+            return self.fallback.close_virtual_positions(user_id, closes)
+    
+    def _commit_closes(self, user_id: str, closes: List[Dict[str, Any]]) -> List[str]:
+        """Archive, delete and record the closes and update the account in one batch
+        
+        Raises NotFound / FailedPrecondition (and writes nothing) if any of the
+        positions was already closed.
+        """
+        batch = self.db.batch()
+        profit_loss_total = 0.0
+        margin_released = 0.0
+        closed_ids = []
+        
+        for close in closes:
+            position = close["position"]
+            position_id = position["position_id"]
+            close_price = close["close_price"]
+            profit_loss = close["profit_loss"]
             
-            # Mark position as closed
-            position_ref.update({
+            # Move the position to the closed-position archive
+            batch.set(self.db.collection(closed_virtual_positions_collection).document(position_id), {
+                **position,
                 "closed": True,
                 "close_price": close_price,
                 "profit_loss": profit_loss,
                 "closed_at": datetime.now().isoformat()
             })
+            # Fails the whole batch if the position was closed in the meantime
+            batch.delete(self.db.collection(virtual_positions_collection).document(position_id), option=self.db.write_option(exists=True))
             
             # Add to history
-            history_data = {
+            history_ref = self.db.collection(trading_history_collection).document()
+            batch.set(history_ref, {
                 "user_id": user_id,
                 "position_id": position_id,
                 "symbol": position.get("symbol"),
@@ -175,24 +410,74 @@ class FirestoreDB:
                 "close_price": close_price,
                 "profit_loss": profit_loss,
                 "open_time": position.get("open_time") or position.get("created_at"),
-                "close_time": datetime.now().isoformat()
-            }
-            
-            self.add_trading_history(user_id, history_data)
-            
-            # Update account balance
-            account = self.get_virtual_account(user_id)
-            account["balance"] = account.get("balance", 1000.0) + profit_loss
-            account["equity"] = account["balance"]
-            account["margin"] = max(0, account.get("margin", 0.0) - (position.get("volume", 0.0) * position.get("open_price", 0.0) * 0.01))
-            account["free_margin"] = account["balance"] - account["margin"]
+                "close_time": datetime.now().isoformat(),
+                "created_at": datetime.now().isoformat()
+            })
             
-            self.update_virtual_account(user_id, account)
-            return True
+            profit_loss_total += profit_loss
+            margin_released += position.get("volume", 0.0) * position.get("open_price", 0.0) * 0.01
+            closed_ids.append(position_id)
+        
+        # Update account balance
+        batch.set(self.db.collection(virtual_accounts_collection).document(user_id), {
+            "balance": firestore.Increment(profit_loss_total),
+            "equity": firestore.Increment(profit_loss_total),
+            "margin": firestore.Increment(-margin_released),
+            "free_margin": firestore.Increment(profit_loss_total + margin_released),
+            "updated_at": datetime.now().isoformat()
+        }, merge=True)
+        
+        self._note_write(user_id, batch.commit(), account=True)
+        return closed_ids
+    
+    @firestore_call
+    def get_closed_positions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get the archived closed positions of a user"""
+        if not self.db:
+            return self.fallback.get_closed_positions(user_id)
+        
+        try:
+            positions_ref = self.db.collection(closed_virtual_positions_collection).where("user_id", "==", user_id)
+            return [pos.to_dict() for pos in positions_ref.stream()]
         except Exception as e:
-            print(f"Error closing Firestore virtual position: {e}")
-            return self.fallback.close_virtual_position(user_id, position_id, close_price, profit_loss)
+            self._firestore_failed(e)
+            print(f"Error getting Firestore closed positions: {e}")
+            return self.fallback.get_closed_positions(user_id)
     
+    @firestore_call
+    def compact_closed_positions(self) -> int:
+        """Move closed positions still in the open-position collection to the archive
+        
+        Returns the number of positions moved.
+        """
+        if not self.db:
+            return self.fallback.compact_closed_positions()
+        
+        try:
+            moved = 0
+            closed_ref = self.db.collection(virtual_positions_collection).where("closed", "==", True)
+            batch = self.db.batch()
+            pending = 0
+            for position_doc in closed_ref.stream():
+                batch.set(self.db.collection(closed_virtual_positions_collection).document(position_doc.id), position_doc.to_dict())
+                batch.delete(position_doc.reference)
+                pending += 1
+                # Firestore batches hold at most 500 writes (2 per position)
+                if pending == 250:
+                    batch.commit()
+                    moved += pending
+                    batch = self.db.batch()
+                    pending = 0
+            if pending:
+                batch.commit()
+                moved += pending
+            return moved
+        except Exception as e:
+            self._firestore_failed(e)
+            print(f"Error compacting Firestore closed positions: {e}")
+            raise
+    
+    @firestore_call
     def add_trading_history(self, user_id: str, history_data: Dict[str, Any]) -> str:
         """Add a new trading history entry for a user"""
         if not self.db:
@@ -206,9 +491,11 @@ class FirestoreDB:
             history_ref.set(history_data)
             return history_ref.id
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error adding Firestore trading history: {e}")
             return self.fallback.add_trading_history(user_id, history_data)
     
+    @firestore_call
     def get_trading_history(self, user_id: str) -> List[Dict[str, Any]]:
         """Get trading history for a user"""
         if not self.db:
@@ -219,9 +506,11 @@ class FirestoreDB:
             history = history_ref.stream()
             return [hist.to_dict() for hist in history]
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error getting Firestore trading history: {e}")
             return self.fallback.get_trading_history(user_id)
     
+    @firestore_call
     def update_virtual_position(self, user_id: str, position_id: str, data: Dict[str, Any]) -> bool:
         """Update a virtual position for a user"""
         if not self.db:
@@ -251,9 +540,10 @@ class FirestoreDB:
                     return False
             
             # Update position
-            position_ref.update(data)
+            self._note_write(user_id, position_ref.update(data))
             return True
         except Exception as e:
+            self._firestore_failed(e)
             print(f"Error updating Firestore virtual position: {e}")
             return self.fallback.update_virtual_position(user_id, position_id, data)
 
@@ -261,18 +551,25 @@ class FirestoreDB:
 class SimpleDB:
     """Simple file-based database for development"""
     
-    def __init__(self, db_file: str = None):
-        """Initialize SimpleDB with database file"""
+    def __init__(self, db_file: str = None, outbox: Optional[FallbackOutbox] = None):
+        """Initialize SimpleDB with database file
+        
+        When SimpleDB is the Firestore fallback, `outbox` records its writes
+        for replay to Firestore.
+        """
+        self.outbox = outbox
         self.accounts_file = "virtual_accounts.json"
         self.positions_file = "virtual_positions.json"
         self.history_file = "trading_history.json"
+        self.closed_positions_file = "closed_positions.json"
+        self.users_file = "user_accounts.json"
         
         # Ensure database files exist
         self._ensure_db_files()
     
     def _ensure_db_files(self):
         """Ensure database files exist"""
-        for file_name in [self.accounts_file, self.positions_file, self.history_file]:
+        for file_name in [self.accounts_file, self.positions_file, self.history_file, self.closed_positions_file, self.users_file]:
             if not os.path.exists(file_name):
                 with open(file_name, 'w') as f:
                     json.dump({}, f)
@@ -281,15 +578,49 @@ class SimpleDB:
         """Load data from file"""
         try:
             with open(file_name, 'r') as f:
-                    return json.load(f)
+                return json.load(f)
         except:
-        return {}
+            return {}
     
     def _save_data(self, file_name: str, data: Dict[str, Any]) -> None:
         """Save data to file"""
         with open(file_name, 'w') as f:
             json.dump(data, f, indent=2)
     
+    def _record(self, user_id: str, op: str, collection: str, doc_id: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Record a write in the outbox (only when used as the Firestore fallback)"""
+        if self.outbox:
+            self.outbox.add(user_id, op, collection, doc_id, data)
+    
+    def _record_account_change(self, user_id: str, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        """Record an account write, with balance fields as increments of what changed"""
+        if not self.outbox:
+            return
+        
+        deltas = {}
+        fields = {}
+        for key, value in after.items():
+            if key in account_balance_fields and key in before and isinstance(value, (int, float)) and isinstance(before[key], (int, float)):
+                delta = value - before[key]
+                if delta:
+                    deltas[key] = delta
+            elif before.get(key) != value:
+                fields[key] = value
+        self._record(user_id, "increment", virtual_accounts_collection, user_id, {"deltas": deltas, "fields": fields})
+    
+    def get_user_account(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get the MetaTrader account linked to a user"""
+        users = self._load_data(self.users_file)
+        return users.get(user_id, {}).get("mt_account")
+    
+    def set_user_account(self, user_id: str, account_data: Dict[str, Any]) -> bool:
+        """Link a MetaTrader account to a user"""
+        users = self._load_data(self.users_file)
+        users.setdefault(user_id, {})["mt_account"] = account_data
+        self._save_data(self.users_file, users)
+        self._record(user_id, "set", users_collection, user_id, {"mt_account": account_data})
+        return True
+    
     def get_virtual_account(self, user_id: str) -> Dict[str, Any]:
         """Get user's virtual trading account"""
         accounts = self._load_data(self.accounts_file)
@@ -307,6 +638,7 @@ class SimpleDB:
                 "updated_at": time.time()
             }
             self._save_data(self.accounts_file, accounts)
+            self._record(user_id, "create", virtual_accounts_collection, user_id, accounts[user_id])
         
         return accounts.get(user_id, {})
     
@@ -324,10 +656,27 @@ class SimpleDB:
                 "floating_pnl": 0.0
             }
         
+        before = dict(accounts[user_id])
         accounts[user_id].update(data)
         accounts[user_id]["updated_at"] = time.time()
         
         self._save_data(self.accounts_file, accounts)
+        self._record_account_change(user_id, before, accounts[user_id])
+        return True
+    
+    def adjust_virtual_account(self, user_id: str, deltas: Dict[str, float]) -> bool:
+        """Add amounts to balance fields of a user's virtual account"""
+        accounts = self._load_data(self.accounts_file)
+        account = accounts.get(user_id) or self.get_virtual_account(user_id)
+        
+        before = dict(account)
+        for field, delta in deltas.items():
+            account[field] = account.get(field, 0.0) + delta
+        account["updated_at"] = time.time()
+        accounts[user_id] = account
+        
+        self._save_data(self.accounts_file, accounts)
+        self._record_account_change(user_id, before, account)
         return True
     
     def add_virtual_position(self, user_id: str, position_data: Dict[str, Any]) -> str:
@@ -337,8 +686,8 @@ class SimpleDB:
         if user_id not in positions:
             positions[user_id] = []
         
-        # Generate position ID
-        position_id = f"pos_{len(positions[user_id]) + 1}"
+        # Generate position ID (unique even though closed positions leave the list)
+        position_id = f"pos_{uuid.uuid4().hex[:12]}"
         position_data["position_id"] = position_id
         position_data["created_at"] = time.time()
         position_data["updated_at"] = time.time()
@@ -346,9 +695,34 @@ class SimpleDB:
         
         positions[user_id].append(position_data)
         self._save_data(self.positions_file, positions)
+        self._record(user_id, "create", virtual_positions_collection, position_id, position_data)
         
         return position_id
     
+    def add_virtual_positions(self, user_id: str, positions: List[Dict[str, Any]]) -> List[str]:
+        """Add several virtual positions for a user with a single file write"""
+        all_positions = self._load_data(self.positions_file)
+        
+        if user_id not in all_positions:
+            all_positions[user_id] = []
+        
+        position_ids = []
+        for position_data in positions:
+            # Generate position ID (unique even though closed positions leave the list)
+            position_id = f"pos_{uuid.uuid4().hex[:12]}"
+            position_data["position_id"] = position_id
+            position_data["created_at"] = time.time()
+            position_data["updated_at"] = time.time()
+            position_data["user_id"] = user_id
+            
+            all_positions[user_id].append(position_data)
+            position_ids.append(position_id)
+        
+        self._save_data(self.positions_file, all_positions)
+        for position_data in positions:
+            self._record(user_id, "create", virtual_positions_collection, position_data["position_id"], position_data)
+        return position_ids
+    
     def get_virtual_positions(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all virtual positions for a user"""
         positions = self._load_data(self.positions_file)
@@ -357,58 +731,128 @@ class SimpleDB:
         # Filter out closed positions
         return [pos for pos in user_positions if not pos.get("closed", False)]
     
-    def close_virtual_position(self, user_id: str, position_id: str, close_price: float, profit_loss: float) -> bool:
+    def get_virtual_position(self, user_id: str, position_id: str) -> Optional[Dict[str, Any]]:
+        """Get one open virtual position of a user"""
+        return next((pos for pos in self.get_virtual_positions(user_id) if pos.get("position_id") == position_id), None)
+    
+    def close_virtual_position(self, user_id: str, position_id: str, close_price: float, profit_loss: float,
+                               position: Optional[Dict[str, Any]] = None) -> bool:
         """Close a virtual position and update account balance"""
+        closes = [{"position": position or {"position_id": position_id}, "close_price": close_price, "profit_loss": profit_loss}]
+        return position_id in self.close_virtual_positions(user_id, closes)
+    
+    def close_virtual_positions(self, user_id: str, closes: List[Dict[str, Any]]) -> List[str]:
+        """Close several virtual positions, loading and saving each file once"""
         positions = self._load_data(self.positions_file)
-        user_positions = positions.get(user_id, [])
+        history = self._load_data(self.history_file)
+        accounts = self._load_data(self.accounts_file)
+        closed_positions = self._load_data(self.closed_positions_file)
         
-        position = None
-        position_index = None
+        user_positions = {pos.get("position_id"): pos for pos in positions.get(user_id, [])}
+        user_closed_positions = closed_positions.setdefault(user_id, [])
+        user_history = history.setdefault(user_id, [])
+        account = accounts.setdefault(user_id, {
+            "balance": 1000.0,
+            "equity": 1000.0,
+            "margin": 0.0,
+            "free_margin": 1000.0,
+            "margin_level": 0.0,
+            "floating_pnl": 0.0
+        })
+        account_before = dict(account)
+        closed_ids = []
         
-        for i, pos in enumerate(user_positions):
-            if pos.get("position_id") == position_id:
-                position = pos
-                position_index = i
-                break
+        for close in closes:
+            position_id = close["position"].get("position_id")
+            position = user_positions.get(position_id)
+            if position is None or position.get("closed", False):
+                continue
+            
+            close_price = close["close_price"]
+            profit_loss = close["profit_loss"]
+            
+            # Mark position as closed
+            position["closed"] = True
+            position["close_price"] = close_price
+            position["profit_loss"] = profit_loss
+            position["closed_at"] = time.time()
+            user_closed_positions.append(position)
+            
+            # Add to history
+            history_id = uuid.uuid4().hex
+            user_history.append({
+                "history_id": history_id,
+                "user_id": user_id,
+                "position_id": position_id,
+                "symbol": position.get("symbol"),
+                "order_type": position.get("order_type"),
+                "volume": position.get("volume"),
+                "open_price": position.get("open_price"),
+                "close_price": close_price,
+                "profit_loss": profit_loss,
+                "open_time": position.get("open_time") or position.get("created_at"),
+                "close_time": time.time(),
+                "created_at": time.time()
+            })
+            
+            # Update account balance
+            account["balance"] = account.get("balance", 1000.0) + profit_loss
+            account["margin"] = max(0, account.get("margin", 0.0) - (position.get("volume", 0.0) * position.get("open_price", 0.0) * 0.01))
+            closed_ids.append(position_id)
         
-        if position is None:
-            return False
+        if closed_ids:
+            account["equity"] = account["balance"]
+            account["free_margin"] = account["balance"] - account["margin"]
+            account["updated_at"] = time.time()
+            
+            # Keep only open positions in the positions file
+            positions[user_id] = [pos for pos in positions.get(user_id, []) if not pos.get("closed", False)]
+            
+            self._save_data(self.positions_file, positions)
+            self._save_data(self.closed_positions_file, closed_positions)
+            self._save_data(self.history_file, history)
+            self._save_data(self.accounts_file, accounts)
+            
+            closed_by_id = {pos.get("position_id"): pos for pos in user_closed_positions}
+            history_by_position = {entry["position_id"]: entry for entry in user_history if "history_id" in entry}
+            for position_id in closed_ids:
+                self._record(user_id, "create", closed_virtual_positions_collection, position_id, closed_by_id[position_id])
+                self._record(user_id, "delete", virtual_positions_collection, position_id)
+                entry = history_by_position[position_id]
+                self._record(user_id, "create", trading_history_collection, entry["history_id"], entry)
+            self._record_account_change(user_id, account_before, account)
         
-        # Mark position as closed
-        position["closed"] = True
-        position["close_price"] = close_price
-        position["profit_loss"] = profit_loss
-        position["closed_at"] = time.time()
+        return closed_ids
+    
+    def get_closed_positions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get the archived closed positions of a user"""
+        closed_positions = self._load_data(self.closed_positions_file)
+        return closed_positions.get(user_id, [])
+    
+    def compact_closed_positions(self) -> int:
+        """Move closed positions still in the positions file to the archive
         
-        # Update positions file
-        positions[user_id][position_index] = position
-        self._save_data(self.positions_file, positions)
+        Returns the number of positions moved.
+        """
+        positions = self._load_data(self.positions_file)
+        closed_positions = self._load_data(self.closed_positions_file)
+        moved = 0
         
-        # Add to history
-        history_data = {
-            "user_id": user_id,
-            "position_id": position_id,
-            "symbol": position.get("symbol"),
-            "order_type": position.get("order_type"),
-            "volume": position.get("volume"),
-            "open_price": position.get("open_price"),
-            "close_price": close_price,
-            "profit_loss": profit_loss,
-            "open_time": position.get("open_time") or position.get("created_at"),
-            "close_time": time.time()
-        }
-        
-        self.add_trading_history(user_id, history_data)
+        for user_id, user_positions in positions.items():
+            open_positions = []
+            for position in user_positions:
+                if position.get("closed", False):
+                    closed_positions.setdefault(user_id, []).append(position)
+                    moved += 1
+                else:
+                    open_positions.append(position)
+            positions[user_id] = open_positions
         
-        # Update account balance
-        account = self.get_virtual_account(user_id)
-        account["balance"] = account.get("balance", 1000.0) + profit_loss
-        account["equity"] = account["balance"]
-        account["margin"] = max(0, account.get("margin", 0.0) - (position.get("volume", 0.0) * position.get("open_price", 0.0) * 0.01))
-        account["free_margin"] = account["balance"] - account["margin"]
+        if moved:
+            self._save_data(self.closed_positions_file, closed_positions)
+            self._save_data(self.positions_file, positions)
         
-        self.update_virtual_account(user_id, account)
-        return True
+        return moved
     
     def add_trading_history(self, user_id: str, history_data: Dict[str, Any]) -> str:
         """Add a new trading history entry for a user"""
@@ -418,10 +862,12 @@ class SimpleDB:
             history[user_id] = []
         
         history_data["created_at"] = time.time()
+        history_data["history_id"] = uuid.uuid4().hex
         history[user_id].append(history_data)
         
         self._save_data(self.history_file, history)
-        return "local_id"
+        self._record(user_id, "create", trading_history_collection, history_data["history_id"], history_data)
+        return history_data["history_id"]
     
     def get_trading_history(self, user_id: str) -> List[Dict[str, Any]]:
         """Get trading history for a user"""
@@ -446,10 +892,15 @@ class SimpleDB:
                 
                 # Save updated positions
                 self._save_data(self.positions_file, positions)
+                self._record(user_id, "set", virtual_positions_collection, position_id, {**data, "updated_at": positions[user_id][i]["updated_at"]})
                 return True
         
         return False
 
+# Count Firestore calls and JSON file reads/writes per request
+instrument_methods(FirestoreDB, "firestore")
+instrument_methods(SimpleDB, "json", ["_load_data", "_save_data"])
+
 # Create database instances
 firestore_db = FirestoreDB()
 simple_db = SimpleDB()
@@ -501,6 +952,19 @@ def update_user_data(user_id: str, data: Dict[str, Any]) -> bool:
         print(f"Error updating Firestore user data: {e}")
         return False
     
+# User -> MetaTrader account mapping, cached in memory and a shared local store
+user_account_cache = UserAccountCache()
+
+def get_user_account(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get the MetaTrader account linked to a user (cached)"""
+    return user_account_cache.get(user_id, firestore_db.get_user_account)
+
+def set_user_account(user_id: str, account_data: Dict[str, Any]) -> bool:
+    """Link a MetaTrader account to a user and update the cache"""
+    stored = firestore_db.set_user_account(user_id, account_data)
+    user_account_cache.set(user_id, account_data)
+    return stored
+
 # Virtual account functions that use FirestoreDB
 def get_virtual_account(user_id: str) -> Dict[str, Any]:
     """Get user's virtual trading account"""
@@ -510,17 +974,42 @@ def update_virtual_account(user_id: str, data: Dict[str, Any]) -> bool:
     """Update user's virtual trading account"""
     return firestore_db.update_virtual_account(user_id, data)
 
+def adjust_virtual_account(user_id: str, deltas: Dict[str, float]) -> bool:
+    """Add amounts to balance fields of a user's virtual account"""
+    return firestore_db.adjust_virtual_account(user_id, deltas)
+
 def add_virtual_position(user_id: str, position_data: Dict[str, Any]) -> str:
     """Add a new virtual position for a user"""
     return firestore_db.add_virtual_position(user_id, position_data)
 
+def add_virtual_positions(user_id: str, positions: List[Dict[str, Any]]) -> List[str]:
+    """Add several virtual positions for a user in one write"""
+    return firestore_db.add_virtual_positions(user_id, positions)
+
 def get_virtual_positions(user_id: str) -> List[Dict[str, Any]]:
     """Get all virtual positions for a user"""
     return firestore_db.get_virtual_positions(user_id)
 
-def close_virtual_position(user_id: str, position_id: str, close_price: float, profit_loss: float) -> bool:
+def get_virtual_position(user_id: str, position_id: str) -> Optional[Dict[str, Any]]:
+    """Get one open virtual position of a user"""
+    return firestore_db.get_virtual_position(user_id, position_id)
+
+def close_virtual_position(user_id: str, position_id: str, close_price: float, profit_loss: float,
+                           position: Optional[Dict[str, Any]] = None) -> bool:
     """Close a virtual position and update account balance"""
-    return firestore_db.close_virtual_position(user_id, position_id, close_price, profit_loss)
+    return firestore_db.close_virtual_position(user_id, position_id, close_price, profit_loss, position=position)
+
+def close_virtual_positions(user_id: str, closes: List[Dict[str, Any]]) -> List[str]:
+    """Close several virtual positions and update account balance once"""
+    return firestore_db.close_virtual_positions(user_id, closes)
+
+def get_closed_positions(user_id: str) -> List[Dict[str, Any]]:
+    """Get the archived closed positions of a user"""
+    return firestore_db.get_closed_positions(user_id)
+
+def compact_closed_positions() -> int:
+    """Move closed positions out of the open-position store into the archive"""
+    return firestore_db.compact_closed_positions()
 
 def add_trading_history(user_id: str, history_data: Dict[str, Any]) -> str:
     """Add a new trading history entry for a user"""
@@ -0,0 +1,173 @@
+"""
+Async database module - virtual trading reads and writes on the async Firestore client
+
+Mirrors the module-level API of db.py with coroutines, so FastAPI handlers
+can await independent reads (account, positions, history) concurrently
+with asyncio.gather instead of blocking a worker thread per round trip.
+
+Calls share the Firestore circuit breaker with db.py. While Firestore is
+unavailable, or when an async call fails, the call is served by the
+synchronous db layer (and its SimpleDB fallback) in a worker thread.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List
+
+import firebase_admin
+from firebase_admin import firestore, firestore_async
+from google.api_core.exceptions import NotFound
+
+from instrumentation import instrument_methods
+from responses import json_fields
+
+from db import (
+    firestore_db,
+    firestore_breaker,
+    virtual_accounts_collection,
+    virtual_positions_collection,
+    closed_virtual_positions_collection,
+    trading_history_collection
+)
+
+# Async Firestore client (Firebase is initialized by db.py)
+async_db = firestore_async.client() if firebase_admin._apps else None
+
+class AsyncFirestoreDB:
+    """Async Firebase Firestore database for virtual trading"""
+
+    def __init__(self):
+        """Initialize AsyncFirestoreDB with the async Firestore client"""
+        self.db = async_db
+        self.sync = firestore_db
+        self.replicas = firestore_db.replicas
+
+    async def _call(self, name: str, operation, *args):
+        """
+        Run an async Firestore operation through the circuit breaker.
+
+        Args:
+            name: Name of the equivalent FirestoreDB method
+            operation: Coroutine function doing the Firestore calls
+            *args: Arguments of the FirestoreDB method
+
+        Returns:
+            The operation result, or the sync db layer's result if Firestore
+            is unavailable or the operation failed
+        """
+        if not self.db or not firestore_breaker.allow():
+            return await asyncio.to_thread(getattr(self.sync, name), *args)
+
+        try:
+            result = await operation()
+        except Exception as e:
+            firestore_breaker.record_failure(e)
+            print(f"Error in async Firestore {name}: {e}")
+            # The sync layer retries through the breaker and falls back to SimpleDB + outbox
+            return await asyncio.to_thread(getattr(self.sync, name), *args)
+
+        firestore_breaker.record_success()
+        return result
+
+    async def get_virtual_account(self, user_id: str) -> Dict[str, Any]:
+        """Get user's virtual trading account"""
+        if self.replicas:
+            account_data = self.replicas.get_account(user_id, timeout=0)
+            if account_data is not None:
+                return account_data
+
+        async def operation():
+            account_doc = await self.db.collection(virtual_accounts_collection).document(user_id).get()
+            if not account_doc.exists:
+                return None
+            return json_fields(account_doc.to_dict())
+
+        account_data = await self._call("get_virtual_account", operation, user_id)
+        if account_data is None:
+            # New user: the sync layer creates the default account
+            account_data = await asyncio.to_thread(self.sync.get_virtual_account, user_id)
+        return account_data
+
+    async def update_virtual_account(self, user_id: str, data: Dict[str, Any]) -> bool:
+        """Update user's virtual trading account"""
+        async def operation():
+            data["updated_at"] = datetime.now().isoformat()
+            account_ref = self.db.collection(virtual_accounts_collection).document(user_id)
+            self.sync._note_write(user_id, await account_ref.set(data, merge=True), positions=False, account=True)
+            return True
+
+        return await self._call("update_virtual_account", operation, user_id, data)
+
+    async def get_virtual_positions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get all open virtual positions for a user"""
+        if self.replicas:
+            positions = self.replicas.get_positions(user_id, timeout=0)
+            if positions is not None:
+                return positions
+
+        async def operation():
+            positions_ref = self.db.collection(virtual_positions_collection).where("user_id", "==", user_id).where("closed", "==", False)
+            return [json_fields(pos.to_dict()) async for pos in positions_ref.stream()]
+
+        return await self._call("get_virtual_positions", operation, user_id)
+
+    async def update_virtual_position(self, user_id: str, position_id: str, data: Dict[str, Any]) -> bool:
+        """Update a virtual position for a user"""
+        async def operation():
+            data["updated_at"] = firestore.SERVER_TIMESTAMP
+            position_ref = self.db.collection(virtual_positions_collection).document(position_id)
+            try:
+                write_result = await position_ref.update(data)
+            except NotFound:
+                # Position stored under another document ID; the sync layer looks it up by field
+                return await asyncio.to_thread(self.sync.update_virtual_position, user_id, position_id, data)
+            self.sync._note_write(user_id, write_result)
+            return True
+
+        return await self._call("update_virtual_position", operation, user_id, position_id, data)
+
+    async def get_trading_history(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get trading history for a user"""
+        async def operation():
+            history_ref = self.db.collection(trading_history_collection).where("user_id", "==", user_id).order_by("created_at", direction=firestore.Query.DESCENDING)
+            return [hist.to_dict() async for hist in history_ref.stream()]
+
+        return await self._call("get_trading_history", operation, user_id)
+
+    async def get_closed_positions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get the archived closed positions of a user"""
+        async def operation():
+            positions_ref = self.db.collection(closed_virtual_positions_collection).where("user_id", "==", user_id)
+            return [pos.to_dict() async for pos in positions_ref.stream()]
+
+        return await self._call("get_closed_positions", operation, user_id)
+
+# Count async Firestore calls per request
+instrument_methods(AsyncFirestoreDB, "firestore")
+
+# Create database instance
+async_firestore_db = AsyncFirestoreDB()
+
+async def get_virtual_account(user_id: str) -> Dict[str, Any]:
+    """Get user's virtual trading account"""
+    return await async_firestore_db.get_virtual_account(user_id)
+
+async def update_virtual_account(user_id: str, data: Dict[str, Any]) -> bool:
+    """Update user's virtual trading account"""
+    return await async_firestore_db.update_virtual_account(user_id, data)
+
+async def get_virtual_positions(user_id: str) -> List[Dict[str, Any]]:
+    """Get all open virtual positions for a user"""
+    return await async_firestore_db.get_virtual_positions(user_id)
+
+async def update_virtual_position(user_id: str, position_id: str, data: Dict[str, Any]) -> bool:
+    """Update a virtual position for a user"""
+    return await async_firestore_db.update_virtual_position(user_id, position_id, data)
+
+async def get_trading_history(user_id: str) -> List[Dict[str, Any]]:
+    """Get trading history for a user"""
+    return await async_firestore_db.get_trading_history(user_id)
+
+async def get_closed_positions(user_id: str) -> List[Dict[str, Any]]:
+    """Get the archived closed positions of a user"""
+    return await async_firestore_db.get_closed_positions(user_id)
@@ -0,0 +1,388 @@
+"""
+Fallback Outbox - write-behind of local fallback writes to Firestore
+
+While Firestore is unavailable, FirestoreDB writes go to SimpleDB (local JSON
+files). SimpleDB records each of those writes in this outbox (a SQLite file
+shared by the workers on the machine) as a document mutation:
+
+- create: new document (positions, history entries, archived positions,
+  default accounts); skipped if the document already exists in Firestore,
+  so a batch replayed twice does not duplicate it
+- set: merge fields into a document; a conflict if Firestore changed the
+  document after the fallback write
+- delete: delete a document; same conflict rule as set
+- increment: the account's balance, margin and free margin are replayed as
+  increments of what the fallback changed, so outage P&L is added to the
+  Firestore balance instead of overwriting it; other fields of the write
+  (equity, floating P&L, ...) are merged as values
+
+Fallback writes are timestamped with the local clock and Firestore update
+times come from the server clock, so the replayer estimates the offset
+between the two from the read time of its own reads before comparing them.
+
+Once the Firestore circuit breaker lets calls through again, a background
+replayer applies pending entries in order, in batches. Conflicting entries
+are kept (status "conflict") for review and never overwrite Firestore.
+
+Each replayed entry writes a marker document in the same batch. Entries whose
+marker already exists are skipped, so a batch committed by a replayer that
+failed or died before completing the entries locally is not applied twice
+(increments in particular).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from firebase_admin import firestore
+
+# Outbox (SQLite file) shared by all backend workers
+FALLBACK_OUTBOX_PATH = os.getenv("FALLBACK_OUTBOX_PATH", "fallback_outbox.db")
+# Seconds between replay attempts
+OUTBOX_REPLAY_INTERVAL = float(os.getenv("OUTBOX_REPLAY_INTERVAL", "5"))
+# Entries replayed per Firestore batch (each entry also writes a marker; a batch holds at most 500 writes)
+OUTBOX_BATCH_SIZE = min(int(os.getenv("OUTBOX_BATCH_SIZE", "200")), 250)
+# Seconds after which entries claimed by a worker that died are replayed again
+OUTBOX_CLAIM_TIMEOUT = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "60"))
+# Firestore collection of replay markers (give it a TTL policy on expires_at)
+OUTBOX_MARKER_COLLECTION = os.getenv("OUTBOX_MARKER_COLLECTION", "fallback_outbox_replays")
+# Days a replay marker is kept
+OUTBOX_MARKER_TTL_DAYS = float(os.getenv("OUTBOX_MARKER_TTL_DAYS", "7"))
+
+PENDING = "pending"
+REPLAYING = "replaying"
+CONFLICT = "conflict"
+
+class FallbackOutbox:
+    """Durable, ordered log of fallback writes waiting to be replayed"""
+
+    def __init__(self, path: str = FALLBACK_OUTBOX_PATH):
+        """
+        Open the outbox.
+
+        Args:
+            path: SQLite file shared with the other workers
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode; claim() opens its own transaction
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, op TEXT NOT NULL, "
+                "collection TEXT NOT NULL, doc_id TEXT NOT NULL, data TEXT NOT NULL, "
+                "created_at REAL NOT NULL, status TEXT NOT NULL, claimed_at REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, id)")
+            # Random ID of this outbox file; with the entry ID it names the entry's replay marker
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('outbox_id', ?)", (uuid.uuid4().hex,))
+            self.outbox_id = self._conn.execute("SELECT value FROM meta WHERE key = 'outbox_id'").fetchone()[0]
+        self.recorded = 0
+        self.applied = 0
+        self.conflicts = 0
+        self.replay_batches = 0
+        self.replay_errors = 0
+        self.last_replay_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def add(self, user_id: Optional[str], op: str, collection: str, doc_id: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Record a fallback write.
+
+        Args:
+            user_id: Owner of the document
+            op: create, set, delete or increment
+            collection: Firestore collection
+            doc_id: Firestore document ID
+            data: Document fields (for increment: {"deltas": {...}, "fields": {...}})
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (user_id, op, collection, doc_id, data, created_at, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, op, collection, doc_id, json.dumps(data or {}, default=str), time.time(), PENDING)
+            )
+            self.recorded += 1
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Claim the oldest pending entries for replay.
+
+        Only one worker replays at a time, so writes to the same document are
+        applied in the order they were made; entries claimed by a worker that
+        died are claimed again after OUTBOX_CLAIM_TIMEOUT.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                busy = self._conn.execute(
+                    "SELECT 1 FROM outbox WHERE status = ? AND claimed_at >= ? LIMIT 1",
+                    (REPLAYING, now - OUTBOX_CLAIM_TIMEOUT)
+                ).fetchone()
+                if busy:
+                    self._conn.execute("COMMIT")
+                    return []
+                rows = self._conn.execute(
+                    "SELECT id, user_id, op, collection, doc_id, data, created_at FROM outbox "
+                    "WHERE status = ? OR (status = ? AND claimed_at < ?) ORDER BY id LIMIT ?",
+                    (PENDING, REPLAYING, now - OUTBOX_CLAIM_TIMEOUT, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, claimed_at = ? WHERE id = ?",
+                    [(REPLAYING, now, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return [
+            {
+                "id": row[0],
+                "user_id": row[1],
+                "op": row[2],
+                "collection": row[3],
+                "doc_id": row[4],
+                "data": json.loads(row[5]),
+                "created_at": row[6]
+            }
+            for row in rows
+        ]
+
+    def complete(self, applied: List[int], conflicts: List[Dict[str, Any]]) -> None:
+        """Remove applied entries and keep conflicting ones for review"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(entry_id,) for entry_id in applied])
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, error = ? WHERE id = ?",
+                [(CONFLICT, conflict["error"], conflict["id"]) for conflict in conflicts]
+            )
+            self._conn.execute("COMMIT")
+            self.applied += len(applied)
+            self.conflicts += len(conflicts)
+
+    def release(self, entry_ids: List[int], error: str) -> None:
+        """Return claimed entries to the queue after a failed replay"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, claimed_at = NULL, attempts = attempts + 1, error = ? WHERE id = ?",
+                [(PENDING, error, entry_id) for entry_id in entry_ids]
+            )
+            self.replay_errors += 1
+            self.last_error = error
+
+    def has_pending(self) -> bool:
+        """Whether any entry is waiting to be replayed"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE status IN (?, ?) LIMIT 1", (PENDING, REPLAYING)
+            ).fetchone()
+        return row is not None
+
+    def conflicted(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """List entries that were not replayed because of a conflict"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, op, collection, doc_id, data, created_at, error FROM outbox WHERE status = ? ORDER BY id LIMIT ?",
+                (CONFLICT, limit)
+            ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "user_id": row[1],
+                "op": row[2],
+                "collection": row[3],
+                "doc_id": row[4],
+                "data": json.loads(row[5]),
+                "created_at": row[6],
+                "error": row[7]
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get outbox metrics"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status IN (?, ?)", (PENDING, REPLAYING)
+            ).fetchone()[0]
+        return {
+            "pending": counts.get(PENDING, 0) + counts.get(REPLAYING, 0),
+            "conflicts_open": counts.get(CONFLICT, 0),
+            "oldest_pending_age": time.time() - oldest if oldest else 0.0,
+            "recorded": self.recorded,
+            "applied": self.applied,
+            "conflicts": self.conflicts,
+            "replay_batches": self.replay_batches,
+            "replay_errors": self.replay_errors,
+            "last_replay_at": self.last_replay_at,
+            "last_error": self.last_error
+        }
+
+def _clock_offset(snapshots, local_time: float) -> float:
+    """Estimate the server clock's offset from the local clock from the read time of snapshots"""
+    for snapshot in snapshots:
+        read_time = getattr(snapshot, "read_time", None)
+        if read_time is not None:
+            return read_time.timestamp() - local_time
+    return 0.0
+
+class OutboxReplayer:
+    """Replays outbox entries to Firestore whenever it is healthy"""
+
+    def __init__(self, outbox: FallbackOutbox, client, breaker, batch_size: int = OUTBOX_BATCH_SIZE):
+        """
+        Initialize the replayer.
+
+        Args:
+            outbox: The fallback outbox
+            client: Firestore client
+            breaker: Firestore circuit breaker (replays only run while it allows calls)
+            batch_size: Entries per Firestore batch
+        """
+        self.outbox = outbox
+        self.client = client
+        self.breaker = breaker
+        self.batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+        # Firestore update time of documents written by the replay itself, so
+        # later entries for the same document are not taken for conflicts
+        self._replayed: Dict[str, float] = {}
+
+    def replay_once(self) -> int:
+        """
+        Replay one batch of pending entries.
+
+        Returns:
+            Number of entries processed (applied or marked as conflicts)
+        """
+        if not self.client or not self.outbox.has_pending() or not self.breaker.allow():
+            return 0
+
+        entries = self.outbox.claim(self.batch_size)
+        if not entries:
+            # Nothing to replay, but the breaker let us through: report the probe as fine
+            self.breaker.record_success()
+            return 0
+
+        try:
+            applied, conflicts = self._apply(entries)
+        except Exception as e:
+            self.breaker.record_failure(e)
+            self.outbox.release([entry["id"] for entry in entries], str(e))
+            print(f"⚠️ Outbox replay failed, will retry: {e}")
+            return 0
+
+        self.breaker.record_success()
+        self.outbox.complete(applied, conflicts)
+        if not self.outbox.has_pending():
+            self._replayed.clear()
+        self.outbox.replay_batches += 1
+        self.outbox.last_replay_at = time.time()
+        if conflicts:
+            print(f"⚠️ Outbox replay: {len(conflicts)} conflicting writes kept for review")
+        return len(entries)
+
+    def _marker(self, entry: Dict[str, Any]):
+        """Reference of an entry's replay marker document"""
+        return self.client.collection(OUTBOX_MARKER_COLLECTION).document(f"{self.outbox.outbox_id}-{entry['id']}")
+
+    def _apply(self, entries: List[Dict[str, Any]]):
+        """Check entries for conflicts and commit the others in one batch"""
+        refs = {}
+        for entry in entries:
+            marker = self._marker(entry)
+            refs[marker.path] = marker
+            if entry["op"] != "increment":
+                ref = self.client.collection(entry["collection"]).document(entry["doc_id"])
+                refs[ref.path] = ref
+        # One round trip for the replay markers and the current state of every document the batch touches
+        requested_at = time.time()
+        snapshots = {snapshot.reference.path: snapshot for snapshot in self.client.get_all(list(refs.values()))}
+        # Server clock minus local clock, so local write times compare with Firestore update times
+        clock_offset = _clock_offset(snapshots.values(), (requested_at + time.time()) / 2)
+
+        batch = self.client.batch()
+        written = []
+        applied = []
+        conflicts = []
+        expires_at = datetime.now(timezone.utc) + timedelta(days=OUTBOX_MARKER_TTL_DAYS)
+        for entry in entries:
+            marker = self._marker(entry)
+            marker_snapshot = snapshots.get(marker.path)
+            if marker_snapshot is not None and marker_snapshot.exists:
+                # Committed by an earlier replay that did not complete the entry locally
+                applied.append(entry["id"])
+                continue
+
+            ref = self.client.collection(entry["collection"]).document(entry["doc_id"])
+            snapshot = snapshots.get(ref.path)
+            exists = snapshot is not None and snapshot.exists
+            op = entry["op"]
+
+            if op == "create" and exists:
+                applied.append(entry["id"])
+                continue
+            changed_after = max(entry["created_at"] + clock_offset, self._replayed.get(ref.path, 0.0))
+            if op in ("set", "delete") and exists and snapshot.update_time.timestamp() > changed_after:
+                conflicts.append({"id": entry["id"], "error": "Document changed in Firestore after the fallback write"})
+                continue
+
+            if op == "create":
+                batch.set(ref, entry["data"])
+            elif op == "set":
+                batch.set(ref, entry["data"], merge=True)
+            elif op == "delete":
+                batch.delete(ref)
+            elif op == "increment":
+                fields = dict(entry["data"].get("fields", {}))
+                for field, delta in entry["data"].get("deltas", {}).items():
+                    fields[field] = firestore.Increment(delta)
+                batch.set(ref, fields, merge=True)
+            else:
+                conflicts.append({"id": entry["id"], "error": f"Unknown outbox operation: {op}"})
+                continue
+            batch.set(marker, {"path": ref.path, "op": op, "expires_at": expires_at})
+            written.extend([ref.path, None])
+            applied.append(entry["id"])
+
+        if written:
+            results = batch.commit()
+            # Deletes come back without an update_time; every write of a batch is committed at the same time
+            commit_time = max(
+                (result.update_time.timestamp() for result in results if result.update_time is not None),
+                default=time.time() + clock_offset
+            )
+            for path in written:
+                if path is not None:
+                    self._replayed[path] = commit_time
+        return applied, conflicts
+
+    def start(self, interval: float = OUTBOX_REPLAY_INTERVAL) -> None:
+        """Replay pending entries now and then every `interval` seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    # Drain the backlog batch by batch while Firestore accepts writes
+                    while self.replay_once():
+                        pass
+                except Exception as e:
+                    print(f"⚠️ Outbox replay error: {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name="fallback-outbox-replay", daemon=True)
+        self._thread.start()
@@ -0,0 +1,195 @@
+"""
+Instrumentation - storage and dependency operations per request
+
+FirestoreDB / AsyncFirestoreDB methods, SimpleDB file loads and saves,
+VPSManager.execute_command and Alpha Vantage quote requests are wrapped so
+every call is counted, timed and traced. Counts are kept per request (the HTTP
+middleware opens a scope for each request) and in process totals.
+
+An operation repeated more than N_PLUS_ONE_THRESHOLD times in one request
+is logged as a likely N+1 access pattern. Tests can open their own scope
+with track_operations() and bound the counts with assert_max_operations().
+"""
+
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from metrics import dependency_latency
+from tracing import span
+
+# Add an X-Debug-Ops header with the operation counts to every response
+INSTRUMENTATION_HEADER = os.getenv("INSTRUMENTATION_HEADER", "false").lower() == "true"
+# Log every request's operation counts
+INSTRUMENTATION_LOG = os.getenv("INSTRUMENTATION_LOG", "false").lower() == "true"
+# Calls of the same operation in one request before an N+1 warning is logged
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+class OperationStats:
+    """Call counts and time per operation"""
+
+    def __init__(self, label: str = ""):
+        """
+        Initialize the counters.
+
+        Args:
+            label: What the operations belong to (e.g. "GET /virtual-positions")
+        """
+        self.label = label
+        self.operations: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self._warned = set()
+
+    def record(self, kind: str, name: str, seconds: float) -> int:
+        """Count one call and return how often the operation ran so far"""
+        with self._lock:
+            entry = self.operations.setdefault((kind, name), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            return entry[0]
+
+    def count(self, kind: Optional[str] = None, name: Optional[str] = None) -> int:
+        """Number of calls, optionally of one kind and/or operation"""
+        return sum(
+            entry[0] for (op_kind, op_name), entry in list(self.operations.items())
+            if (kind is None or op_kind == kind) and (name is None or op_name == name)
+        )
+
+    def totals(self) -> Dict[str, Dict[str, Any]]:
+        """Calls and seconds per kind"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for (kind, _), (count, seconds) in list(self.operations.items()):
+            total = totals.setdefault(kind, {"count": 0, "seconds": 0.0})
+            total["count"] += count
+            total["seconds"] += seconds
+        return totals
+
+    def summary(self) -> str:
+        """Compact per-kind summary, e.g. "firestore=3/12.5ms json=2/0.4ms" """
+        return " ".join(
+            f"{kind}={total['count']}/{total['seconds'] * 1000:.1f}ms"
+            for kind, total in sorted(self.totals().items())
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Calls and seconds per operation"""
+        return {
+            f"{kind}.{name}": {"count": count, "seconds": seconds}
+            for (kind, name), (count, seconds) in sorted(self.operations.items())
+        }
+
+# Operations of the current request (None outside a request)
+_current: contextvars.ContextVar = contextvars.ContextVar("request_operations", default=None)
+# Operations of the whole process
+process_operations = OperationStats("process")
+# Depth of instrumented calls per kind on this thread (nested calls count once)
+_depth = threading.local()
+
+def current_operations() -> Optional[OperationStats]:
+    """Get the operation counts of the current request"""
+    return _current.get()
+
+@contextmanager
+def track_operations(label: str = "") -> Iterator[OperationStats]:
+    """Count the operations run inside the block (and in threads started with its context)"""
+    stats = OperationStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+def record_operation(kind: str, name: str, seconds: float) -> None:
+    """Count one operation in the process totals, the latency histogram and the current request"""
+    process_operations.record(kind, name, seconds)
+    dependency_latency.observe(seconds, kind, name)
+    stats = _current.get()
+    if stats is None:
+        return
+
+    count = stats.record(kind, name, seconds)
+    if count > N_PLUS_ONE_THRESHOLD and (kind, name) not in stats._warned:
+        stats._warned.add((kind, name))
+        print(f"⚠️ Possible N+1: {kind}.{name} called more than {N_PLUS_ONE_THRESHOLD} times in {stats.label or 'one request'}")
+
+def instrumented(kind: str, name: Optional[str] = None):
+    """
+    Decorator counting and timing calls of a function.
+
+    Args:
+        kind: Operation kind (firestore, json, vps, alpha_vantage)
+        name: Operation name (defaults to the function name)
+
+    Each counted call also opens a trace span named <kind>.<name>. Calls
+    made while another call of the same kind is running on the same thread
+    (e.g. FirestoreDB methods calling each other) are not counted.
+    """
+    def decorator(func):
+        op_name = name or func.__name__
+        span_name = f"{kind}.{op_name}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    with span(span_name):
+                        return await func(*args, **kwargs)
+                finally:
+                    record_operation(kind, op_name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            depth = getattr(_depth, kind, 0)
+            if depth:
+                return func(*args, **kwargs)
+
+            setattr(_depth, kind, 1)
+            start = time.perf_counter()
+            try:
+                with span(span_name):
+                    return func(*args, **kwargs)
+            finally:
+                setattr(_depth, kind, 0)
+                record_operation(kind, op_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def instrument_methods(cls, kind: str, names: Optional[list] = None):
+    """
+    Wrap methods of a class with instrumented().
+
+    Args:
+        cls: The class
+        kind: Operation kind
+        names: Methods to wrap (default: the public methods defined on the class)
+    """
+    if names is None:
+        names = [
+            attr for attr, value in vars(cls).items()
+            if callable(value) and not attr.startswith("_")
+        ]
+    for attr in names:
+        setattr(cls, attr, instrumented(kind, attr)(getattr(cls, attr)))
+    return cls
+
+def assert_max_operations(stats: OperationStats, limit: int, kind: Optional[str] = None, name: Optional[str] = None) -> None:
+    """
+    Fail if more than `limit` operations ran (for tests).
+
+    Args:
+        stats: Counts from track_operations()
+        limit: Maximum allowed number of calls
+        kind: Only count this kind
+        name: Only count this operation
+    """
+    count = stats.count(kind, name)
+    if count > limit:
+        what = ".".join(part for part in (kind, name) if part) or "operations"
+        raise AssertionError(f"{what}: {count} calls, expected at most {limit}\n{stats.to_dict()}")
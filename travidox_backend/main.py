@@ -1,16 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException, Header
+from fastapi import FastAPI, Depends, HTTPException, Header, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import credentials
 import os
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 import json
-from db import db, get_virtual_account, get_virtual_positions, get_trading_history  # Import the database module
+import asyncio
+import secrets
+from datetime import datetime, timedelta
+from db import db, firestore_db, get_virtual_account, get_virtual_positions, get_trading_history, get_user_account, set_user_account, user_account_cache  # Import the database module
 from vps_manager import VPSManager, MetaTraderManager
+from vps_cluster import MetaTraderCluster
 import MetaTrader5 as mt5
 from market_data import get_market_data_provider  # Import the market data provider
+from responses import FastJSONResponse
+from auth_cache import token_cache, verify_and_cache, start_key_refresh
+from symbol_catalog import SymbolCatalog, etag_matches
+from vps_scripts.symbol_classifier import classify_symbol
+from mt5_executor import MT5Executor
+from account_snapshot import AccountSnapshotCache
+from order_queue import OrderQueue, QueueFullError
+from circuit_breaker import all_breaker_stats
+from instrumentation import INSTRUMENTATION_HEADER, INSTRUMENTATION_LOG, track_operations
+import metrics
+import time
+from tracing import TRACING_ENABLED, start_trace, end_trace
+from profiler import RequestProfiler, folded
 
 # Load environment variables
 try:
@@ -28,6 +47,11 @@ DEV_MT_PASSWORD = os.getenv("DEV_MT_PASSWORD", "Jayeoba@112")
 DEV_MT_SERVER = os.getenv("DEV_MT_SERVER", "Exness-MT5Trial10")
 DEV_MT_PLATFORM = os.getenv("DEV_MT_PLATFORM", "mt5")
 
+# Token for operator endpoints (sent as X-Admin-Token) and the X-Profile header; unset disables them
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+request_profiler = RequestProfiler(ADMIN_API_TOKEN)
+
 # Initialize Firebase Admin SDK
 cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "firebase-credentials.json")
 try:
@@ -52,20 +76,40 @@ if DEV_MODE:
         print("⚠️ WARNING: MetaTrader development credentials not fully provided.")
         print("Please set DEV_MT_LOGIN, DEV_MT_PASSWORD, and DEV_MT_SERVER in your .env file.")
     
-    # Initialize MT5 connection
-    if not mt5.initialize():
-        print(f"⚠️ WARNING: Failed to initialize MT5: {mt5.last_error()}")
-    else:
-        print("✅ MT5 initialized successfully")
+    # MT5 is initialized once, on the MT5 executor thread (see initialize_local_mt)
 else:
     # Production mode - Connect to VPS
     VPS_HOST = os.getenv("VPS_HOST")
+    # Comma-separated VPS hosts to shard accounts across (overrides VPS_HOST)
+    VPS_HOSTS = [host.strip() for host in os.getenv("VPS_HOSTS", "").split(",") if host.strip()]
     VPS_USERNAME = os.getenv("VPS_USERNAME")
     VPS_PASSWORD = os.getenv("VPS_PASSWORD")
     VPS_KEY_PATH = os.getenv("VPS_KEY_PATH")
     VPS_MT_SCRIPTS_DIR = os.getenv("VPS_MT_SCRIPTS_DIR", "~/mt_scripts")
+    VPS_USE_TERMINAL_POOL = os.getenv("VPS_USE_TERMINAL_POOL", "false").lower() == "true"
 
-    if VPS_HOST and VPS_USERNAME and (VPS_PASSWORD or VPS_KEY_PATH):
+    if VPS_HOSTS and VPS_USERNAME and (VPS_PASSWORD or VPS_KEY_PATH):
+        # Several hosts: accounts are sharded across them
+        managers = {}
+        for host in VPS_HOSTS:
+            try:
+                managers[host] = MetaTraderManager(
+                    vps_manager=VPSManager(
+                        host=host,
+                        username=VPS_USERNAME,
+                        password=VPS_PASSWORD,
+                        key_path=VPS_KEY_PATH
+                    ),
+                    mt_scripts_dir=VPS_MT_SCRIPTS_DIR,
+                    use_terminal_pool=VPS_USE_TERMINAL_POOL
+                )
+                print(f"Successfully connected to VPS at {host}")
+            except Exception as e:
+                print(f"Failed to connect to VPS at {host}: {str(e)}")
+        
+        if managers:
+            mt_manager = MetaTraderCluster(managers)
+    elif VPS_HOST and VPS_USERNAME and (VPS_PASSWORD or VPS_KEY_PATH):
         try:
             vps_manager = VPSManager(
                 host=VPS_HOST,
@@ -75,7 +119,8 @@ else:
             )
             mt_manager = MetaTraderManager(
                 vps_manager=vps_manager,
-                mt_scripts_dir=VPS_MT_SCRIPTS_DIR
+                mt_scripts_dir=VPS_MT_SCRIPTS_DIR,
+                use_terminal_pool=VPS_USE_TERMINAL_POOL
             )
             print(f"Successfully connected to VPS at {VPS_HOST}")
         except Exception as e:
@@ -92,7 +137,7 @@ except Exception as e:
     print(f"⚠️ WARNING: Failed to initialize trading bot: {str(e)}")
     trading_bot = None
 
-app = FastAPI(title="Travidox Backend API")
+app = FastAPI(title="Travidox Backend API", default_response_class=FastJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -103,6 +148,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def count_operations(request, call_next):
+    """Count storage, VPS and market data operations per request"""
+    with track_operations(f"{request.method} {request.url.path}") as operations:
+        response = await call_next(request)
+    
+    if INSTRUMENTATION_HEADER:
+        response.headers["X-Debug-Ops"] = operations.summary()
+    if INSTRUMENTATION_LOG and operations.operations:
+        print(f"📊 {operations.label}: {operations.summary()}")
+    return response
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    """Count requests and observe their latency per route template"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        metrics.http_requests.inc(route_path, request.method, str(status))
+        metrics.http_request_latency.observe(time.perf_counter() - start, route_path, request.method)
+
+async def trace_request(request, call_next):
+    """Trace the request stage by stage and return its trace ID in X-Trace-Id"""
+    # Continue the caller's trace if it sent a valid trace ID
+    trace_id = request.headers.get("X-Trace-Id")
+    if not trace_id or len(trace_id) != 32 or any(c not in "0123456789abcdef" for c in trace_id):
+        trace_id = None
+    
+    trace = start_trace(f"{request.method} {request.url.path}", trace_id)
+    try:
+        response = await call_next(request)
+        trace.root.set("status", response.status_code)
+        response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        if route is not None:
+            trace.root.name = f"{request.method} {route.path}"
+        end_trace(trace)
+
+if TRACING_ENABLED:
+    app.middleware("http")(trace_request)
+
+async def profile_request(request, call_next):
+    """Profile requests sent with the admin X-Profile header or picked by the sample rate"""
+    session = request_profiler.start(request.headers.get("X-Profile"))
+    if session is None:
+        return await call_next(request)
+    
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Profile-Id"] = session.profile_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        await run_in_threadpool(request_profiler.finish, session, request.method, route_path, request.url.path, status)
+
+if request_profiler.enabled:
+    app.middleware("http")(profile_request)
+
 class MetaTraderAccount(BaseModel):
     login: str
     password: str
@@ -116,6 +230,15 @@ class MarketOrder(BaseModel):
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
 
+class MarketOrderBatch(BaseModel):
+    orders: List[MarketOrder]
+
+class PositionFilter(BaseModel):
+    """Filters for closing several positions at once (all optional; none closes everything)"""
+    symbol: Optional[str] = None
+    side: Optional[Literal["BUY", "SELL"]] = None
+    profit: Optional[Literal["positive", "negative"]] = None
+
 class Symbol(BaseModel):
     """Model for trading symbol information"""
     name: str
@@ -131,15 +254,51 @@ class Symbol(BaseModel):
     volume_step: float
     category: str  # 'forex', 'crypto', 'index', 'commodity', 'stock', 'other'
 
+class VirtualHistoryEntry(BaseModel):
+    """Model for a closed virtual trade"""
+    position_id: Optional[str] = None
+    symbol: Optional[str] = None
+    order_type: Optional[str] = None
+    volume: Optional[float] = None
+    open_price: Optional[float] = None
+    close_price: Optional[float] = None
+    profit_loss: Optional[float] = None
+    open_time: Optional[Any] = None
+    close_time: Optional[Any] = None
+
+class VirtualHistoryResponse(BaseModel):
+    """Model for the /virtual-history response"""
+    success: bool
+    history: List[VirtualHistoryEntry] = []
+    error: Optional[str] = None
+
+class ProfilerSettings(BaseModel):
+    """Runtime profiler settings"""
+    sample_rate: float  # Fraction of requests profiled, 0 to 1
+
 # Local MetaTrader connection functions
+# These run on the MT5 executor thread only; use run_local_mt / read_local_mt to call them.
+def initialize_local_mt():
+    """Initialize the local MetaTrader terminal (called once by the MT5 executor)"""
+    if not mt5.initialize():
+        error = f"Failed to initialize MT5: {mt5.last_error()}"
+        print(f"⚠️ WARNING: {error}")
+        return False, error
+    print("✅ MT5 initialized successfully")
+    return True, None
+
+mt5_executor = MT5Executor(initialize_local_mt)
+
+async def run_local_mt(func, *args, **kwargs):
+    """Run a MetaTrader call that changes terminal state on the MT5 executor"""
+    return await asyncio.wrap_future(mt5_executor.submit(func, *args, **kwargs))
+
+async def read_local_mt(key, func, *args, **kwargs):
+    """Run a read-only MetaTrader call on the MT5 executor, coalescing identical reads"""
+    return await asyncio.wrap_future(mt5_executor.submit_read(key, func, *args, **kwargs))
+
 def connect_local_mt(login, password, server, platform="mt5"):
     """Connect to local MetaTrader terminal"""
-    if not mt5.initialize():
-        return {
-            "success": False,
-            "error": f"Failed to initialize MT5: {mt5.last_error()}"
-        }
-    
     # Connect to trading account
     authorized = mt5.login(
         login=int(login),
@@ -148,7 +307,6 @@ def connect_local_mt(login, password, server, platform="mt5"):
     )
     
     if not authorized:
-        mt5.shutdown()
         return {
             "success": False,
             "error": f"Failed to login: {mt5.last_error()}"
@@ -162,12 +320,6 @@ def connect_local_mt(login, password, server, platform="mt5"):
 
 def get_local_account_info(account_id):
     """Get account info from local MetaTrader terminal"""
-    if not mt5.initialize():
-        return {
-            "success": False,
-            "error": f"Failed to initialize MT5: {mt5.last_error()}"
-        }
-    
     # Get account information
     account_info = mt5.account_info()
     
@@ -180,8 +332,8 @@ def get_local_account_info(account_id):
     # Convert account info to dictionary
     info = {
         "login": account_info.login,
-        "name": mt5.account_info()._asdict().get('name', 'Unknown'),
-        "server": mt5.account_info()._asdict().get('server', 'Unknown'),
+        "name": getattr(account_info, "name", "Unknown"),
+        "server": getattr(account_info, "server", "Unknown"),
         "currency": account_info.currency,
         "leverage": f"1:{account_info.leverage}",
         "balance": account_info.balance,
@@ -198,12 +350,6 @@ def get_local_account_info(account_id):
 
 def get_local_symbols():
     """Get all available symbols from the local MetaTrader terminal"""
-    if not mt5.initialize():
-        return {
-            "success": False,
-            "error": f"Failed to initialize MT5: {mt5.last_error()}"
-        }
-    
     # Get all symbols
     symbols = mt5.symbols_get()
     
@@ -219,19 +365,7 @@ def get_local_symbols():
         symbol_dict = symbol._asdict()
         
         # Determine category
-        name = symbol_dict["name"]
-        if any(pair in name for pair in ['USD', 'EUR', 'GBP', 'JPY', 'AUD', 'CAD', 'CHF', 'NZD']):
-            category = "forex"
-        elif any(crypto in name for crypto in ['BTC', 'ETH', 'LTC', 'XRP', 'DOGE']):
-            category = "crypto"
-        elif any(index in name for index in ['SPX', 'NDX', 'DJI', 'UK100', 'DE30', 'JP225']):
-            category = "index"
-        elif any(commodity in name for commodity in ['GOLD', 'SILVER', 'OIL', 'GAS', 'XAU']):
-            category = "commodity"
-        elif 'Vol' in name or any(x in name for x in ['AAPL', 'MSFT', 'GOOGL', 'AMZN']):
-            category = "stock"
-        else:
-            category = "other"
+        category = classify_symbol(symbol_dict["name"])
         
         # Add formatted symbol
         formatted_symbols.append({
@@ -256,12 +390,6 @@ def get_local_symbols():
 
 def get_local_positions(account_id):
     """Get positions from local MetaTrader terminal"""
-    if not mt5.initialize():
-        return {
-            "success": False,
-            "error": f"Failed to initialize MT5: {mt5.last_error()}"
-        }
-    
     # Get all positions
     positions = mt5.positions_get()
     
@@ -294,14 +422,62 @@ def get_local_positions(account_id):
         "positions": formatted_positions
     }
 
-def place_local_order(account_id, symbol, order_type, volume, stop_loss=None, take_profit=None):
-    """Place order using local MetaTrader terminal"""
-    if not mt5.initialize():
+def get_local_order_history(account_id, start=None, end=None, limit=100):
+    """Get orders placed by Travidox from local MetaTrader terminal history, newest first"""
+    date_from = start or datetime(2000, 1, 1)
+    date_to = end or datetime.now() + timedelta(days=1)
+    orders = mt5.history_orders_get(date_from, date_to)
+    
+    if orders is None:
         return {
-            "success": False,
-            "error": f"Failed to initialize MT5: {mt5.last_error()}"
+            "success": True,
+            "orders": []
         }
     
+    # Format orders like the VPS order registry does
+    formatted_orders = []
+    for order in orders:
+        order_dict = order._asdict()
+        if order_dict["magic"] != 12345:
+            continue
+        formatted_orders.append({
+            "order_id": order_dict["ticket"],
+            "account_id": account_id,
+            "symbol": order_dict["symbol"],
+            "type": "BUY" if order_dict["type"] == 0 else "SELL",
+            "volume": order_dict["volume_initial"],
+            "price": order_dict["price_current"],
+            "stop_loss": order_dict["sl"],
+            "take_profit": order_dict["tp"],
+            "time": datetime.fromtimestamp(order_dict["time_setup"]).isoformat(),
+            "status": "filled"
+        })
+    
+    formatted_orders.sort(key=lambda order: order["time"], reverse=True)
+    
+    return {
+        "success": True,
+        "orders": formatted_orders[:limit]
+    }
+
+def get_local_snapshot(account_id):
+    """Get account info and positions from local MetaTrader terminal in one executor job"""
+    account_result = get_local_account_info(account_id)
+    if not account_result.get("success", False):
+        return account_result
+    
+    positions_result = get_local_positions(account_id)
+    if not positions_result.get("success", False):
+        return positions_result
+    
+    return {
+        "success": True,
+        "account": account_result["account"],
+        "positions": positions_result["positions"]
+    }
+
+def place_local_order(account_id, symbol, order_type, volume, stop_loss=None, take_profit=None):
+    """Place order using local MetaTrader terminal"""
     # Prepare order request
     order_type_mt5 = mt5.ORDER_TYPE_BUY if order_type == "BUY" else mt5.ORDER_TYPE_SELL
     
@@ -361,24 +537,33 @@ def place_local_order(account_id, symbol, order_type, volume, stop_loss=None, ta
         }
     }
 
-def close_local_position(account_id, position_id):
-    """Close position using local MetaTrader terminal"""
-    if not mt5.initialize():
-        return {
-            "success": False,
-            "error": f"Failed to initialize MT5: {mt5.last_error()}"
-        }
-    
-    # Get position info
-    position = mt5.positions_get(ticket=position_id)
-    
-    if not position:
-        return {
-            "success": False,
-            "error": f"Position {position_id} not found"
-        }
+def place_local_orders(account_id, orders):
+    """Place a batch of orders back to back using local MetaTrader terminal (one executor job)"""
+    results = []
+    for order in orders:
+        try:
+            results.append(place_local_order(account_id, **order))
+        except Exception as e:
+            results.append({"success": False, "error": str(e)})
     
-    position = position[0]._asdict()
+    return {
+        "success": True,
+        "results": results
+    }
+
+def close_local_position(account_id, position_id, position=None, price=None):
+    """Close position using local MetaTrader terminal"""
+    if position is None:
+        # Get position info
+        position = mt5.positions_get(ticket=position_id)
+        
+        if not position:
+            return {
+                "success": False,
+                "error": f"Position {position_id} not found"
+            }
+        
+        position = position[0]._asdict()
     
     # Prepare close request
     request = {
@@ -387,7 +572,7 @@ def close_local_position(account_id, position_id):
         "volume": position["volume"],
         "type": mt5.ORDER_TYPE_SELL if position["type"] == 0 else mt5.ORDER_TYPE_BUY,  # Opposite direction
         "position": position_id,
-        "price": position["price_current"],
+        "price": price if price is not None else position["price_current"],
         "deviation": 20,
         "magic": 12345,
         "comment": "Travidox close position",
@@ -409,6 +594,146 @@ def close_local_position(account_id, position_id):
         "message": f"Position {position_id} closed successfully"
     }
 
+def close_local_positions(account_id, symbol=None, side=None, profit=None):
+    """Close all positions matching the filters using local MetaTrader terminal (one executor job)"""
+    positions = mt5.positions_get(symbol=symbol) if symbol else mt5.positions_get()
+    
+    results = []
+    ticks = {}
+    for position in positions or []:
+        position = position._asdict()
+        position_side = "BUY" if position["type"] == 0 else "SELL"
+        
+        if side and position_side != side:
+            continue
+        if profit == "positive" and position["profit"] <= 0:
+            continue
+        if profit == "negative" and position["profit"] >= 0:
+            continue
+        
+        # Fetch each symbol's tick once; BUY positions close at the bid, SELL at the ask
+        if position["symbol"] not in ticks:
+            ticks[position["symbol"]] = mt5.symbol_info_tick(position["symbol"])
+        tick = ticks[position["symbol"]]
+        price = (tick.bid if position_side == "BUY" else tick.ask) if tick else None
+        
+        try:
+            result = close_local_position(account_id, position["ticket"], position, price)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        result["position_id"] = position["ticket"]
+        results.append(result)
+    
+    return {
+        "success": True,
+        "closed": sum(1 for result in results if result["success"]),
+        "results": results
+    }
+
+def load_symbol_catalog():
+    """Load the full symbol list for the symbol catalog"""
+    if DEV_MODE:
+        # Get symbols from local MetaTrader terminal
+        result = mt5_executor.submit_read("symbols", get_local_symbols).result()
+    elif mt_manager:
+        # Get symbols from the VPS
+        result = mt_manager.list_symbols()
+    else:
+        raise RuntimeError("VPS connection not configured")
+    
+    if not result.get("success", False):
+        raise RuntimeError(result.get("error", "Failed to get symbols"))
+    
+    return result.get("symbols", [])
+
+symbol_catalog = SymbolCatalog(load_symbol_catalog)
+
+@app.on_event("startup")
+async def start_symbol_catalog():
+    """Load the symbol catalog and refresh it in the background (the first load runs on the refresh thread)"""
+    if DEV_MODE or mt_manager:
+        symbol_catalog.start()
+
+@app.on_event("startup")
+async def start_firebase_key_refresh():
+    """Keep Firebase ID token signing keys fresh in the background"""
+    if not DEV_MODE and firebase_admin._apps:
+        start_key_refresh()
+
+@app.on_event("startup")
+async def start_outbox_replay():
+    """Replay writes made to local storage during Firestore outages once it recovers"""
+    if firestore_db.outbox_replayer:
+        firestore_db.outbox_replayer.start()
+
+account_snapshots = AccountSnapshotCache()
+
+async def get_account_snapshot(account_id):
+    """Get the cached account info + positions snapshot for a MetaTrader account"""
+    if DEV_MODE:
+        fetch = lambda: read_local_mt(("snapshot", account_id), get_local_snapshot, account_id)
+    else:
+        fetch = lambda: run_in_threadpool(mt_manager.get_account_snapshot, account_id)
+    return await account_snapshots.get(account_id, fetch)
+
+def execute_order_job(job):
+    """Send a queued market order to the broker (runs on an order worker thread)"""
+    try:
+        if DEV_MODE:
+            # Local terminal calls still go through the single MT5 thread
+            return mt5_executor.submit(place_local_order, job.account_id, **job.payload).result()
+        
+        if not mt_manager:
+            return {"success": False, "error": "VPS connection not configured"}
+        
+        return mt_manager.place_market_order(account_id=job.account_id, **job.payload)
+    finally:
+        account_snapshots.invalidate(job.account_id)
+
+order_queue = OrderQueue(execute_order_job)
+
+# Cache, queue and breaker counters exported on /metrics
+metrics.register_stats("token_cache", "Firebase ID token cache", token_cache.stats)
+metrics.register_stats("account_snapshot_cache", "MetaTrader account snapshot cache", account_snapshots.stats)
+metrics.register_stats("user_account_cache", "User to MetaTrader account mapping cache", user_account_cache.stats)
+metrics.register_stats("position_replica", "Firestore listener replicas of open positions and accounts",
+                       lambda: firestore_db.replicas.stats() if firestore_db.replicas else None)
+metrics.register_stats("order_queue", "Market order queue", order_queue.stats)
+metrics.register_stats("mt5_executor", "Local MetaTrader5 call thread",
+                       lambda: {"jobs": mt5_executor.jobs, "coalesced": mt5_executor.coalesced})
+metrics.register_stats("fallback_outbox", "Local writes waiting for Firestore replay",
+                       lambda: firestore_db.outbox.stats() if firestore_db.outbox else None)
+metrics.register_stats("circuit_breaker", "Dependency circuit breakers", lambda: {
+    name: {**breaker, "open": breaker["state"] != "closed"} for name, breaker in all_breaker_stats().items()
+}, label="dependency")
+
+def enqueue_order(user_id, order):
+    """Validate a market order and queue it for the user's MetaTrader account"""
+    if order.order_type not in ("BUY", "SELL"):
+        raise HTTPException(status_code=400, detail="order_type must be BUY or SELL")
+    if order.volume <= 0:
+        raise HTTPException(status_code=400, detail="volume must be positive")
+    
+    account_data = get_user_account(user_id)
+    
+    if not account_data:
+        raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
+    
+    if not DEV_MODE and not mt_manager:
+        raise HTTPException(status_code=500, detail="VPS connection not configured")
+    
+    try:
+        return order_queue.submit(user_id, account_data["account_id"], order.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Allow only operators carrying ADMIN_API_TOKEN (/vps-load, /admin/*)"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are not configured")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 async def verify_firebase_token(authorization: Optional[str] = Header(None)):
     """Verify Firebase ID token and return user info"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -424,9 +749,12 @@ async def verify_firebase_token(authorization: Optional[str] = Header(None)):
             "email": DEV_USER_EMAIL,
         }
     
-    # Normal authentication flow
+    # Normal authentication flow: repeat tokens are served from the cache,
+    # new ones are verified off the event loop
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = token_cache.get(token)
+        if decoded_token is None:
+            decoded_token = await run_in_threadpool(verify_and_cache, token)
         return {
             "uid": decoded_token["uid"],
             "email": decoded_token.get("email", ""),
@@ -438,44 +766,113 @@ async def verify_firebase_token(authorization: Optional[str] = Header(None)):
 async def root():
     return {"message": "Travidox API is running"}
 
-@app.get("/symbols")
-async def get_symbols(user: dict = Depends(verify_firebase_token), category: Optional[str] = None):
+@app.get("/health")
+async def health():
+    """Report the circuit breaker state of each external dependency and the fallback write backlog"""
+    dependencies = all_breaker_stats()
+    degraded = any(breaker["state"] != "closed" for breaker in dependencies.values())
+    
+    outbox = firestore_db.outbox.stats() if firestore_db.outbox else None
+    if outbox and outbox["pending"]:
+        degraded = True
+    
+    return {
+        "status": "degraded" if degraded else "ok",
+        "dependencies": dependencies,
+        "fallback_outbox": outbox
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, dependency latency and cache metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiler", dependencies=[Depends(verify_admin_token)])
+async def get_profiler():
+    """Get the profiler settings and counters"""
+    return request_profiler.stats()
+
+@app.post("/admin/profiler", dependencies=[Depends(verify_admin_token)])
+async def update_profiler(settings: ProfilerSettings):
+    """Change the fraction of requests profiled in every worker (0 stops sampling; X-Profile still works)"""
+    await run_in_threadpool(request_profiler.set_sample_rate, settings.sample_rate)
+    return request_profiler.stats()
+
+@app.get("/admin/profiles", dependencies=[Depends(verify_admin_token)])
+async def list_profiles():
+    """List the stored profiles (route, status, duration), newest first"""
+    return {"profiles": await run_in_threadpool(request_profiler.list_profiles)}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(verify_admin_token)])
+async def download_profile(profile_id: str, format: Literal["json", "folded"] = "json"):
+    """Download a profile as JSON or as folded stacks (flamegraph.pl / speedscope)"""
+    profile = await run_in_threadpool(request_profiler.get_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    headers = {"Content-Disposition": f'attachment; filename="{profile_id}.{"txt" if format == "folded" else "json"}"'}
+    if format == "folded":
+        return PlainTextResponse(folded(profile), headers=headers)
+    return FastJSONResponse(profile, headers=headers)
+
+# Large payloads are documented with `responses=` rather than `response_model=` so
+# FastAPI does not validate and re-encode thousands of items on every request.
+@app.get("/symbols", responses={200: {"model": List[Symbol]}})
+async def get_symbols(
+    user: dict = Depends(verify_firebase_token),
+    category: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
     """Get all available trading symbols/pairs
     
     Parameters:
     - category (optional): Filter symbols by category (forex, crypto, index, commodity, stock, other)
     
-    Returns a list of all available trading symbols with details.
+    Returns a list of all available trading symbols with details. The response carries an
+    ETag; clients sending it back in If-None-Match get a 304 while the catalog is unchanged.
     """
-    if DEV_MODE:
-        # Get symbols from local MetaTrader terminal
-        result = get_local_symbols()
-        
-        if not result.get("success", False):
-            raise HTTPException(
-                status_code=500, 
-                detail=result.get("error", "Failed to get symbols from local terminal")
-            )
-        
-        symbols = result.get("symbols", [])
-        
-        # Filter by category if specified
-        if category:
-            symbols = [s for s in symbols if s["category"] == category.lower()]
-        
-        # Return symbols
-        return symbols
-    
-    # Production mode
-    if not mt_manager:
+    if not DEV_MODE and not mt_manager:
         raise HTTPException(status_code=500, detail="VPS connection not configured")
     
     try:
-        # This would need to be implemented in the VPS_Manager class
-        # For now, just return an empty list
-        return []
+        if not symbol_catalog.loaded:
+            # Wait for the first load without blocking the event loop
+            await run_in_threadpool(symbol_catalog.ensure_loaded)
+        body, etag = symbol_catalog.get_payload(category)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get symbols: {str(e)}")
+    
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/symbols/search", responses={200: {"model": List[Symbol]}})
+async def search_symbols(
+    q: str = Query(..., min_length=1, description="Search text"),
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    user: dict = Depends(verify_firebase_token)
+):
+    """Search trading symbols by name and description
+    
+    Parameters:
+    - q: Prefix, substring or approximate spelling of a symbol name or description
+    - limit (optional): Maximum number of results (default 20)
+    - category (optional): Filter symbols by category
+    
+    Returns the best matching symbols first.
+    """
+    if not DEV_MODE and not mt_manager:
+        raise HTTPException(status_code=500, detail="VPS connection not configured")
+    
+    try:
+        if not symbol_catalog.loaded:
+            await run_in_threadpool(symbol_catalog.ensure_loaded)
+        return FastJSONResponse(symbol_catalog.search(q, limit, category))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search symbols: {str(e)}")
 
 @app.post("/connect-account")
 async def connect_account(
@@ -496,7 +893,7 @@ async def connect_account(
             )
         
         # Connect to local MetaTrader terminal
-        result = connect_local_mt(login, password, server, platform)
+        result = await run_local_mt(connect_local_mt, login, password, server, platform)
         
         if not result.get("success", False):
             raise HTTPException(
@@ -506,7 +903,8 @@ async def connect_account(
         
         # Store the mapping between Firebase user and MT account
         account_id = result["account_id"]
-        db.set_user_account(user["uid"], {
+        account_snapshots.invalidate(account_id)
+        set_user_account(user["uid"], {
             "account_id": account_id,
             "login": login,
             "server": server,
@@ -538,7 +936,8 @@ async def connect_account(
         
         # Store the mapping between Firebase user and MT account
         account_id = result["account_id"]
-        db.set_user_account(user["uid"], {
+        account_snapshots.invalidate(account_id)
+        set_user_account(user["uid"], {
             "account_id": account_id,
             "login": account.login,
             "server": account.server_name,
@@ -557,126 +956,206 @@ async def connect_account(
 async def get_account_info(user: dict = Depends(verify_firebase_token)):
     """Get the connected MetaTrader account information for the authenticated user"""
     
-    account_data = db.get_user_account(user["uid"])
+    account_data = get_user_account(user["uid"])
     
     if not account_data:
         raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
     
-    if DEV_MODE:
-        # Get account info from local MetaTrader terminal
-        result = get_local_account_info(account_data["account_id"])
-        
-        if not result.get("success", False):
-            raise HTTPException(
-                status_code=500, 
-                detail=result.get("error", "Failed to get account information from local terminal")
-            )
-        
-        return result["account"]
-    
-    # Production mode
-    if not mt_manager:
+    if not DEV_MODE and not mt_manager:
         raise HTTPException(status_code=500, detail="VPS connection not configured")
     
     try:
-        # Get account information from the VPS
-        result = mt_manager.get_account_info(account_data["account_id"])
-        
-        if not result.get("success", False):
-            raise HTTPException(status_code=500, detail=result.get("error", "Failed to get account information"))
-        
-        return result["account"]
+        # Account info and positions are fetched together and cached briefly
+        result = await get_account_snapshot(account_data["account_id"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get account information: {str(e)}")
+    
+    if not result.get("success", False):
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to get account information"))
+    
+    return result["account"]
 
 @app.post("/place-order")
 async def place_order(
     order: MarketOrder,
     user: dict = Depends(verify_firebase_token)
 ):
-    """Place a market order for the authenticated user"""
+    """Place a market order for the authenticated user and wait for the fill
     
-    account_data = db.get_user_account(user["uid"])
+    The order goes through the order queue, so it is sequenced with the
+    account's other queued orders. Use POST /orders to get a job ID instead
+    of waiting.
+    """
+    job = await order_queue.wait(enqueue_order(user["uid"], order))
+    
+    if job.status != "filled":
+        raise HTTPException(status_code=500, detail=f"Failed to place order: {job.error}")
+    
+    return job.result["order"]
+
+@app.post("/orders", status_code=202)
+async def submit_order(
+    order: MarketOrder,
+    user: dict = Depends(verify_firebase_token)
+):
+    """Queue a market order and return its job ID immediately
+    
+    Poll GET /orders/{job_id} for the result.
+    """
+    job = enqueue_order(user["uid"], order)
+    
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/orders/{job.id}"
+    }
+
+@app.get("/orders/{job_id}")
+async def get_order_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the order to finish (long-poll)"),
+    user: dict = Depends(verify_firebase_token)
+):
+    """Get the status and result of a queued order
+    
+    Status is one of queued, running, filled or failed.
+    """
+    job = order_queue.get(job_id)
+    
+    if not job or job.user_id != user["uid"]:
+        raise HTTPException(status_code=404, detail="Order job not found")
+    
+    job = await order_queue.wait(job, wait)
+    
+    return {
+        "success": True,
+        **job.to_dict()
+    }
+
+@app.post("/place-orders")
+async def place_orders(
+    batch: MarketOrderBatch,
+    user: dict = Depends(verify_firebase_token)
+):
+    """Place a batch of market orders for the authenticated user in one broker round trip
+    
+    Returns one result per order, in request order.
+    """
+    if not batch.orders:
+        raise HTTPException(status_code=400, detail="No orders provided")
+    
+    account_data = get_user_account(user["uid"])
     
     if not account_data:
         raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
     
+    orders = [order.model_dump() for order in batch.orders]
+    
     if DEV_MODE:
-        # Place order using local MetaTrader terminal
-        result = place_local_order(
-            account_id=account_data["account_id"],
-            symbol=order.symbol,
-            order_type=order.order_type,
-            volume=order.volume,
-            stop_loss=order.stop_loss,
-            take_profit=order.take_profit
-        )
-        
-        if not result.get("success", False):
-            raise HTTPException(
-                status_code=500, 
-                detail=result.get("error", "Failed to place order with local terminal")
-            )
+        # Place orders using local MetaTrader terminal
+        result = await run_local_mt(place_local_orders, account_data["account_id"], orders)
+    else:
+        # Production mode
+        if not mt_manager:
+            raise HTTPException(status_code=500, detail="VPS connection not configured")
         
-        return result["order"]
+        try:
+            # Place all orders on the VPS in one request
+            result = await run_in_threadpool(mt_manager.place_market_orders, account_data["account_id"], orders)
+        except Exception as e:
+            account_snapshots.invalidate(account_data["account_id"])
+            raise HTTPException(status_code=500, detail=f"Failed to place orders: {str(e)}")
     
-    # Production mode
-    if not mt_manager:
-        raise HTTPException(status_code=500, detail="VPS connection not configured")
+    account_snapshots.invalidate(account_data["account_id"])
     
-    try:
-        # Place the order on the VPS
-        result = mt_manager.place_market_order(
-            account_id=account_data["account_id"],
-            symbol=order.symbol,
-            order_type=order.order_type,
-            volume=order.volume,
-            stop_loss=order.stop_loss,
-            take_profit=order.take_profit
-        )
-        
-        if not result.get("success", False):
-            raise HTTPException(status_code=500, detail=result.get("error", "Failed to place order"))
-        
-        return result["order"]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to place order: {str(e)}")
+    if not result.get("success", False):
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to place orders"))
+    
+    return {
+        "success": True,
+        "results": result["results"]
+    }
 
 @app.get("/positions")
 async def get_positions(user: dict = Depends(verify_firebase_token)):
     """Get open positions for the authenticated user"""
     
-    account_data = db.get_user_account(user["uid"])
+    account_data = get_user_account(user["uid"])
     
     if not account_data:
         raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
     
-    if DEV_MODE:
-        # Get positions from local MetaTrader terminal
-        result = get_local_positions(account_data["account_id"])
-        
-        if not result.get("success", False):
-            raise HTTPException(
-                status_code=500, 
-                detail=result.get("error", "Failed to get positions from local terminal")
-            )
-        
-        return result.get("positions", [])
-    
-    # Production mode
-    if not mt_manager:
+    if not DEV_MODE and not mt_manager:
         raise HTTPException(status_code=500, detail="VPS connection not configured")
     
     try:
-        # Get positions from the VPS
-        result = mt_manager.get_positions(account_data["account_id"])
-        
-        if not result.get("success", False):
-            raise HTTPException(status_code=500, detail=result.get("error", "Failed to get positions"))
-        
-        return result.get("positions", [])
+        # Account info and positions are fetched together and cached briefly
+        result = await get_account_snapshot(account_data["account_id"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get positions: {str(e)}")
+    
+    if not result.get("success", False):
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to get positions"))
+    
+    return result.get("positions", [])
+
+@app.get("/order-history")
+async def get_order_history(
+    start: Optional[datetime] = Query(None, description="Only orders at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only orders before this time"),
+    limit: int = Query(100, ge=1, le=1000),
+    user: dict = Depends(verify_firebase_token)
+):
+    """Get the orders placed for the authenticated user's MetaTrader account, newest first"""
+    
+    account_data = get_user_account(user["uid"])
+    
+    if not account_data:
+        raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
+    
+    if DEV_MODE:
+        # Read the local terminal's order history
+        result = await read_local_mt(
+            ("order-history", account_data["account_id"], start, end, limit),
+            get_local_order_history,
+            account_data["account_id"],
+            start,
+            end,
+            limit
+        )
+    else:
+        # Production mode
+        if not mt_manager:
+            raise HTTPException(status_code=500, detail="VPS connection not configured")
+        
+        try:
+            # Query the order registry on the VPS
+            result = await run_in_threadpool(
+                mt_manager.get_order_history,
+                account_data["account_id"],
+                start.isoformat() if start else None,
+                end.isoformat() if end else None,
+                limit
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to get order history: {str(e)}")
+    
+    if not result.get("success", False):
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to get order history"))
+    
+    return result["orders"]
+
+@app.get("/vps-load", dependencies=[Depends(verify_admin_token)])
+async def get_vps_load():
+    """Get the load of each VPS host and the accounts due to move to a new host on reconnect (operators only)"""
+    if not isinstance(mt_manager, MetaTraderCluster):
+        raise HTTPException(status_code=404, detail="VPS sharding is not enabled (set VPS_HOSTS)")
+    
+    return {
+        **mt_manager.host_load(),
+        "rebalance": mt_manager.rebalance_plan()["moves"]
+    }
 
 @app.post("/close-position/{position_id}")
 async def close_position(
@@ -685,14 +1164,15 @@ async def close_position(
 ):
     """Close a specific position for the authenticated user"""
     
-    account_data = db.get_user_account(user["uid"])
+    account_data = get_user_account(user["uid"])
     
     if not account_data:
         raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
     
     if DEV_MODE:
         # Close position using local MetaTrader terminal
-        result = close_local_position(account_data["account_id"], position_id)
+        result = await run_local_mt(close_local_position, account_data["account_id"], position_id)
+        account_snapshots.invalidate(account_data["account_id"])
         
         if not result.get("success", False):
             raise HTTPException(
@@ -712,6 +1192,7 @@ async def close_position(
             account_id=account_data["account_id"],
             position_id=position_id
         )
+        account_snapshots.invalidate(account_data["account_id"])
         
         if not result.get("success", False):
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to close position"))
@@ -720,6 +1201,54 @@ async def close_position(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to close position: {str(e)}")
 
+@app.post("/close-positions")
+async def close_positions(
+    position_filter: PositionFilter,
+    user: dict = Depends(verify_firebase_token)
+):
+    """Close all positions matching the filters (symbol, side, profit sign) in one broker session
+    
+    An empty filter closes every open position.
+    """
+    account_data = get_user_account(user["uid"])
+    
+    if not account_data:
+        raise HTTPException(status_code=404, detail="No MetaTrader account connected for this user")
+    
+    if DEV_MODE:
+        # Close positions using local MetaTrader terminal
+        result = await run_local_mt(
+            close_local_positions,
+            account_data["account_id"],
+            position_filter.symbol,
+            position_filter.side,
+            position_filter.profit
+        )
+    else:
+        # Production mode
+        if not mt_manager:
+            raise HTTPException(status_code=500, detail="VPS connection not configured")
+        
+        try:
+            # Close the positions on the VPS in one session
+            result = await run_in_threadpool(
+                mt_manager.close_positions,
+                account_data["account_id"],
+                position_filter.symbol,
+                position_filter.side,
+                position_filter.profit
+            )
+        except Exception as e:
+            account_snapshots.invalidate(account_data["account_id"])
+            raise HTTPException(status_code=500, detail=f"Failed to close positions: {str(e)}")
+    
+    account_snapshots.invalidate(account_data["account_id"])
+    
+    if not result.get("success", False):
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to close positions"))
+    
+    return result
+
 # Virtual Trading Endpoints
 
 @app.get("/virtual-account")
@@ -734,8 +1263,8 @@ async def get_virtual_account_info(user: dict = Depends(verify_firebase_token)):
             from trading_bot import get_trading_bot
             trading_bot = get_trading_bot()
         
-        # Get account info from trading bot
-        account_info = trading_bot.get_account_info(user_id)
+        # Get account info from trading bot (account and positions are read concurrently)
+        account_info = await trading_bot.get_account_info_async(user_id)
         
         return {
             "success": True,
@@ -779,6 +1308,33 @@ async def place_virtual_order(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/virtual-orders")
+async def place_virtual_orders(
+    batch: MarketOrderBatch,
+    user: dict = Depends(verify_firebase_token)
+):
+    """Place a batch of virtual orders using the trading bot
+    
+    Returns one result per order, in request order.
+    """
+    if not batch.orders:
+        raise HTTPException(status_code=400, detail="No orders provided")
+    
+    user_id = user["uid"]
+    
+    # Always create a trading bot instance if not available
+    global trading_bot
+    if not trading_bot:
+        from trading_bot import get_trading_bot
+        trading_bot = get_trading_bot()
+    
+    result = trading_bot.place_orders(user_id, [order.model_dump() for order in batch.orders])
+    
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    
+    return result
+
 @app.post("/virtual-position/close/{position_id}")
 async def close_virtual_position_endpoint(
     position_id: str,
@@ -803,6 +1359,35 @@ async def close_virtual_position_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/virtual-positions/close")
+async def close_virtual_positions_endpoint(
+    position_filter: PositionFilter,
+    user: dict = Depends(verify_firebase_token)
+):
+    """Close all virtual positions matching the filters (symbol, side, profit sign)
+    
+    An empty filter closes every open position.
+    """
+    user_id = user["uid"]
+    
+    # Always create a trading bot instance if not available
+    global trading_bot
+    if not trading_bot:
+        from trading_bot import get_trading_bot
+        trading_bot = get_trading_bot()
+    
+    result = trading_bot.close_positions(
+        user_id,
+        symbol=position_filter.symbol,
+        side=position_filter.side,
+        profit=position_filter.profit
+    )
+    
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    
+    return result
+
 @app.get("/virtual-positions")
 async def get_virtual_positions_endpoint(user: dict = Depends(verify_firebase_token)):
     """Get user's virtual trading positions"""
@@ -816,12 +1401,12 @@ async def get_virtual_positions_endpoint(user: dict = Depends(verify_firebase_to
             trading_bot = get_trading_bot()
         
         # Get positions from trading bot
-        positions = trading_bot.get_positions(user_id)
+        positions = await trading_bot.get_positions_async(user_id)
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "positions": positions
-        }
+        })
     except Exception as e:
         print(f"Error getting virtual positions: {str(e)}")
         return {
@@ -829,7 +1414,7 @@ async def get_virtual_positions_endpoint(user: dict = Depends(verify_firebase_to
             "error": str(e)
         }
 
-@app.get("/virtual-history")
+@app.get("/virtual-history", responses={200: {"model": VirtualHistoryResponse}})
 async def get_virtual_trading_history(user: dict = Depends(verify_firebase_token)):
     """Get user's virtual trading history"""
     try:
@@ -842,12 +1427,12 @@ async def get_virtual_trading_history(user: dict = Depends(verify_firebase_token
             trading_bot = get_trading_bot()
         
         # Get trading history from trading bot
-        history = trading_bot.get_trading_history(user_id)
+        history = await trading_bot.get_trading_history_async(user_id)
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "history": history
-        }
+        })
     except Exception as e:
         print(f"Error getting virtual trading history: {str(e)}")
         return {
@@ -855,6 +1440,34 @@ async def get_virtual_trading_history(user: dict = Depends(verify_firebase_token
             "error": str(e)
         }
 
+@app.get("/virtual-overview")
+async def get_virtual_overview(user: dict = Depends(verify_firebase_token)):
+    """Get virtual account, open positions and trading history in one request
+    
+    The three reads run concurrently.
+    """
+    try:
+        user_id = user["uid"]
+        
+        # Always create a trading bot instance if not available
+        global trading_bot
+        if not trading_bot:
+            from trading_bot import get_trading_bot
+            trading_bot = get_trading_bot()
+        
+        overview = await trading_bot.get_overview_async(user_id)
+        
+        return FastJSONResponse({
+            "success": True,
+            **overview
+        })
+    except Exception as e:
+        print(f"Error getting virtual overview: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
 @app.get("/market-price/{symbol}")
 async def get_market_price(symbol: str, user: dict = Depends(verify_firebase_token)):
     """Get real-time market price for a symbol"""
@@ -7,6 +7,10 @@ import os
 import time
 from typing import Dict, Any, Optional
 from datetime import datetime
+from circuit_breaker import get_breaker
+from instrumentation import instrumented
+from metrics import quote_cache_lookups
+from tracing import set_attribute, traced
 
 # Alpha Vantage API endpoint
 ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
@@ -15,6 +19,11 @@ ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
 # Format: {"symbol": {"bid": 1.1234, "ask": 1.1236, "timestamp": 1234567890}}
 price_cache = {}
 CACHE_EXPIRY = 60  # Cache expiry in seconds
+# Seconds to wait for Alpha Vantage before giving up
+ALPHA_VANTAGE_TIMEOUT = float(os.getenv("ALPHA_VANTAGE_TIMEOUT", "10"))
+
+# Opens after repeated Alpha Vantage failures; quotes then come from the (stale) cache
+alpha_vantage_breaker = get_breaker("alpha_vantage")
 
 class AlphaVantageProvider:
     """Alpha Vantage API provider for forex data"""
@@ -23,6 +32,7 @@ class AlphaVantageProvider:
         """Initialize with API key"""
         self.api_key = api_key or os.getenv("ALPHA_VANTAGE_API_KEY", "RDJ0NL7BHOPIA44E")
     
+    @traced("market_data.get_forex_quote")
     def get_forex_quote(self, symbol: str) -> Dict[str, Any]:
         """
         Get real-time forex quote for a symbol
@@ -36,7 +46,12 @@ class AlphaVantageProvider:
         # Check cache first
         now = time.time()
         if symbol in price_cache and (now - price_cache[symbol]["timestamp"]) < CACHE_EXPIRY:
+            quote_cache_lookups.inc("hit")
+            set_attribute("cache", "hit")
             return price_cache[symbol]
+        quote_cache_lookups.inc("miss")
+        set_attribute("cache", "miss")
+        set_attribute("symbol", symbol)
         
         # Parse symbol for Alpha Vantage format (EURUSD -> EUR/USD)
         if len(symbol) == 6 and "/" not in symbol:
@@ -61,9 +76,11 @@ class AlphaVantageProvider:
             "apikey": self.api_key
         }
         
+        if not alpha_vantage_breaker.allow():
+            return self._stale_quote(symbol, "Alpha Vantage is unavailable (circuit open)")
+        
         try:
-            response = requests.get(ALPHA_VANTAGE_URL, params=params)
-            data = response.json()
+            data = self._request(params)
             
             if "Realtime Currency Exchange Rate" in data:
                 exchange_rate = float(data["Realtime Currency Exchange Rate"]["5. Exchange Rate"])
@@ -83,35 +100,51 @@ class AlphaVantageProvider:
                 
                 # Update cache
                 price_cache[symbol] = result
+                alpha_vantage_breaker.record_success()
                 
                 return result
             else:
                 # Check for error messages
                 if "Error Message" in data:
+                    # The API answered; the request itself was bad
+                    alpha_vantage_breaker.record_success()
                     return {
                         "error": data["Error Message"],
                         "bid": None,
                         "ask": None
                     }
                 elif "Information" in data:
-                    return {
-                        "error": f"API limit reached: {data['Information']}",
-                        "bid": None,
-                        "ask": None
-                    }
+                    alpha_vantage_breaker.record_failure(RuntimeError(data["Information"]))
+                    return self._stale_quote(symbol, f"API limit reached: {data['Information']}")
                 else:
-                    return {
-                        "error": "Unknown error from Alpha Vantage API",
-                        "bid": None,
-                        "ask": None
-                    }
+                    alpha_vantage_breaker.record_failure(RuntimeError("Unknown error from Alpha Vantage API"))
+                    return self._stale_quote(symbol, "Unknown error from Alpha Vantage API")
                 
         except Exception as e:
-            return {
-                "error": f"Error fetching forex data: {str(e)}",
-                "bid": None,
-                "ask": None
-            }
+            alpha_vantage_breaker.record_failure(e)
+            return self._stale_quote(symbol, f"Error fetching forex data: {str(e)}")
+    
+    @instrumented("alpha_vantage", "currency_exchange_rate")
+    def _request(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """Send a request to the Alpha Vantage API and return the decoded JSON"""
+        response = requests.get(ALPHA_VANTAGE_URL, params=params, timeout=ALPHA_VANTAGE_TIMEOUT)
+        return response.json()
+    
+    def _stale_quote(self, symbol: str, error: str) -> Dict[str, Any]:
+        """
+        Serve the last cached quote when Alpha Vantage fails, or the error.
+        
+        Stale quotes carry "stale": True and the failure in "stale_reason"; they are
+        only good for display and repricing, not for filling or settling trades.
+        """
+        if symbol in price_cache:
+            return {**price_cache[symbol], "stale": True, "stale_reason": error}
+        
+        return {
+            "error": error,
+            "bid": None,
+            "ask": None
+        }
 
 # Create a singleton instance
 _alpha_vantage = None
@@ -0,0 +1,174 @@
+"""
+Metrics - Prometheus text-format counters, histograms and stats gauges
+
+Counters and histograms are updated in place under a per-metric lock (one
+dict lookup and an addition per observation). Cache and queue components
+that already keep their own counters are exported by registering their
+stats() function, which is only called when /metrics is scraped.
+"""
+
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (5ms .. 30s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: Any) -> str:
+    """Escape a label value"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    """Format a label set, e.g. {route="/positions",method="GET"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    """Format a sample value"""
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: Any, amount: float = 1) -> None:
+        """Increment the counter of a label set"""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+class Histogram:
+    """Histogram with labels and fixed buckets"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        """Record one observation for a label set"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(label_values, (list(counts), total, count)) for label_values, (counts, total, count) in self._series.items()]
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+class StatsGauges:
+    """Gauges read from a component's stats() dict at scrape time"""
+
+    def __init__(self, prefix: str, help_text: str, stats: Callable[[], Optional[Dict[str, Any]]], label: Optional[str] = None):
+        """
+        Initialize the gauges.
+
+        Args:
+            prefix: Metric name prefix; each numeric stat becomes <prefix>_<key>
+            help_text: Help text of the metrics
+            stats: Returns the component's stats (None when it is disabled)
+            label: If set, stats() returns {label value: stats} (one series per entry)
+        """
+        self.prefix = prefix
+        self.help = help_text
+        self.stats = stats
+        self.label = label
+
+    def render(self) -> List[str]:
+        try:
+            stats = self.stats()
+        except Exception as e:
+            return [f"# {self.prefix} stats unavailable: {_escape(e)}"]
+        if not stats:
+            return []
+
+        entries = stats.items() if self.label else [(None, stats)]
+        samples: Dict[str, List[str]] = {}
+        for label_value, values in entries:
+            labels = _labels((self.label,), (label_value,)) if self.label else ""
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                samples.setdefault(f"{self.prefix}_{key}", []).append(f"{self.prefix}_{key}{labels} {_number(value)}")
+
+        lines = []
+        for name, metric_lines in samples.items():
+            lines.append(f"# HELP {name} {self.help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(metric_lines)
+        return lines
+
+_registry: List[Any] = []
+_registry_lock = threading.Lock()
+
+def register(metric):
+    """Add a metric to the /metrics output"""
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+def register_stats(prefix: str, help_text: str, stats: Callable[[], Optional[Dict[str, Any]]], label: Optional[str] = None) -> None:
+    """Export a component's stats() as gauges"""
+    register(StatsGauges(prefix, help_text, stats, label))
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# HTTP requests (route is the path template, e.g. /orders/{job_id})
+http_requests = register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status code", ["route", "method", "status"]
+))
+http_request_latency = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and method", ["route", "method"]
+))
+
+# Dependency operations (Firestore, JSON files, VPS SSH commands, MT5 calls, quote fetches)
+dependency_latency = register(Histogram(
+    "dependency_operation_duration_seconds", "Latency of storage, broker and market data operations", ["kind", "operation"]
+))
+
+# Market data quote cache
+quote_cache_lookups = register(Counter(
+    "quote_cache_lookups_total", "Alpha Vantage quote cache lookups by result (hit or miss)", ["result"]
+))
@@ -0,0 +1,105 @@
+"""
+MT5 Executor - serializes all local MetaTrader5 calls onto one thread
+
+The MetaTrader5 module wraps a single global terminal session, so every call
+is routed through one worker thread with a request queue. The session is
+initialized once on that thread, results are returned as futures, and read
+calls with the same key are coalesced while they are waiting or running.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from instrumentation import record_operation
+
+class MT5Executor:
+    """Single-threaded executor for MetaTrader5 calls"""
+
+    def __init__(self, initializer: Callable[[], Tuple[bool, Optional[str]]]):
+        """
+        Initialize the executor.
+
+        Args:
+            initializer: Called on the worker thread before the first job (and again
+                after a failed attempt); returns (success, error message)
+        """
+        self.initializer = initializer
+        self.initialized = False
+        self._queue: "queue.Queue" = queue.Queue()
+        self._reads: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.jobs = 0
+        self.coalesced = 0
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="mt5-executor", daemon=True)
+            self._thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        Queue a call that may change terminal state (login, orders, closes).
+
+        Reads submitted afterwards are not coalesced with reads queued before it,
+        so they observe the effect of this call.
+        """
+        future = Future()
+        with self._lock:
+            self._reads.clear()
+            self._queue.put((func, args, kwargs, future, None))
+        self.start()
+        return future
+
+    def submit_read(self, key: Hashable, func: Callable, *args, **kwargs) -> Future:
+        """
+        Queue a read-only call, sharing the result with an identical pending read.
+
+        Args:
+            key: Identifies equivalent reads (e.g. ("positions", account_id))
+            func: Function to run on the MT5 thread
+        """
+        with self._lock:
+            future = self._reads.get(key)
+            if future is not None and not future.done():
+                self.coalesced += 1
+                return future
+            future = Future()
+            self._reads[key] = future
+            self._queue.put((func, args, kwargs, future, key))
+        self.start()
+        return future
+
+    def _run(self) -> None:
+        """Worker loop"""
+        while True:
+            func, args, kwargs, future, key = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if not self.initialized:
+                    success, error = self.initializer()
+                    if not success:
+                        future.set_result({"success": False, "error": error})
+                        continue
+                    self.initialized = True
+                self.jobs += 1
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    record_operation("mt5", getattr(func, "__name__", "call"), time.perf_counter() - start)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                if key is not None:
+                    with self._lock:
+                        if self._reads.get(key) is future:
+                            del self._reads[key]
@@ -0,0 +1,279 @@
+"""
+Order Queue - asynchronous order pipeline with job IDs
+
+Orders are validated by the API, enqueued and acknowledged with a job ID
+immediately. Worker threads execute them with a per-account ordering
+guarantee (one account's orders run one at a time, in submission order)
+while different accounts are processed in parallel. Clients poll or
+long-poll the job for its result.
+
+Jobs run in the worker process that accepted them, but their state is
+written through to a small SQLite file shared by all workers on the
+machine, so GET /orders/{job_id} works whichever worker serves the poll.
+The per-account ordering guarantee holds per worker process.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+# Number of worker threads executing orders (accounts processed in parallel)
+ORDER_QUEUE_WORKERS = int(os.getenv("ORDER_QUEUE_WORKERS", "8"))
+# Maximum number of queued + running jobs before new orders are rejected
+ORDER_QUEUE_MAX_PENDING = int(os.getenv("ORDER_QUEUE_MAX_PENDING", "1000"))
+# How long finished jobs are kept for polling (seconds)
+ORDER_JOB_TTL = float(os.getenv("ORDER_JOB_TTL", "3600"))
+# Shared job store (SQLite file)
+ORDER_JOB_STORE_PATH = os.getenv("ORDER_JOB_STORE_PATH", "order_jobs.db")
+# How often a long-poll re-reads a job run by another worker (seconds)
+ORDER_JOB_POLL_INTERVAL = float(os.getenv("ORDER_JOB_POLL_INTERVAL", "0.25"))
+
+class QueueFullError(Exception):
+    """Raised when the order queue cannot accept more jobs"""
+
+class OrderJob:
+    """An order waiting for, or done with, execution"""
+
+    def __init__(self, user_id: str, account_id: str, payload: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.account_id = account_id
+        self.payload = payload
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Future = Future()
+
+    @classmethod
+    def from_dict(cls, user_id: str, account_id: str, data: Dict[str, Any]) -> "OrderJob":
+        """Rebuild a job from its stored representation"""
+        job = cls(user_id, account_id, data["order"])
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.result = data["result"]
+        job.error = data["error"]
+        job.created_at = data["created_at"]
+        job.started_at = data["started_at"]
+        job.finished_at = data["finished_at"]
+        if job.finished_at is not None:
+            job.future.set_result(job)
+        return job
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the job's public representation"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "order": self.payload,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class OrderJobStore:
+    """SQLite file of job states shared by all workers on the machine"""
+
+    def __init__(self, path: str = ORDER_JOB_STORE_PATH):
+        """
+        Initialize the store.
+
+        Args:
+            path: SQLite file shared with the other workers
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS order_jobs ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, account_id TEXT NOT NULL, "
+                "data TEXT NOT NULL, finished_at REAL)"
+            )
+            self._conn.commit()
+
+    def save(self, job: OrderJob) -> None:
+        """Write a job's current state"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO order_jobs (id, user_id, account_id, data, finished_at) VALUES (?, ?, ?, ?, ?)",
+                (job.id, job.user_id, job.account_id, json.dumps(job.to_dict(), default=str), job.finished_at)
+            )
+            self._conn.commit()
+
+    def load(self, job_id: str) -> Optional[OrderJob]:
+        """Read a job, or None if it is unknown or has been pruned"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, account_id, data FROM order_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return OrderJob.from_dict(row[0], row[1], json.loads(row[2]))
+
+    def prune(self, cutoff: float) -> None:
+        """Delete jobs that finished before `cutoff`"""
+        with self._lock:
+            self._conn.execute("DELETE FROM order_jobs WHERE finished_at < ?", (cutoff,))
+            self._conn.commit()
+
+class OrderQueue:
+    """Per-account ordered, cross-account parallel order execution"""
+
+    def __init__(self,
+                 execute: Callable[[OrderJob], Dict[str, Any]],
+                 max_workers: int = ORDER_QUEUE_WORKERS,
+                 max_pending: int = ORDER_QUEUE_MAX_PENDING,
+                 job_ttl: float = ORDER_JOB_TTL,
+                 store: Optional[OrderJobStore] = None):
+        """
+        Initialize the queue.
+
+        Args:
+            execute: Runs one job and returns the broker result ({"success": ..., ...})
+            max_workers: Number of worker threads
+            max_pending: Maximum number of unfinished jobs
+            job_ttl: Seconds finished jobs are kept
+            store: Shared job store (defaults to ORDER_JOB_STORE_PATH)
+        """
+        self.execute = execute
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.store = store or OrderJobStore()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="order-worker")
+        self._jobs: Dict[str, OrderJob] = {}
+        self._accounts: Dict[str, Deque[OrderJob]] = {}
+        # Finished jobs in the order they finished, so expired ones are at the front
+        self._finished: Deque[OrderJob] = deque()
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, user_id: str, account_id: str, payload: Dict[str, Any]) -> OrderJob:
+        """
+        Enqueue an order.
+
+        Raises:
+            QueueFullError: If `max_pending` jobs are already unfinished
+        """
+        job = OrderJob(user_id, account_id, payload)
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise QueueFullError("Order queue is full, try again later")
+            self._prune()
+            self._jobs[job.id] = job
+            self.pending += 1
+            self.store.save(job)
+
+            # Only one drain per account runs at a time, which keeps its orders in sequence
+            account_jobs = self._accounts.get(account_id)
+            if account_jobs is None:
+                self._accounts[account_id] = deque([job])
+                self._executor.submit(self._drain, account_id)
+            else:
+                account_jobs.append(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[OrderJob]:
+        """Get a job by ID, including jobs accepted by other workers"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self.store.load(job_id)
+        return job
+
+    async def wait(self, job: OrderJob, timeout: Optional[float] = None) -> OrderJob:
+        """
+        Wait for a job to finish (or for `timeout` seconds, for long-polling).
+
+        Waiting never cancels the job, even if the caller is cancelled.
+        Jobs run by another worker are re-read from the store until they finish.
+        """
+        if job.future.done() or (timeout is not None and timeout <= 0):
+            return job
+        if self._jobs.get(job.id) is job:
+            await asyncio.wait([asyncio.wrap_future(job.future)], timeout=timeout)
+            return job
+
+        deadline = None if timeout is None else time.time() + timeout
+        while deadline is None or time.time() < deadline:
+            await asyncio.sleep(ORDER_JOB_POLL_INTERVAL)
+            job = self.store.load(job.id) or job
+            if job.future.done():
+                break
+        return job
+
+    def _drain(self, account_id: str) -> None:
+        """Run an account's jobs in order until its queue is empty"""
+        while True:
+            with self._lock:
+                account_jobs = self._accounts[account_id]
+                if not account_jobs:
+                    del self._accounts[account_id]
+                    return
+                job = account_jobs[0]
+            self._run(job)
+            with self._lock:
+                account_jobs.popleft()
+                self._finished.append(job)
+                self.pending -= 1
+                if job.status == "filled":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def _run(self, job: OrderJob) -> None:
+        """Execute one job and publish its result"""
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            result = self.execute(job)
+            if result.get("success", False):
+                job.status = "filled"
+                job.result = result
+            else:
+                job.status = "failed"
+                job.result = result
+                job.error = result.get("error", "Order failed")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = time.time()
+        self._save(job)
+        job.future.set_result(job)
+
+    def _save(self, job: OrderJob) -> None:
+        """Write a job's state to the shared store without failing the job"""
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not store order job {job.id}: {e}")
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than job_ttl (called with the lock held)"""
+        cutoff = time.time() - self.job_ttl
+        while self._finished and self._finished[0].finished_at < cutoff:
+            del self._jobs[self._finished.popleft().id]
+        self.store.prune(cutoff)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue metrics"""
+        return {
+            "pending": self.pending,
+            "active_accounts": len(self._accounts),
+            "completed": self.completed,
+            "failed": self.failed,
+            "tracked_jobs": len(self._jobs)
+        }
@@ -0,0 +1,277 @@
+"""
+Position Replica - real-time local copy of each active user's Firestore data
+
+The first read of a user's open positions or virtual account starts two
+Firestore listeners (on_snapshot): one on the user's open-position query
+and one on their virtual account document. After the initial snapshot only
+changed documents are sent by Firestore, and reads are served from memory.
+
+Writes made through FirestoreDB are reported with note_write(); a read then
+waits until the listener has delivered a snapshot at least as new as the
+write (read-your-writes). Replicas of users with no reads for
+REPLICA_IDLE_TTL seconds are closed by a background sweeper, and at most
+REPLICA_MAX_USERS replicas are kept open (least recently used is closed).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from responses import json_fields
+
+# Serve open positions and virtual accounts from listener replicas
+POSITION_REPLICA_ENABLED = os.getenv("POSITION_REPLICA_ENABLED", "true").lower() == "true"
+# Seconds without reads before a user's listeners are closed
+REPLICA_IDLE_TTL = float(os.getenv("REPLICA_IDLE_TTL", "300"))
+# Maximum number of users with open listeners
+REPLICA_MAX_USERS = int(os.getenv("REPLICA_MAX_USERS", "1000"))
+# Seconds a read waits for the initial snapshot or for a write to arrive
+REPLICA_SYNC_TIMEOUT = float(os.getenv("REPLICA_SYNC_TIMEOUT", "2"))
+
+class UserReplica:
+    """Open positions and virtual account of one user, kept in sync by listeners"""
+
+    def __init__(self, client, user_id: str, positions_collection: str, accounts_collection: str):
+        """
+        Start the listeners.
+
+        Args:
+            client: Firestore client
+            user_id: Firebase user ID
+            positions_collection: Collection of open virtual positions
+            accounts_collection: Collection of virtual accounts
+        """
+        self.user_id = user_id
+        self.positions: Dict[str, Dict[str, Any]] = {}
+        self.account: Optional[Dict[str, Any]] = None
+        self.last_access = time.monotonic()
+        self._cond = threading.Condition()
+        # read_time of the latest snapshot of each listener
+        self._positions_read_time = None
+        self._account_read_time = None
+        # update_time of the latest write made by this process
+        self._positions_written = None
+        self._account_written = None
+        self.snapshots = 0
+
+        query = (client.collection(positions_collection)
+                 .where("user_id", "==", user_id)
+                 .where("closed", "==", False))
+        account_ref = client.collection(accounts_collection).document(user_id)
+        self._watches = [
+            query.on_snapshot(self._on_positions),
+            account_ref.on_snapshot(self._on_account)
+        ]
+
+    def _on_positions(self, docs, changes, read_time) -> None:
+        """Apply changed positions (listener thread)"""
+        with self._cond:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self.positions.pop(change.document.id, None)
+                else:
+                    self.positions[change.document.id] = change.document.to_dict()
+            self._positions_read_time = read_time
+            self.snapshots += 1
+            self._cond.notify_all()
+
+    def _on_account(self, docs, changes, read_time) -> None:
+        """Replace the account document (listener thread)"""
+        with self._cond:
+            self.account = docs[0].to_dict() if docs and docs[0].exists else None
+            self._account_read_time = read_time
+            self.snapshots += 1
+            self._cond.notify_all()
+
+    @property
+    def active(self) -> bool:
+        """Whether both listeners are still streaming"""
+        return all(watch.is_active for watch in self._watches)
+
+    def note_write(self, update_time, positions: bool = True, account: bool = False) -> None:
+        """Record a write of this user's positions and/or account"""
+        with self._cond:
+            if positions and (self._positions_written is None or update_time > self._positions_written):
+                self._positions_written = update_time
+            if account and (self._account_written is None or update_time > self._account_written):
+                self._account_written = update_time
+
+    def _synced(self, read_time, written) -> bool:
+        """Whether a listener has delivered a snapshot including our latest write"""
+        return read_time is not None and (written is None or read_time >= written)
+
+    def get_positions(self, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """Get open positions, or None if the listener is not in sync within timeout"""
+        self.last_access = time.monotonic()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._synced(self._positions_read_time, self._positions_written), timeout):
+                return None
+            return [json_fields(dict(position)) for position in self.positions.values()]
+
+    def get_account(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Get the account document, or None if it does not exist or the listener is not in sync"""
+        self.last_access = time.monotonic()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._synced(self._account_read_time, self._account_written), timeout):
+                return None
+            return json_fields(dict(self.account)) if self.account is not None else None
+
+    def close(self) -> None:
+        """Stop the listeners"""
+        for watch in self._watches:
+            watch.unsubscribe()
+
+class ReplicaManager:
+    """Opens, serves and expires the replicas of active users"""
+
+    def __init__(self,
+                 client,
+                 positions_collection: str,
+                 accounts_collection: str,
+                 idle_ttl: float = REPLICA_IDLE_TTL,
+                 max_users: int = REPLICA_MAX_USERS,
+                 sync_timeout: float = REPLICA_SYNC_TIMEOUT):
+        """
+        Initialize the manager.
+
+        Args:
+            client: Firestore client
+            positions_collection: Collection of open virtual positions
+            accounts_collection: Collection of virtual accounts
+            idle_ttl: Seconds without reads before a replica is closed
+            max_users: Maximum number of open replicas
+            sync_timeout: Seconds a read waits for its replica to be in sync
+        """
+        self.client = client
+        self.positions_collection = positions_collection
+        self.accounts_collection = accounts_collection
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.sync_timeout = sync_timeout
+        self._replicas: "OrderedDict[str, UserReplica]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.opened = 0
+        self.expired = 0
+
+    def _replica(self, user_id: str) -> UserReplica:
+        """Get a user's replica, starting its listeners if needed"""
+        evicted = []
+        with self._lock:
+            replica = self._replicas.get(user_id)
+            if replica is not None and not replica.active:
+                # The listener stopped (stream error); start a new one
+                evicted.append(self._replicas.pop(user_id))
+                replica = None
+            if replica is None:
+                replica = self._replicas[user_id] = UserReplica(
+                    self.client, user_id, self.positions_collection, self.accounts_collection
+                )
+                self.opened += 1
+                while len(self._replicas) > self.max_users:
+                    evicted.append(self._replicas.popitem(last=False)[1])
+            else:
+                self._replicas.move_to_end(user_id)
+            self._start_sweeper()
+
+        for old in evicted:
+            old.close()
+        return replica
+
+    def get_positions(self, user_id: str, timeout: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get a user's open positions from the replica (None: read Firestore instead).
+
+        A timeout of 0 never blocks (used by async callers); by default the
+        read waits up to sync_timeout.
+        """
+        positions = self._replica(user_id).get_positions(self.sync_timeout if timeout is None else timeout)
+        if positions is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return positions
+
+    def get_account(self, user_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a user's virtual account from the replica (None: read Firestore instead).
+
+        A timeout of 0 never blocks (used by async callers); by default the
+        read waits up to sync_timeout.
+        """
+        account = self._replica(user_id).get_account(self.sync_timeout if timeout is None else timeout)
+        if account is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return account
+
+    def note_write(self, user_id: str, write_results, positions: bool = True, account: bool = False) -> None:
+        """
+        Record a write so later reads of the user's replica include it.
+
+        Args:
+            user_id: Firebase user ID
+            write_results: WriteResult or list of WriteResults of the write
+            positions: Whether the write touched the user's open positions
+            account: Whether the write touched the user's virtual account
+        """
+        replica = self._replicas.get(user_id)
+        if replica is None or not write_results:
+            return
+        if not isinstance(write_results, list):
+            write_results = [write_results]
+        # Deletes come back without an update_time; a delete-only write uses the local clock
+        update_time = max(
+            (result.update_time for result in write_results if result.update_time is not None),
+            default=datetime.now(timezone.utc)
+        )
+        replica.note_write(update_time, positions=positions, account=account)
+
+    def _start_sweeper(self) -> None:
+        """Start the idle-expiry thread (called with the lock held)"""
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        """Close idle replicas periodically"""
+        while True:
+            time.sleep(max(self.idle_ttl / 2, 1))
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Close replicas idle for longer than idle_ttl and return how many were closed"""
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            idle = [user_id for user_id, replica in self._replicas.items() if replica.last_access < cutoff]
+            closed = [self._replicas.pop(user_id) for user_id in idle]
+            self.expired += len(closed)
+        for replica in closed:
+            replica.close()
+        return len(closed)
+
+    def close(self) -> None:
+        """Close every replica"""
+        with self._lock:
+            replicas = list(self._replicas.values())
+            self._replicas.clear()
+        for replica in replicas:
+            replica.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get replica metrics"""
+        reads = self.hits + self.misses
+        return {
+            "users": len(self._replicas),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / reads if reads else 0.0,
+            "opened": self.opened,
+            "expired": self.expired
+        }
@@ -0,0 +1,278 @@
+"""
+Profiler - on-demand sampling profiles of live requests
+
+A profiled request runs with a sampler thread that records the Python stack
+of every busy thread (the event loop and the worker threads running db, SSH
+and MetaTrader calls) every PROFILE_INTERVAL seconds. The stacks are stored
+with the route, status and duration as a JSON file in PROFILE_DIR and can be
+downloaded as JSON or in the folded format read by flamegraph.pl and
+speedscope.
+
+Requests are profiled when they carry an X-Profile header equal to the
+operator token (ADMIN_API_TOKEN, passed in by main.py), or at random with the sample rate set by an admin at
+runtime. The rate is stored in PROFILE_DIR so every worker process picks it
+up within SAMPLE_RATE_RECHECK seconds (it overrides PROFILE_SAMPLE_RATE, also
+after restarts, until the file is deleted). One request per process is
+profiled at a time (concurrent requests also show up in its samples). When
+no admin token is configured the profiling middleware is not installed.
+"""
+
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Fraction of requests profiled at startup (admins can change it at runtime)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Directory of stored profiles and how many are kept
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+# Seconds between checks for a sample rate set by another worker
+SAMPLE_RATE_RECHECK = 1.0
+# Deepest stack recorded per sample
+PROFILE_MAX_DEPTH = 64
+
+# Innermost (file, function) pairs of threads waiting for work
+_IDLE_FRAMES = {("queue.py", "get"), ("selectors.py", "select"), ("thread.py", "_worker")}
+
+def _is_idle(frame) -> bool:
+    """Whether a thread is parked waiting for work (pool workers, the idle event loop)"""
+    for _ in range(3):
+        if frame is None:
+            return False
+        if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES:
+            return True
+        frame = frame.f_back
+    return False
+
+class ProfileSession:
+    """Stack samples of one profiled request"""
+
+    def __init__(self, interval: float):
+        self.profile_id = secrets.token_hex(8)
+        self.interval = interval
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Sample the stacks of all other threads until stopped"""
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self) -> None:
+        """Stop sampling"""
+        self.duration = time.perf_counter() - self.start
+        self._stop.set()
+        self._thread.join()
+
+class RequestProfiler:
+    """Decides which requests to profile and stores their profiles"""
+
+    def __init__(self, admin_token: str, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 profile_dir: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES, interval: float = PROFILE_INTERVAL):
+        """
+        Initialize the profiler.
+
+        Args:
+            admin_token: Operator token accepted in the X-Profile header (empty disables profiling)
+            sample_rate: Fraction of requests profiled at random
+            profile_dir: Directory the profiles are stored in
+            max_files: Number of profiles kept (oldest are deleted first)
+            interval: Seconds between stack samples
+        """
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate if admin_token else 0.0
+        self.profile_dir = profile_dir
+        self.max_files = max_files
+        self.interval = interval
+        self._active = threading.Lock()
+        self._rate_checked = 0.0
+        self._rate_mtime = None
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admin_token)
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """Check an admin token"""
+        return bool(self.admin_token and token and secrets.compare_digest(token, self.admin_token))
+
+    def _rate_path(self) -> str:
+        return os.path.join(self.profile_dir, "sample_rate")
+
+    def set_sample_rate(self, sample_rate: float) -> None:
+        """Change the fraction of requests profiled at random (in every worker process)"""
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        temp_path = f"{self._rate_path()}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(str(self.sample_rate))
+        os.replace(temp_path, self._rate_path())
+        self._rate_mtime = os.path.getmtime(self._rate_path())
+
+    def _refresh_sample_rate(self) -> None:
+        """Pick up a sample rate stored by another worker (at most every SAMPLE_RATE_RECHECK seconds)"""
+        now = time.monotonic()
+        if now - self._rate_checked < SAMPLE_RATE_RECHECK:
+            return
+        self._rate_checked = now
+        try:
+            mtime = os.path.getmtime(self._rate_path())
+            if mtime == self._rate_mtime:
+                return
+            with open(self._rate_path()) as f:
+                self.sample_rate = min(max(float(f.read()), 0.0), 1.0)
+            self._rate_mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def start(self, profile_header: Optional[str]) -> Optional[ProfileSession]:
+        """
+        Start profiling a request if it asked for it or was sampled.
+
+        Args:
+            profile_header: Value of the request's X-Profile header
+
+        Returns:
+            The running session, or None if the request is not profiled
+        """
+        if not self.admin_token:
+            return None
+        self._refresh_sample_rate()
+        if not self.is_admin(profile_header) and not (self.sample_rate and random.random() < self.sample_rate):
+            return None
+        if not self._active.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        try:
+            return ProfileSession(self.interval)
+        except Exception:
+            self._active.release()
+            raise
+
+    def finish(self, session: ProfileSession, method: str, route: str, path: str, status: int) -> Dict[str, Any]:
+        """
+        Stop a session and store its profile.
+
+        Args:
+            session: Session returned by start()
+            method: HTTP method
+            route: Route template (e.g. /virtual-positions)
+            path: Request path
+            status: Response status code
+
+        Returns:
+            The stored profile's metadata
+        """
+        try:
+            session.stop()
+        finally:
+            self._active.release()
+
+        profile = {
+            "profile_id": session.profile_id,
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status,
+            "started_at": session.started_at,
+            "duration_ms": round(session.duration * 1000, 3),
+            "interval_ms": session.interval * 1000,
+            "samples": session.samples,
+            "stacks": session.stacks
+        }
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            with open(self._path(session.profile_id), "w") as f:
+                json.dump(profile, f)
+            self.profiled += 1
+            self._prune()
+        except Exception as e:
+            print(f"⚠️ Failed to store profile {session.profile_id}: {e}")
+        return {key: value for key, value in profile.items() if key != "stacks"}
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.profile_dir, f"{profile_id}.json")
+
+    def _files(self) -> List[str]:
+        """Stored profile files, newest first"""
+        if not os.path.isdir(self.profile_dir):
+            return []
+        paths = [os.path.join(self.profile_dir, name) for name in os.listdir(self.profile_dir) if name.endswith(".json")]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def _prune(self) -> None:
+        """Delete the oldest profiles beyond max_files"""
+        for path in self._files()[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first"""
+        profiles = []
+        for path in self._files():
+            try:
+                with open(path) as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profile.pop("stacks", None)
+            profiles.append(profile)
+        return profiles
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """Load a stored profile (None if unknown)"""
+        if not profile_id or any(c not in "0123456789abcdef" for c in profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get profiler settings and counters (of this worker process)"""
+        self._refresh_sample_rate()
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "active": self._active.locked(),
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy,
+            "stored": len(self._files())
+        }
+
+def folded(profile: Dict[str, Any]) -> str:
+    """Render a profile's stacks in the folded format ("thread;outer;inner count" per line)"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(profile["stacks"].items()))
@@ -0,0 +1,61 @@
+"""
+Fast JSON responses for the Travidox API using orjson
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from tracing import span
+
+# Options shared by every response rendered by the API
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """Fallback for values orjson cannot serialize natively"""
+    if isinstance(value, (datetime, date)):
+        # Subclasses such as Firestore's DatetimeWithNanoseconds keep the ISO format
+        return value.isoformat()
+    if hasattr(value, "_asdict"):
+        # MetaTrader5 returns named tuples for symbols, positions and account info
+        return value._asdict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def json_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Make the top-level values of a stored document JSON friendly, in place.
+
+    Timestamps (e.g. Firestore DatetimeWithNanoseconds) become ISO strings; other
+    values that are not plain JSON types (Sentinels, None) become their str(),
+    as the API has always sent them.
+    """
+    for key, value in list(data.items()):
+        if isinstance(value, (datetime, date)):
+            data[key] = value.isoformat()
+        elif not isinstance(value, (str, int, float, bool, list, dict)) or value is None:
+            data[key] = str(value)
+    return data
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+
+    Endpoints that return large payloads should return an instance of this class
+    directly so FastAPI skips its ``jsonable_encoder`` pass over the content.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with span("response.render"):
+            return dumps(content)
@@ -8,7 +8,7 @@ It uses your actual MetaTrader credentials from the .env file.
 import os
 import uuid
 from dotenv import load_dotenv
-from db import db
+from db import set_user_account
 
 # Load environment variables
 load_dotenv()
@@ -36,7 +36,7 @@ account_data = {
 }
 
 # Store in database
-db.set_user_account(DEV_USER_ID, account_data)
+set_user_account(DEV_USER_ID, account_data)
 
 print(f"""
 ✅ Development Account Created Successfully
@@ -7,6 +7,7 @@ This script installs the required Python packages and sets up the directory stru
 import os
 import sys
 import argparse
+import json
 import paramiko
 import time
 from dotenv import load_dotenv
@@ -211,30 +212,13 @@ def create_config_file(vps, mt_path):
     """Create the configuration file on the VPS"""
     print("\n🔧 Creating configuration file...")
     
-    config_content = f"""#!/usr/bin/env python
-\"\"\"
-Configuration file for VPS scripts.
-This file contains paths and settings for the MetaTrader terminal.
-\"\"\"
-
-import os
-
-# Path to MetaTrader terminal (can be overridden by environment variable)
-MT_TERMINAL_PATH = os.getenv("MT_TERMINAL_PATH", "{mt_path}")
-
-# Path to store account information
-ACCOUNTS_DIR = os.path.expanduser("~/mt_accounts")
-
-# Path to store order information
-ORDERS_DIR = os.path.expanduser("~/mt_orders")
-
-# Ensure directories exist
-def ensure_directories():
-    \"\"\"Ensure required directories exist\"\"\"
-    for directory in [ACCOUNTS_DIR, ORDERS_DIR]:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-"""
+    # Use the scripts' own config.py with the detected terminal path as default
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vps_scripts", "config.py")
+    with open(config_path, "r") as f:
+        config_content = f.read()
+    config_content = config_content.replace(
+        '"/home/your-user/.wine/drive_c/Program Files/MetaTrader 5"', json.dumps(mt_path)
+    )
     
     # Save the config file to a temporary location
     temp_file = "temp_config.py"
@@ -266,7 +250,13 @@ def upload_scripts(vps):
         "list_symbols.py",
         "get_positions.py",
         "close_position.py",
-        "get_account_info.py"
+        "get_account_info.py",
+        "symbol_classifier.py",
+        "mt_session.py",
+        "registry.py",
+        "get_order_history.py",
+        "terminal_pool.py",
+        "pool_client.py"
     ]
     
     # Upload each script
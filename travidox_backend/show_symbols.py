@@ -7,6 +7,7 @@ import MetaTrader5 as mt5
 import pandas as pd
 from dotenv import load_dotenv
 import os
+from vps_scripts.symbol_classifier import classify_symbols
 
 # Load environment variables
 load_dotenv()
@@ -58,25 +59,14 @@ def main():
     # Print symbols
     print(f"\n=== AVAILABLE SYMBOLS ({len(symbols)}) ===")
     
-    # Create categories of symbols
-    forex = symbols_df[symbols_df['name'].str.contains('USD|EUR|GBP|JPY|AUD|CAD|CHF|NZD')]
-    crypto = symbols_df[symbols_df['name'].str.contains('BTC|ETH|LTC|XRP')]
+    # Group symbols by category
+    groups = classify_symbols(symbols_df['name'])
     
-    # Print forex symbols
-    print("\n--- FOREX SYMBOLS ---")
-    for name in forex['name'].sort_values():
-        print(name)
-    
-    # Print crypto symbols
-    print("\n--- CRYPTO SYMBOLS ---")
-    for name in crypto['name'].sort_values():
-        print(name)
-    
-    # Print other symbols
-    print("\n--- OTHER SYMBOLS ---")
-    other = symbols_df[~symbols_df['name'].isin(forex['name']) & ~symbols_df['name'].isin(crypto['name'])]
-    for name in other['name'].sort_values():
-        print(name)
+    # Print symbols of each category
+    for category, names in groups.items():
+        print(f"\n--- {category.upper()} SYMBOLS ({len(names)}) ---")
+        for name in sorted(names):
+            print(name)
     
     # Close connection
     mt5.shutdown()
@@ -0,0 +1,186 @@
+"""
+Symbol Catalog - in-memory, versioned cache of tradable symbols
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from responses import dumps
+from symbol_search import SymbolSearchIndex
+
+# How often the catalog is reloaded from MetaTrader (seconds)
+SYMBOL_REFRESH_INTERVAL = float(os.getenv("SYMBOL_REFRESH_INTERVAL", "3600"))
+
+class SymbolCatalog:
+    """
+    Keeps the full symbol list in memory with a per-category index.
+
+    The list is loaded once through `loader` and reloaded in the background every
+    `refresh_interval` seconds. Each load produces a new version; the serialized
+    payload and ETag for every category are computed at load time so requests
+    only do a dictionary lookup. Only one load runs at a time: requests arriving
+    before the first load has finished wait for it instead of starting their own.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], refresh_interval: float = SYMBOL_REFRESH_INTERVAL):
+        """
+        Initialize the catalog.
+
+        Args:
+            loader: Callable returning the full list of formatted symbols
+            refresh_interval: Seconds between background reloads
+        """
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self.loaded_at = None
+        self._symbols: List[Dict[str, Any]] = []
+        self._by_category: Dict[str, List[Dict[str, Any]]] = {}
+        self._payloads: Dict[Optional[str], Tuple[bytes, str]] = {}
+        self._search_index = SymbolSearchIndex([])
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self) -> bool:
+        """
+        Reload symbols from the loader and publish a new version.
+
+        Returns:
+            True if the catalog was reloaded, False if the loader failed
+            (the previous version is kept in that case)
+        """
+        with self._load_lock:
+            return self._load()
+
+    def _load(self) -> bool:
+        """Run the loader and publish a new version (caller holds _load_lock)"""
+        try:
+            symbols = self.loader()
+        except Exception as e:
+            print(f"Error loading symbol catalog: {str(e)}")
+            return False
+
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for symbol in symbols:
+            by_category.setdefault(symbol.get("category", "other"), []).append(symbol)
+
+        body = dumps(symbols)
+        version = hashlib.sha1(body).hexdigest()[:16]
+        payloads = {None: (body, f'"{version}"')}
+        for category, items in by_category.items():
+            payloads[category] = (dumps(items), f'"{version}-{category}"')
+        search_index = SymbolSearchIndex(symbols)
+
+        with self._lock:
+            self._symbols = symbols
+            self._by_category = by_category
+            self._payloads = payloads
+            self._search_index = search_index
+            self.version = version
+            self.loaded_at = time.time()
+        return True
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    def ensure_loaded(self) -> None:
+        """
+        Load the catalog on first use (blocking; call it from a worker thread).
+
+        Raises:
+            RuntimeError: If the catalog could not be loaded
+        """
+        if self.version is not None:
+            return
+        with self._load_lock:
+            if self.version is None and not self._load():
+                raise RuntimeError("Symbol catalog is not available")
+
+    def get_symbols(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get all symbols, or the symbols of one category"""
+        self.ensure_loaded()
+        if category:
+            return self._by_category.get(category.lower(), [])
+        return self._symbols
+
+    def get_payload(self, category: Optional[str] = None) -> Tuple[bytes, str]:
+        """
+        Get the serialized symbol list and its ETag.
+
+        Args:
+            category: Optional category filter
+
+        Returns:
+            Tuple of (JSON body, ETag)
+        """
+        self.ensure_loaded()
+        payloads = self._payloads
+        if category:
+            category = category.lower()
+            if category not in payloads:
+                return b"[]", f'"{self.version}-{category}"'
+        return payloads[category]
+
+    def search(self, query: str, limit: int = 20, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search the catalog by symbol name and description.
+
+        Args:
+            query: Search text (prefix, substring or approximate spelling)
+            limit: Maximum number of results
+            category: Optional category filter
+
+        Returns:
+            Matching symbols, best matches first
+        """
+        self.ensure_loaded()
+        return self._search_index.search(query, limit, category)
+
+    def _run(self) -> None:
+        """Background refresh loop (loads the catalog right away if it is still empty)"""
+        if self.version is None:
+            self.refresh()
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def start(self) -> None:
+        """Start refreshing the catalog in the background"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="symbol-catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh"""
+        self._stop.set()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, RFC 7232).
+
+    Args:
+        if_none_match: Header value ("*" or a comma-separated list of tags, possibly W/ prefixed)
+        etag: Current ETag of the resource
+
+    Returns:
+        True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
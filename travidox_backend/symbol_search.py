@@ -0,0 +1,147 @@
+"""
+Symbol Search - in-memory prefix, substring and fuzzy index over symbols
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+# Scores per kind of match (higher ranks first)
+EXACT_SCORE = 100.0
+NAME_PREFIX_SCORE = 80.0
+DESCRIPTION_PREFIX_SCORE = 60.0
+NAME_SUBSTRING_SCORE = 50.0
+DESCRIPTION_SUBSTRING_SCORE = 40.0
+FUZZY_SCORE = 30.0
+
+# Minimum fraction of the query's trigrams a fuzzy match must share
+FUZZY_THRESHOLD = 0.5
+
+def _trigrams(text: str) -> Set[str]:
+    """Get the trigrams of a text, padded so short words still produce some"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SymbolSearchIndex:
+    """
+    Search index built once per symbol catalog version.
+
+    Prefix lookups use sorted key lists and binary search; substring and fuzzy
+    lookups use a trigram inverted index over name and description.
+    """
+
+    def __init__(self, symbols: List[Dict[str, Any]]):
+        """
+        Build the index.
+
+        Args:
+            symbols: Formatted symbols (as served by /symbols)
+        """
+        self.symbols = symbols
+        self._names = [s.get("name", "").lower() for s in symbols]
+        self._descriptions = [(s.get("description") or "").lower() for s in symbols]
+
+        # Sorted (key, symbol index) pairs for prefix search on names and description words
+        self._name_keys = sorted((name, i) for i, name in enumerate(self._names))
+        self._word_keys = sorted(
+            {(word, i) for i, description in enumerate(self._descriptions) for word in description.split()}
+        )
+
+        # Trigram -> symbol indexes
+        self._trigrams: Dict[str, Set[int]] = {}
+        for i in range(len(symbols)):
+            for gram in _trigrams(self._names[i]) | _trigrams(self._descriptions[i]):
+                self._trigrams.setdefault(gram, set()).add(i)
+
+    def _prefix_matches(self, keys, prefix: str) -> Iterator[int]:
+        """Yield the symbol indexes whose key starts with prefix, in key order"""
+        for pos in range(bisect_left(keys, (prefix, -1)), len(keys)):
+            key, i = keys[pos]
+            if not key.startswith(prefix):
+                break
+            yield i
+
+    def _fuzzy_candidates(self, query_grams: Set[str]) -> Counter:
+        """
+        Count shared trigrams for symbols that can reach FUZZY_THRESHOLD.
+
+        A symbol sharing at least `needed` of the query's trigrams must contain one
+        of the (len - needed + 1) rarest ones, so only those postings are scanned
+        to find candidates.
+        """
+        postings = sorted((self._trigrams.get(g, set()) for g in query_grams), key=len)
+        needed = max(1, math.ceil(len(postings) * FUZZY_THRESHOLD))
+        candidates = set().union(*postings[:len(postings) - needed + 1])
+        counts = Counter()
+        for posting in postings:
+            counts.update(candidates & posting if len(posting) > len(candidates) else posting & candidates)
+        return counts
+
+    def search(self, query: str, limit: int = 20, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search symbols by name and description.
+
+        Matches are ranked exact name, name prefix, description word prefix, name
+        substring, description substring, then fuzzy. Every match of a stage is
+        scored before the results are cut to `limit`, and later stages only run
+        while the earlier ones have not filled `limit` results, since they can
+        never outrank them.
+
+        Args:
+            query: Search text
+            limit: Maximum number of results
+            category: Optional category filter
+
+        Returns:
+            Matching symbols, best matches first
+        """
+        query = query.strip().lower()
+        if not query or limit <= 0:
+            return []
+        category = category.lower() if category else None
+
+        scores: Dict[int, float] = {}
+
+        def add(i: int, score: float) -> None:
+            """Record a match unless the symbol already matched an earlier stage"""
+            if i not in scores and (not category or self.symbols[i].get("category") == category):
+                scores[i] = score
+
+        def done() -> List[Dict[str, Any]]:
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -len(self._names[item[0]])))
+            return [self.symbols[i] for i, _ in best]
+
+        # Prefix matches
+        for i in self._prefix_matches(self._name_keys, query):
+            add(i, EXACT_SCORE if self._names[i] == query else NAME_PREFIX_SCORE)
+        for i in self._prefix_matches(self._word_keys, query):
+            add(i, DESCRIPTION_PREFIX_SCORE)
+        if len(scores) >= limit:
+            return done()
+
+        # Substring matches: candidates contain every inner trigram of the query;
+        # queries shorter than three characters have none and scan every symbol
+        postings = sorted((self._trigrams.get(g, set()) for g in _trigrams(query) if g.strip() == g), key=len)
+        candidates = set.intersection(*postings) if postings else range(len(self.symbols))
+        description_matches = []
+        for i in candidates:
+            if query in self._names[i]:
+                add(i, NAME_SUBSTRING_SCORE)
+            elif query in self._descriptions[i]:
+                description_matches.append(i)
+        for i in description_matches:
+            add(i, DESCRIPTION_SUBSTRING_SCORE)
+        if len(scores) >= limit:
+            return done()
+
+        # Fuzzy matches
+        if len(query) >= 3:
+            query_grams = _trigrams(query)
+            for i, count in self._fuzzy_candidates(query_grams).items():
+                similarity = count / len(query_grams)
+                if similarity >= FUZZY_THRESHOLD:
+                    add(i, FUZZY_SCORE * similarity)
+
+        return done()
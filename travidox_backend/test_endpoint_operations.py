@@ -0,0 +1,219 @@
+"""
+Tests for the storage and VPS operations each endpoint makes per request
+
+Run with: pytest test_endpoint_operations.py
+"""
+
+import contextlib
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import db
+from account_snapshot import AccountSnapshotCache
+from circuit_breaker import get_breaker
+from db import FirestoreDB
+from instrumentation import assert_max_operations
+from user_account_cache import UserAccountCache
+from vps_manager import MetaTraderManager, VPSManager
+
+# Firestore client answering the reads and batches the endpoints make
+
+class FakeWriteResult:
+    update_time = None
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, client, collection, doc_id):
+        self.client = client
+        self.path = (collection, doc_id)
+        self.id = doc_id
+
+    def get(self):
+        return FakeSnapshot(self, self.client.docs.get(self.path))
+
+class FakeQuery:
+    def __init__(self, client, collection, filters=()):
+        self.client = client
+        self.collection = collection
+        self.filters = filters
+
+    def where(self, field, op, value):
+        return FakeQuery(self.client, self.collection, self.filters + ((field, value),))
+
+    def stream(self):
+        for (collection, doc_id), data in list(self.client.docs.items()):
+            if collection == self.collection and all(data.get(field) == value for field, value in self.filters):
+                yield FakeSnapshot(FakeDocument(self.client, collection, doc_id), data)
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id=None):
+        return FakeDocument(self.client, self.collection, doc_id or uuid.uuid4().hex)
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data, merge))
+
+    def delete(self, ref, option=None):
+        self.writes.append((ref.path, None, False))
+
+    def commit(self):
+        for path, data, merge in self.writes:
+            if data is None:
+                self.client.docs.pop(path, None)
+                continue
+            doc = self.client.docs.setdefault(path, {}) if merge else {}
+            for field, value in data.items():
+                # firestore.Increment adds to the stored value
+                doc[field] = doc.get(field, 0) + value.value if hasattr(value, "value") else value
+            self.client.docs[path] = doc
+        return [FakeWriteResult() for _ in self.writes]
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def write_option(self, **kwargs):
+        return kwargs
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+# SSH client answering the account snapshot scripts
+
+class FakeStream:
+    def __init__(self, text=""):
+        self.text = text
+
+    def read(self):
+        return self.text.encode("utf-8")
+
+class FakeSSHClient:
+    def exec_command(self, command, timeout=None):
+        account = {"success": True, "account": {"login": 1001, "balance": 1000.0, "equity": 1000.0}}
+        positions = {"success": True, "positions": [{"ticket": 1, "symbol": "EURUSD", "volume": 0.1}]}
+        return None, FakeStream(f"{json.dumps(account)}\n{json.dumps(positions)}\n"), FakeStream()
+
+    def close(self):
+        pass
+
+class StaticQuotes:
+    """Market data provider returning a fixed quote"""
+
+    def get_forex_quote(self, symbol):
+        return {"bid": 1.1, "ask": 1.1002}
+
+@pytest.fixture
+def client(main_module, monkeypatch, tmp_path):
+    main = main_module
+    firestore = FakeFirestore()
+    firestore.docs[(db.users_collection, "user1")] = {"mt_account": {"account_id": "acc1", "status": "connected"}}
+    firestore.docs[(db.virtual_accounts_collection, "user1")] = {"balance": 1000.0, "margin": 0.022, "free_margin": 999.978}
+    for position_id, symbol in (("pos1", "EURUSD"), ("pos2", "GBPUSD")):
+        firestore.docs[(db.virtual_positions_collection, position_id)] = {
+            "position_id": position_id,
+            "user_id": "user1",
+            "symbol": symbol,
+            "order_type": "BUY",
+            "volume": 1.0,
+            "open_price": 1.0,
+            "closed": False
+        }
+
+    monkeypatch.chdir(tmp_path)
+    database = FirestoreDB()
+    database.db = firestore
+    database.replicas = None
+    monkeypatch.setattr(db, "firestore_db", database)
+    monkeypatch.setattr(db, "user_account_cache", UserAccountCache(str(tmp_path / "user_account_cache.db")))
+
+    vps = VPSManager.__new__(VPSManager)
+    vps.host = "vps-test"
+    vps.client = FakeSSHClient()
+    vps.breaker = get_breaker("vps:vps-test")
+    monkeypatch.setattr(main, "mt_manager", MetaTraderManager(vps, "~/mt_scripts"))
+    monkeypatch.setattr(main, "account_snapshots", AccountSnapshotCache())
+    monkeypatch.setattr(main.trading_bot, "market_data", StaticQuotes())
+
+    # Keep each request's operation counts from the middleware's scope
+    requests = []
+    track_operations = main.track_operations
+
+    @contextlib.contextmanager
+    def recording(label=""):
+        with track_operations(label) as stats:
+            requests.append(stats)
+            yield stats
+
+    monkeypatch.setattr(main, "track_operations", recording)
+    main.app.dependency_overrides[main.verify_firebase_token] = lambda: {"uid": "user1"}
+    try:
+        with TestClient(main.app) as test_client:
+            test_client.requests = requests
+            test_client.firestore = firestore
+            yield test_client
+    finally:
+        main.app.dependency_overrides.clear()
+
+def test_positions_operation_budget(client):
+    response = client.get("/positions")
+
+    assert response.status_code == 200
+    assert response.json()[0]["symbol"] == "EURUSD"
+    operations = client.requests[-1]
+    # Linked account lookup + one SSH round trip for account info and positions
+    assert_max_operations(operations, 1, kind="firestore")
+    assert_max_operations(operations, 1, kind="vps")
+    assert_max_operations(operations, 0, kind="json")
+    assert operations.count(kind="vps") == 1
+
+def test_account_info_operation_budget(client):
+    response = client.get("/account-info")
+
+    assert response.status_code == 200
+    assert response.json()["login"] == 1001
+    operations = client.requests[-1]
+    assert_max_operations(operations, 1, kind="firestore")
+    assert_max_operations(operations, 1, kind="vps")
+    assert_max_operations(operations, 0, kind="json")
+
+def test_account_info_after_positions_is_served_from_caches(client):
+    client.get("/positions")
+    response = client.get("/account-info")
+
+    assert response.status_code == 200
+    assert_max_operations(client.requests[-1], 0)
+
+def test_virtual_positions_close_operation_budget(client):
+    response = client.post("/virtual-positions/close", json={})
+
+    assert response.status_code == 200
+    assert response.json()["closed"] == 2
+    operations = client.requests[-1]
+    # One positions query and one batch for both closes, however many positions match
+    assert_max_operations(operations, 2, kind="firestore")
+    assert_max_operations(operations, 1, kind="firestore", name="close_virtual_positions")
+    assert_max_operations(operations, 0, kind="json")
+    assert_max_operations(operations, 0, kind="vps")
+    assert (db.virtual_positions_collection, "pos1") not in client.firestore.docs
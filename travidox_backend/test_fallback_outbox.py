@@ -0,0 +1,183 @@
+"""
+Tests for the fallback outbox: replay, idempotent re-replay and conflicts
+
+Run with: pytest test_fallback_outbox.py
+"""
+
+import datetime
+import time
+
+import pytest
+
+import db
+from circuit_breaker import CircuitBreaker
+from db import SimpleDB
+from fallback_outbox import FallbackOutbox, OutboxReplayer
+
+# Firestore client whose clock runs `offset` seconds ahead of the local clock
+
+class FakeWriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time, read_time):
+        self.reference = reference
+        self.exists = data is not None
+        self.update_time = update_time
+        self.read_time = read_time
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, collection, doc_id):
+        self.path = f"{collection}/{doc_id}"
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self.name, doc_id)
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append(("set", ref.path, data, merge))
+
+    def delete(self, ref):
+        self.writes.append(("delete", ref.path, None, False))
+
+    def commit(self):
+        self.client.commits += 1
+        now = self.client.now()
+        for kind, path, data, merge in self.writes:
+            if kind == "delete":
+                self.client.docs.pop(path, None)
+                continue
+            doc = self.client.docs.setdefault(path, {}) if merge else {}
+            for field, value in data.items():
+                # firestore.Increment adds to the stored value
+                doc[field] = doc.get(field, 0) + value.value if hasattr(value, "value") else value
+            self.client.docs[path] = doc
+            self.client.update_times[path] = now
+        return [FakeWriteResult(None if kind == "delete" else now) for kind, _, _, _ in self.writes]
+
+class FakeFirestore:
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.docs = {}
+        self.update_times = {}
+        self.commits = 0
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(time.time() + self.offset, datetime.timezone.utc)
+
+    def collection(self, name):
+        return FakeCollection(name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, refs):
+        read_time = self.now()
+        return [FakeSnapshot(ref, self.docs.get(ref.path), self.update_times.get(ref.path), read_time) for ref in refs]
+
+    def write(self, path, data, seconds_ago=0.0):
+        """Write a document directly, as another client would"""
+        self.docs[path] = dict(data)
+        self.update_times[path] = self.now() - datetime.timedelta(seconds=seconds_ago)
+
+ACCOUNT = f"{db.virtual_accounts_collection}/user1"
+
+@pytest.fixture
+def outbox(tmp_path):
+    return FallbackOutbox(str(tmp_path / "outbox.db"))
+
+@pytest.fixture
+def fallback(outbox, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return SimpleDB(outbox=outbox)
+
+def replayer_for(outbox, client):
+    return OutboxReplayer(outbox, client, CircuitBreaker("firestore-test"))
+
+def test_replay_applies_balance_increments_and_derived_fields_as_values(outbox, fallback):
+    client = FakeFirestore()
+    client.write(ACCOUNT, {"balance": 1000.0, "equity": 1000.0, "floating_pnl": 0.0}, seconds_ago=60)
+    fallback.update_virtual_account("user1", {"balance": 1000.0, "equity": 1000.0, "floating_pnl": 0.0})
+    outbox._conn.execute("DELETE FROM outbox")
+
+    # Outage: a close credits 50 and the bot rewrites the floating fields
+    fallback.adjust_virtual_account("user1", {"balance": 50.0})
+    fallback.update_virtual_account("user1", {"floating_pnl": 5.0, "equity": 1055.0})
+
+    assert replayer_for(outbox, client).replay_once() == 2
+
+    account = client.docs[ACCOUNT]
+    assert account["balance"] == pytest.approx(1050.0)
+    assert account["equity"] == pytest.approx(1055.0)
+    assert account["floating_pnl"] == pytest.approx(5.0)
+    assert not outbox.has_pending()
+
+def test_replay_after_commit_without_complete_is_not_applied_twice(outbox, fallback):
+    client = FakeFirestore()
+    client.write(ACCOUNT, {"balance": 1000.0}, seconds_ago=60)
+    fallback.update_virtual_account("user1", {"balance": 1000.0})
+    outbox._conn.execute("DELETE FROM outbox")
+    fallback.adjust_virtual_account("user1", {"balance": 50.0})
+    replayer = replayer_for(outbox, client)
+
+    # The replayer commits the batch, then dies before completing the entries locally
+    entries = outbox.claim(10)
+    replayer._apply(entries)
+    outbox.release([entry["id"] for entry in entries], "worker died")
+
+    assert replayer.replay_once() == 1
+    assert client.docs[ACCOUNT]["balance"] == pytest.approx(1050.0)
+    assert client.commits == 1
+    assert not outbox.has_pending()
+
+def test_set_changed_in_firestore_after_fallback_write_is_a_conflict(outbox):
+    client = FakeFirestore()
+    path = f"{db.virtual_positions_collection}/pos1"
+    outbox.add("user1", "set", db.virtual_positions_collection, "pos1", {"current_price": 1.1})
+    # The fallback write was made a minute before Firestore's update, far more than
+    # the clock offset estimate can be off by (half of one get_all round trip)
+    outbox._conn.execute("UPDATE outbox SET created_at = created_at - 60")
+    client.write(path, {"current_price": 1.3})
+
+    assert replayer_for(outbox, client).replay_once() == 1
+
+    assert client.docs[path]["current_price"] == 1.3
+    conflicts = outbox.conflicted()
+    assert [conflict["doc_id"] for conflict in conflicts] == ["pos1"]
+
+def test_conflict_check_corrects_for_server_clock_skew(outbox):
+    # Firestore's clock is an hour ahead: its last update is older than the fallback write
+    client = FakeFirestore(offset=3600)
+    path = f"{db.virtual_positions_collection}/pos1"
+    client.write(path, {"current_price": 1.3}, seconds_ago=60)
+    outbox.add("user1", "set", db.virtual_positions_collection, "pos1", {"current_price": 1.1})
+
+    assert replayer_for(outbox, client).replay_once() == 1
+
+    assert client.docs[path]["current_price"] == 1.1
+    assert outbox.conflicted() == []
+
+def test_create_of_existing_document_is_skipped(outbox):
+    client = FakeFirestore()
+    path = f"{db.trading_history_collection}/h1"
+    client.write(path, {"profit_loss": 10.0}, seconds_ago=60)
+    outbox.add("user1", "create", db.trading_history_collection, "h1", {"profit_loss": 99.0})
+
+    assert replayer_for(outbox, client).replay_once() == 1
+
+    assert client.docs[path] == {"profit_loss": 10.0}
+    assert client.commits == 0
+    assert not outbox.has_pending()
@@ -0,0 +1,50 @@
+"""
+Tests for the order queue's shared job store
+
+Run with: pytest test_order_queue.py
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from order_queue import OrderJobStore, OrderQueue
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "order_jobs.db")
+
+def test_job_is_visible_and_waitable_from_another_worker(store_path):
+    release = threading.Event()
+
+    def execute(job):
+        release.wait(5)
+        return {"success": True, "ticket": 42}
+
+    accepting = OrderQueue(execute, max_workers=1, store=OrderJobStore(store_path))
+    polling = OrderQueue(execute, max_workers=1, store=OrderJobStore(store_path))
+    job = accepting.submit("user1", "acc1", {"symbol": "EURUSD"})
+
+    other = polling.get(job.id)
+    assert other.user_id == "user1"
+    assert other.status in ("queued", "running")
+
+    release.set()
+    finished = asyncio.run(polling.wait(other, 5))
+    assert finished.status == "filled"
+    assert finished.result == {"success": True, "ticket": 42}
+
+def test_counters_count_every_finished_job(store_path):
+    queue = OrderQueue(lambda job: {"success": job.payload["ok"]}, max_workers=4, store=OrderJobStore(store_path))
+    jobs = [queue.submit("user1", f"acc{i % 5}", {"ok": i % 3 != 0}) for i in range(60)]
+
+    async def wait_all():
+        return [await queue.wait(job) for job in jobs]
+
+    asyncio.run(wait_all())
+    queue._executor.shutdown(wait=True)
+
+    assert queue.completed == 40
+    assert queue.failed == 20
+    assert queue.pending == 0
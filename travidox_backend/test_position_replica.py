@@ -0,0 +1,89 @@
+"""
+Tests for the Firestore listener replica (position_replica.py)
+
+Runs against the Firestore emulator and is skipped unless it is running:
+
+    gcloud emulators firestore start --host-port=localhost:8080
+    FIRESTORE_EMULATOR_HOST=localhost:8080 pytest test_position_replica.py
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("FIRESTORE_EMULATOR_HOST"),
+    reason="FIRESTORE_EMULATOR_HOST is not set"
+)
+
+from position_replica import ReplicaManager
+
+POSITIONS = "virtual_positions"
+ACCOUNTS = "virtual_accounts"
+
+@pytest.fixture
+def client():
+    from google.cloud import firestore
+    return firestore.Client(project="travidox-test")
+
+@pytest.fixture
+def replicas(client):
+    manager = ReplicaManager(client, POSITIONS, ACCOUNTS, idle_ttl=60, sync_timeout=5)
+    yield manager
+    manager.close()
+
+def add_position(client, user_id, symbol, closed=False):
+    ref = client.collection(POSITIONS).document()
+    result = ref.set({"user_id": user_id, "position_id": ref.id, "symbol": symbol, "closed": closed})
+    return ref, result
+
+def test_initial_snapshot(client, replicas):
+    user_id = f"user_{uuid.uuid4().hex}"
+    add_position(client, user_id, "EURUSD")
+    add_position(client, user_id, "GBPUSD", closed=True)
+    add_position(client, f"other_{uuid.uuid4().hex}", "USDJPY")
+    client.collection(ACCOUNTS).document(user_id).set({"balance": 1000.0})
+
+    positions = replicas.get_positions(user_id)
+    assert [p["symbol"] for p in positions] == ["EURUSD"]
+    assert replicas.get_account(user_id)["balance"] == 1000.0
+
+def test_read_your_writes(client, replicas):
+    user_id = f"user_{uuid.uuid4().hex}"
+    assert replicas.get_positions(user_id) == []
+
+    ref, result = add_position(client, user_id, "EURUSD")
+    replicas.note_write(user_id, result)
+    assert [p["symbol"] for p in replicas.get_positions(user_id)] == ["EURUSD"]
+
+    replicas.note_write(user_id, ref.delete())
+    assert replicas.get_positions(user_id) == []
+
+    account_ref = client.collection(ACCOUNTS).document(user_id)
+    replicas.note_write(user_id, account_ref.set({"balance": 1500.0}), positions=False, account=True)
+    assert replicas.get_account(user_id)["balance"] == 1500.0
+
+def test_reads_are_served_locally(client, replicas):
+    user_id = f"user_{uuid.uuid4().hex}"
+    add_position(client, user_id, "EURUSD")
+    replicas.get_positions(user_id)
+    replica = replicas._replicas[user_id]
+    snapshots = replica.snapshots
+
+    for _ in range(10):
+        assert len(replicas.get_positions(user_id)) == 1
+    assert replica.snapshots == snapshots
+    assert replicas.stats()["opened"] == 1
+
+def test_idle_expiry(client, replicas):
+    user_id = f"user_{uuid.uuid4().hex}"
+    replicas.get_positions(user_id)
+    replica = replicas._replicas[user_id]
+
+    replicas.idle_ttl = 0
+    time.sleep(0.01)
+    assert replicas.sweep() == 1
+    assert user_id not in replicas._replicas
+    assert not replica.active
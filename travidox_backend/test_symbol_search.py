@@ -0,0 +1,80 @@
+"""
+Tests for symbol search ranking, short queries and latency
+
+Run with: pytest test_symbol_search.py
+"""
+
+import random
+import string
+import time
+
+import pytest
+
+from symbol_search import SymbolSearchIndex
+
+CATALOG = [
+    {"name": "USDEUR", "description": "Dollar cross", "category": "forex"},
+    {"name": "NRTH", "description": "Neuro Health Inc", "category": "stock"},
+    {"name": "STOXX50", "description": "Euro Stoxx 50 index", "category": "index"},
+    {"name": "EURUSDX", "description": "Euro vs US Dollar (mini)", "category": "forex"},
+    {"name": "EURUSD", "description": "Euro vs US Dollar", "category": "forex"},
+    {"name": "EUR", "description": "Euro currency index", "category": "index"},
+    {"name": "USDJPY", "description": "US Dollar vs Japanese Yen", "category": "forex"},
+    {"name": "XAUUSD", "description": "Gold vs US Dollar", "category": "commodity"},
+    {"name": "BTCUSD", "description": "Bitcoin vs US Dollar", "category": "crypto"}
+]
+
+@pytest.fixture
+def index():
+    return SymbolSearchIndex(CATALOG)
+
+def names(results):
+    return [symbol["name"] for symbol in results]
+
+def test_ranks_exact_then_prefixes_then_substrings(index):
+    # exact name, name prefixes (shorter first), description word prefix,
+    # name substring, description substring
+    assert names(index.search("eur")) == ["EUR", "EURUSD", "EURUSDX", "STOXX50", "USDEUR", "NRTH"]
+
+def test_limit_keeps_the_best_ranked_matches_of_a_stage(index):
+    assert names(index.search("eurus", limit=1)) == ["EURUSD"]
+    assert names(index.search("eur", limit=3)) == ["EUR", "EURUSD", "EURUSDX"]
+
+def test_misspelling_matches_by_trigrams(index):
+    assert names(index.search("eurosd"))[0] == "EURUSD"
+
+def test_short_queries_find_substring_matches(index):
+    # One and two characters have no inner trigram, so every symbol is scanned
+    results = names(index.search("sd"))
+    assert set(results[:5]) == {"BTCUSD", "EURUSD", "USDEUR", "USDJPY", "XAUUSD"}
+    assert results[5:] == ["EURUSDX"]
+    assert names(index.search("j")) == ["USDJPY"]
+
+def test_category_filter(index):
+    assert names(index.search("eur", category="INDEX")) == ["EUR", "STOXX50"]
+
+def test_empty_query_or_limit_returns_nothing(index):
+    assert index.search("  ") == []
+    assert index.search("eur", limit=0) == []
+
+def test_typical_queries_on_a_large_catalog_are_fast():
+    rng = random.Random(7)
+    symbols = [
+        {
+            "name": "".join(rng.choices(string.ascii_uppercase, k=6)),
+            "description": " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(4)),
+            "category": rng.choice(["forex", "stock", "index", "crypto"])
+        }
+        for _ in range(30000)
+    ]
+    index = SymbolSearchIndex(symbols)
+    queries = [symbols[i]["name"][:k].lower() for i in range(0, 30000, 300) for k in (2, 4, 6)]
+    queries += [symbols[i]["description"].split()[1][:5] for i in range(0, 30000, 300)]
+
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    average = (time.perf_counter() - start) / len(queries)
+
+    # Typical queries take tens of microseconds; the bound leaves room for slow machines
+    assert average < 0.01
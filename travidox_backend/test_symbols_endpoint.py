@@ -0,0 +1,77 @@
+"""
+Tests for GET /symbols conditional requests (ETag / If-None-Match)
+
+Run with: pytest test_symbols_endpoint.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from symbol_catalog import SymbolCatalog
+
+@pytest.fixture
+def symbols():
+    return [
+        {"name": "EURUSD", "description": "Euro vs US Dollar", "category": "forex"},
+        {"name": "BTCUSD", "description": "Bitcoin vs US Dollar", "category": "crypto"}
+    ]
+
+@pytest.fixture
+def catalog(main_module, monkeypatch, symbols):
+    main = main_module
+    catalog = SymbolCatalog(lambda: list(symbols))
+    monkeypatch.setattr(main, "symbol_catalog", catalog)
+    # Any configured manager will do: the catalog's loader is replaced
+    monkeypatch.setattr(main, "mt_manager", object())
+    main.app.dependency_overrides[main.verify_firebase_token] = lambda: {"uid": "user1"}
+    yield catalog
+    main.app.dependency_overrides.clear()
+
+@pytest.fixture
+def client(main_module, catalog):
+    # No context manager: the startup hooks (background refresh threads) are not needed
+    return TestClient(main_module.app)
+
+def test_symbols_returns_etag(client):
+    response = client.get("/symbols")
+
+    assert response.status_code == 200
+    assert [symbol["name"] for symbol in response.json()] == ["EURUSD", "BTCUSD"]
+    assert response.headers["ETag"].startswith('"')
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+def test_symbols_matching_strong_etag_is_not_modified(client):
+    etag = client.get("/symbols").headers["ETag"]
+
+    response = client.get("/symbols", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+def test_symbols_matching_weak_etag_is_not_modified(client):
+    etag = client.get("/symbols").headers["ETag"]
+
+    response = client.get("/symbols", headers={"If-None-Match": f'"stale", W/{etag}'})
+
+    assert response.status_code == 304
+
+def test_symbols_category_has_its_own_etag(client):
+    etag = client.get("/symbols").headers["ETag"]
+
+    response = client.get("/symbols", params={"category": "crypto"}, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert [symbol["name"] for symbol in response.json()] == ["BTCUSD"]
+    assert response.headers["ETag"] != etag
+
+def test_symbols_refresh_with_changes_returns_new_etag(client, catalog, symbols):
+    etag = client.get("/symbols").headers["ETag"]
+    symbols.append({"name": "XAUUSD", "description": "Gold vs US Dollar", "category": "commodity"})
+
+    assert catalog.refresh()
+    response = client.get("/symbols", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 3
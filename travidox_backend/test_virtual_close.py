@@ -0,0 +1,284 @@
+"""
+Tests for the virtual close path: storage operations per close and P&L
+
+Run with: pytest test_virtual_close.py
+"""
+
+import datetime
+import uuid
+
+import pytest
+from google.api_core.exceptions import NotFound
+
+import db
+from db import FirestoreDB, SimpleDB
+from instrumentation import assert_max_operations, track_operations
+from position_replica import ReplicaManager
+from trading_bot import TradingBot
+
+class StaticQuotes:
+    """Market data provider returning a fixed quote"""
+
+    def get_forex_quote(self, symbol):
+        return {"bid": 1.1, "ask": 1.1002}
+
+class StaleQuotes:
+    """Market data provider whose feed is down, serving the last cached quote"""
+
+    def get_forex_quote(self, symbol):
+        return {"bid": 1.1, "ask": 1.1002, "stale": True, "stale_reason": "Alpha Vantage is unavailable (circuit open)"}
+
+# Firestore client recording every read and commit
+
+class FakeWriteResult:
+    def __init__(self, deleted=False):
+        # Firestore leaves update_time unset for deletes
+        self.update_time = None if deleted else datetime.datetime.now(datetime.timezone.utc)
+
+class FakeWatch:
+    """Listener that never delivers a snapshot (replica reads fall through to Firestore)"""
+
+    is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeDocument:
+    def __init__(self, client, collection, doc_id):
+        self.client = client
+        self.path = (collection, doc_id)
+        self.id = doc_id
+
+    def get(self):
+        self.client.ops.append(("get", self.path))
+        return FakeSnapshot(self.id, self.client.docs.get(self.path))
+
+    def on_snapshot(self, callback):
+        return FakeWatch()
+
+class FakeQuery:
+    def where(self, *args):
+        return self
+
+    def on_snapshot(self, callback):
+        return FakeWatch()
+
+class FakeCollection:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def document(self, doc_id=None):
+        return FakeDocument(self.client, self.name, doc_id or uuid.uuid4().hex)
+
+    def where(self, *args):
+        return FakeQuery()
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append(("set", ref.path, data, merge))
+
+    def delete(self, ref, option=None):
+        self.writes.append(("delete", ref.path, option, False))
+
+    def commit(self):
+        self.client.ops.append(("commit", len(self.writes)))
+        if self.client.before_commit:
+            self.client.before_commit()
+        for kind, path, option, _ in self.writes:
+            # write_option(exists=True) fails the whole batch if the document is gone
+            if kind == "delete" and option and option.get("exists") and path not in self.client.docs:
+                raise NotFound(f"No document to update: {path}")
+        for kind, path, data, merge in self.writes:
+            if kind == "delete":
+                self.client.docs.pop(path, None)
+            elif merge:
+                doc = self.client.docs.setdefault(path, {})
+                for field, value in data.items():
+                    # firestore.Increment adds to the stored value
+                    doc[field] = doc.get(field, 0) + value.value if hasattr(value, "value") else value
+            else:
+                self.client.docs[path] = dict(data)
+        return [FakeWriteResult(kind == "delete") for kind, _, _, _ in self.writes]
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.ops = []
+        self.before_commit = None
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def write_option(self, **kwargs):
+        return kwargs
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+@pytest.fixture
+def bot():
+    trading_bot = TradingBot()
+    trading_bot.market_data = StaticQuotes()
+    return trading_bot
+
+@pytest.fixture
+def firestore_db(monkeypatch):
+    client = FakeFirestore()
+    client.docs[(db.virtual_accounts_collection, "user1")] = {"balance": 1000.0, "margin": 0.011, "free_margin": 999.989}
+    client.docs[(db.virtual_positions_collection, "pos1")] = {
+        "position_id": "pos1",
+        "user_id": "user1",
+        "symbol": "EURUSD",
+        "order_type": "BUY",
+        "volume": 1.0,
+        "open_price": 1.1,
+        "closed": False
+    }
+    database = FirestoreDB()
+    database.db = client
+    database.replicas = None
+    monkeypatch.setattr(db, "firestore_db", database)
+    return database
+
+@pytest.fixture
+def simple_db(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    database = SimpleDB()
+    database.update_virtual_account("user1", {"balance": 1000.0, "margin": 0.011, "free_margin": 999.989})
+    database.add_virtual_position("user1", {"symbol": "EURUSD", "order_type": "BUY", "volume": 1.0, "open_price": 1.1, "closed": False})
+
+    operations = []
+    load, save = database._load_data, database._save_data
+    monkeypatch.setattr(database, "_load_data", lambda name: operations.append(("load", name)) or load(name))
+    monkeypatch.setattr(database, "_save_data", lambda name, data: operations.append(("save", name)) or save(name, data))
+    monkeypatch.setattr(db.firestore_db, "db", None)
+    monkeypatch.setattr(db.firestore_db, "fallback", database)
+    database.operations = operations
+    return database
+
+def test_firestore_close_reads_once_and_commits_once(bot, firestore_db):
+    client = firestore_db.db
+
+    result = bot.close_position("user1", "pos1")
+
+    assert result["success"]
+    assert client.ops == [
+        ("get", (db.virtual_positions_collection, "pos1")),
+        # archive, delete, history entry, account increments
+        ("commit", 4)
+    ]
+
+def test_firestore_close_operation_budget(bot, firestore_db):
+    with track_operations("close_position") as operations:
+        bot.close_position("user1", "pos1")
+
+    # get_virtual_position + close_virtual_position, no JSON fallback
+    assert_max_operations(operations, 2, kind="firestore")
+    assert_max_operations(operations, 0, kind="json")
+
+def test_firestore_close_applies_pnl_once(bot, firestore_db):
+    client = firestore_db.db
+
+    result = bot.close_position("user1", "pos1")
+
+    account = client.docs[(db.virtual_accounts_collection, "user1")]
+    assert account["balance"] == pytest.approx(1000.0 + result["profit_loss"])
+    assert account["margin"] == pytest.approx(0.0)
+    assert account["free_margin"] == pytest.approx(account["balance"])
+
+def test_firestore_close_keeps_concurrent_balance_changes(bot, firestore_db):
+    client = firestore_db.db
+    account_key = (db.virtual_accounts_collection, "user1")
+    # Another request credits the account while the close is in flight
+    client.before_commit = lambda: client.docs[account_key].update(balance=client.docs[account_key]["balance"] + 100.0)
+
+    result = bot.close_position("user1", "pos1")
+
+    assert client.docs[account_key]["balance"] == pytest.approx(1100.0 + result["profit_loss"])
+
+def test_firestore_close_with_replica_records_write(bot, firestore_db):
+    client = firestore_db.db
+    firestore_db.replicas = ReplicaManager(client, db.virtual_positions_collection, db.virtual_accounts_collection, sync_timeout=0)
+
+    result = bot.close_position("user1", "pos1")
+
+    assert result["success"]
+    assert client.ops[-1] == ("commit", 4)
+    replica = firestore_db.replicas._replicas["user1"]
+    assert replica._positions_written is not None
+    assert replica._account_written is not None
+    firestore_db.replicas.close()
+
+def test_firestore_close_unknown_position_only_reads(bot, firestore_db):
+    client = firestore_db.db
+
+    result = bot.close_position("user1", "missing")
+
+    assert not result["success"]
+    assert client.ops == [("get", (db.virtual_positions_collection, "missing"))]
+
+def test_firestore_bulk_close_skips_already_closed_positions(firestore_db):
+    client = firestore_db.db
+    position = client.docs[(db.virtual_positions_collection, "pos1")]
+    # pos2 was closed by another request after the caller read it
+    closed = {**position, "position_id": "pos2"}
+    closes = [
+        {"position": position, "close_price": 1.2, "profit_loss": 10.0},
+        {"position": closed, "close_price": 1.2, "profit_loss": 10.0}
+    ]
+
+    closed_ids = firestore_db.close_virtual_positions("user1", closes)
+
+    assert closed_ids == ["pos1"]
+    assert (db.virtual_positions_collection, "pos1") not in client.docs
+    # Only pos1's profit is credited
+    assert client.docs[(db.virtual_accounts_collection, "user1")]["balance"] == pytest.approx(1010.0)
+    assert [op for op in client.ops if op[0] == "commit"] == [("commit", 7), ("commit", 4)]
+
+def test_firestore_close_rejects_stale_quote(bot, firestore_db):
+    client = firestore_db.db
+    bot.market_data = StaleQuotes()
+
+    result = bot.close_position("user1", "pos1")
+
+    assert not result["success"]
+    assert "stale" in result["error"]
+    assert not any(op[0] == "commit" for op in client.ops)
+    assert client.docs[(db.virtual_accounts_collection, "user1")]["balance"] == 1000.0
+
+def test_simple_db_close_touches_each_file_once(bot, simple_db):
+    position_id = simple_db.get_virtual_positions("user1")[0]["position_id"]
+    simple_db.operations.clear()
+
+    result = bot.close_position("user1", position_id)
+
+    assert result["success"]
+    loads = [name for kind, name in simple_db.operations if kind == "load"]
+    saves = [name for kind, name in simple_db.operations if kind == "save"]
+    # Position lookup, then one load of each file touched by the close
+    assert len(loads) == 5
+    assert sorted(saves) == sorted([
+        simple_db.positions_file,
+        simple_db.closed_positions_file,
+        simple_db.history_file,
+        simple_db.accounts_file
+    ])
+    account = simple_db.get_virtual_account("user1")
+    assert account["balance"] == pytest.approx(1000.0 + result["profit_loss"])
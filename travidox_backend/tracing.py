@@ -0,0 +1,230 @@
+"""
+Tracing - per-request spans through handlers, trading bot, storage and broker calls
+
+The HTTP middleware opens a root span for every request and returns its
+trace ID in the X-Trace-Id header. Code running inside the request (also in
+threads started with its context, e.g. run_in_threadpool / asyncio.to_thread)
+opens child spans with span() or the traced() decorator; instrumented
+storage, SSH and Alpha Vantage calls get a span each. Outside a request, or
+when tracing is disabled, span() returns a shared no-op context manager.
+
+Finished traces are exported to stdout as an indented breakdown and/or to a
+JSON lines file, optionally only when slower than TRACE_SLOW_MS.
+"""
+
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# Trace requests (the X-Trace-Id header is only added when enabled)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+# Where finished traces go: "stdout", "file" or "stdout,file"
+TRACE_EXPORTERS = [name.strip() for name in os.getenv("TRACE_EXPORTERS", "stdout").split(",") if name.strip()]
+# JSON lines file of the "file" exporter
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Only export traces of requests slower than this (0 exports every trace)
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "0"))
+
+class Span:
+    """One timed stage of a trace"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start", "duration")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute of the span"""
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.root.start) * 1000, 3),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes
+        }
+
+class Trace:
+    """Spans of one request"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.add(name, None, {})
+        self.token = None
+
+    def add(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent_id, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round((self.root.duration or 0.0) * 1000, 3),
+            "spans": [span.to_dict() for span in spans]
+        }
+
+# Innermost open span of the current request (None outside a trace)
+_current_span: ContextVar = ContextVar("current_span", default=None)
+_NO_SPAN = nullcontext()
+_file_lock = threading.Lock()
+
+class _SpanScope:
+    """Context manager opening a child span of the current span"""
+
+    __slots__ = ("parent", "name", "attributes", "span", "token")
+
+    def __init__(self, parent: Span, name: str, attributes: Dict[str, Any]):
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = self.parent.trace.add(self.name, self.parent.span_id, self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.span.set("error", f"{exc_type.__name__}: {exc}")
+        self.span.finish()
+        _current_span.reset(self.token)
+
+def span(name: str, **attributes: Any):
+    """
+    Time a block as a child of the current span.
+
+    Args:
+        name: Span name (e.g. "trading_bot.get_positions_async")
+        **attributes: Attributes recorded with the span
+
+    Returns:
+        A context manager yielding the Span, or None when no trace is active
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NO_SPAN
+    return _SpanScope(parent, name, attributes)
+
+def current_span() -> Optional[Span]:
+    """Get the innermost open span of the current request"""
+    return _current_span.get()
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute of the current span (no-op outside a trace)"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(key, value)
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator opening a span for every call of a function.
+
+    Args:
+        name: Span name (defaults to the function's qualified name)
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_methods(cls, prefix: str, names: Optional[list] = None):
+    """
+    Wrap methods of a class with traced().
+
+    Args:
+        cls: The class
+        prefix: Span name prefix (spans are named <prefix>.<method>)
+        names: Methods to wrap (default: the public methods defined on the class)
+    """
+    if names is None:
+        names = [
+            attr for attr, value in vars(cls).items()
+            if callable(value) and not attr.startswith("_")
+        ]
+    for attr in names:
+        setattr(cls, attr, traced(f"{prefix}.{attr}")(getattr(cls, attr)))
+    return cls
+
+def start_trace(name: str, trace_id: Optional[str] = None) -> Trace:
+    """Open a trace and make its root span the current span"""
+    trace = Trace(name, trace_id)
+    trace.token = _current_span.set(trace.root)
+    return trace
+
+def end_trace(trace: Trace) -> None:
+    """Close a trace opened by start_trace() and export it"""
+    trace.root.finish()
+    _current_span.reset(trace.token)
+    if trace.root.duration * 1000 >= TRACE_SLOW_MS:
+        export(trace)
+
+def _format(trace: Trace) -> str:
+    """Indented breakdown of a trace, e.g. "  firestore.get_virtual_positions 12.3ms" """
+    with trace._lock:
+        spans = list(trace.spans)
+    children: Dict[Optional[str], List[Span]] = {}
+    for item in spans:
+        children.setdefault(item.parent_id, []).append(item)
+
+    lines = [f"🔎 Trace {trace.trace_id} {trace.root.name} {trace.root.duration * 1000:.1f}ms"]
+
+    def walk(parent: Span, depth: int) -> None:
+        for child in sorted(children.get(parent.span_id, []), key=lambda item: item.start):
+            duration = f"{child.duration * 1000:.1f}ms" if child.duration is not None else "unfinished"
+            attributes = " ".join(f"{key}={value}" for key, value in child.attributes.items())
+            offset = (child.start - trace.root.start) * 1000
+            lines.append(f"{'  ' * depth}+{offset:.1f}ms {child.name} {duration} {attributes}".rstrip())
+            walk(child, depth + 1)
+
+    walk(trace.root, 1)
+    return "\n".join(lines)
+
+def export(trace: Trace) -> None:
+    """Write a finished trace to the configured exporters"""
+    try:
+        if "stdout" in TRACE_EXPORTERS:
+            print(_format(trace))
+        if "file" in TRACE_EXPORTERS:
+            line = json.dumps(trace.to_dict(), default=str)
+            with _file_lock, open(TRACE_FILE, "a") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"⚠️ Failed to export trace {trace.trace_id}: {e}")
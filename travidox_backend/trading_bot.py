@@ -2,6 +2,7 @@
 Trading Bot for Virtual Accounts using Firebase Firestore
 """
 
+import asyncio
 import time
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -10,16 +11,26 @@ from datetime import datetime
 from db import (
     get_virtual_account,
     update_virtual_account,
+    adjust_virtual_account,
     get_virtual_positions,
+    get_virtual_position,
     add_virtual_position,
+    add_virtual_positions,
     close_virtual_position,
+    close_virtual_positions,
     get_trading_history,
     add_trading_history,
     update_virtual_position
 )
 
+# Async variants for the read endpoints
+import db_async
+
 # Import market data provider
 from market_data import get_market_data_provider
+from responses import json_fields
+
+from tracing import trace_methods
 
 class TradingBot:
     def __init__(self):
@@ -30,9 +41,41 @@ class TradingBot:
     def get_account_info(self, user_id: str) -> Dict[str, Any]:
         """Get virtual account info for a user"""
         account = get_virtual_account(user_id)
-        
-        # Update account equity based on open positions
         positions = self.get_positions(user_id)
+        self._apply_floating_pnl(account, positions)
+        
+        # Save the floating P&L only; balance and margin change through increments
+        update_virtual_account(user_id, self._floating_fields(account))
+        
+        return account
+    
+    async def get_account_info_async(self, user_id: str) -> Dict[str, Any]:
+        """Get virtual account info for a user, reading the account and positions concurrently"""
+        account, positions = await asyncio.gather(
+            db_async.get_virtual_account(user_id),
+            self.get_positions_async(user_id)
+        )
+        self._apply_floating_pnl(account, positions)
+        await db_async.update_virtual_account(user_id, self._floating_fields(account))
+        return account
+    
+    async def get_overview_async(self, user_id: str) -> Dict[str, Any]:
+        """Get account info, open positions and trading history of a user, read concurrently"""
+        account, positions, history = await asyncio.gather(
+            db_async.get_virtual_account(user_id),
+            self.get_positions_async(user_id),
+            db_async.get_trading_history(user_id)
+        )
+        self._apply_floating_pnl(account, positions)
+        await db_async.update_virtual_account(user_id, self._floating_fields(account))
+        return {
+            "account": account,
+            "positions": positions,
+            "history": history
+        }
+    
+    def _apply_floating_pnl(self, account: Dict[str, Any], positions: List[Dict[str, Any]]) -> None:
+        """Update account equity based on open positions"""
         floating_pnl = 0.0
         
         for position in positions:
@@ -44,19 +87,38 @@ class TradingBot:
         account["equity"] = account.get("balance", 1000.0) + floating_pnl
         
         # Convert any non-serializable objects to strings
-        for key, value in list(account.items()):
-            if not isinstance(value, (str, int, float, bool, list, dict)) or value is None:
-                account[key] = str(value)
-        
-        # Save updated account
-        update_virtual_account(user_id, account)
-        
-        return account
+        json_fields(account)
+    
+    def _floating_fields(self, account: Dict[str, Any]) -> Dict[str, Any]:
+        """Fields set by _apply_floating_pnl (written back without the balance and margin read with them)"""
+        return {"floating_pnl": account["floating_pnl"], "equity": account["equity"]}
     
     def get_positions(self, user_id: str) -> List[Dict[str, Any]]:
         """Get virtual positions for a user and update their current prices"""
         positions = get_virtual_positions(user_id)
-        updated_positions = []
+        for position_id, update_data in self._price_positions(positions):
+            update_virtual_position(user_id, position_id, update_data)
+        return positions
+    
+    async def get_positions_async(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get virtual positions for a user and update their current prices, writing the updates concurrently"""
+        positions = await db_async.get_virtual_positions(user_id)
+        # Quotes may need an HTTP request on a cache miss
+        updates = await asyncio.to_thread(self._price_positions, positions)
+        await asyncio.gather(*(
+            db_async.update_virtual_position(user_id, position_id, update_data)
+            for position_id, update_data in updates
+        ))
+        return positions
+    
+    def _price_positions(self, positions: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        Update current prices and profit/loss of positions in place.
+        
+        Returns:
+            (position_id, update_data) for each position repriced from a fresh quote
+        """
+        updates = []
         
         # Update current prices and profit/loss for each position
         for position in positions:
@@ -91,7 +153,7 @@ class TradingBot:
                         profit_loss = price_diff * volume * 100
                         position["profit_loss"] = round(profit_loss, 2)
                         
-                        # Update position in database with current price and profit/loss
+                        # Queue a database update with current price and profit/loss
                         position_id = position.get("position_id")
                         if position_id:
                             update_data = {
@@ -99,7 +161,7 @@ class TradingBot:
                                 "profit_loss": round(profit_loss, 2),
                                 "last_updated": datetime.now().isoformat()
                             }
-                            update_virtual_position(user_id, position_id, update_data)
+                            updates.append((position_id, update_data))
                     else:
                         # Use existing price if available, or fallback to open price
                         current_price = position.get("current_price", position.get("open_price", 0.0))
@@ -121,19 +183,27 @@ class TradingBot:
                     # Keep existing values if there's an error
             
             # Convert any non-serializable objects to strings
-            for key, value in list(position.items()):
-                if not isinstance(value, (str, int, float, bool, list, dict)) or value is None:
-                    position[key] = str(value)
-            
-            updated_positions.append(position)
+            json_fields(position)
         
-        return updated_positions
+        return updates
     
     def get_trading_history(self, user_id: str) -> List[Dict[str, Any]]:
         """Get trading history for a user"""
         history = get_trading_history(user_id)
         return history
     
+    async def get_trading_history_async(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get trading history for a user"""
+        return await db_async.get_trading_history(user_id)
+    
+    def _trade_quote_error(self, quote: Dict[str, Any]) -> Optional[str]:
+        """Why a quote cannot be used to fill or close a trade (None if it can)"""
+        if quote.get("error"):
+            return quote["error"]
+        if quote.get("stale"):
+            return f"only a stale price is available ({quote.get('stale_reason', 'market data unavailable')})"
+        return None
+    
     def place_order(self, user_id: str, symbol: str, order_type: str, volume: float, 
                    stop_loss: Optional[float] = None, take_profit: Optional[float] = None) -> Dict[str, Any]:
         """Place a virtual order using real market prices"""
@@ -141,10 +211,11 @@ class TradingBot:
             # Get real market price from Alpha Vantage
             quote = self.market_data.get_forex_quote(symbol)
             
-            if "error" in quote and quote["error"]:
+            quote_error = self._trade_quote_error(quote)
+            if quote_error:
                 return {
                     "success": False,
-                    "error": f"Failed to get market price: {quote['error']}"
+                    "error": f"Failed to get market price: {quote_error}"
                 }
             
             # Use appropriate price based on order type
@@ -173,13 +244,10 @@ class TradingBot:
                     "error": "Failed to create position"
                 }
             
-            # Update account margin
-            account = get_virtual_account(user_id)
+            # Update account margin (reading the account creates it for new users)
+            get_virtual_account(user_id)
             margin_used = volume * current_price * 0.01  # Simplified margin calculation (1% margin)
-            account["margin"] = account.get("margin", 0.0) + margin_used
-            account["free_margin"] = account.get("balance", 1000.0) - account["margin"]
-            
-            update_virtual_account(user_id, account)
+            adjust_virtual_account(user_id, {"margin": margin_used, "free_margin": -margin_used})
             
             return {
                 "success": True,
@@ -196,16 +264,94 @@ class TradingBot:
                 "error": f"Error placing order: {str(e)}"
             }
     
+    def place_orders(self, user_id: str, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Place a batch of virtual orders.
+        
+        Each symbol's quote is fetched once, all positions are written in one
+        batch and the account margin is updated once for the whole basket.
+        
+        Args:
+            user_id: The user identifier
+            orders: List of orders with symbol, order_type, volume and
+                optional stop_loss/take_profit
+        
+        Returns:
+            Dictionary with a "results" list holding one result per order
+        """
+        try:
+            quotes = {}
+            results = [None] * len(orders)
+            new_positions = []
+            new_indexes = []
+            margin_used = 0.0
+            
+            for i, order in enumerate(orders):
+                symbol = order["symbol"]
+                order_type = order["order_type"]
+                volume = order["volume"]
+                
+                if symbol not in quotes:
+                    quotes[symbol] = self.market_data.get_forex_quote(symbol)
+                quote = quotes[symbol]
+                
+                quote_error = self._trade_quote_error(quote)
+                if quote_error:
+                    results[i] = {
+                        "success": False,
+                        "error": f"Failed to get market price: {quote_error}"
+                    }
+                    continue
+                
+                # Use appropriate price based on order type
+                current_price = quote["ask"] if order_type == "BUY" else quote["bid"]
+                
+                new_positions.append({
+                    "symbol": symbol,
+                    "order_type": order_type.upper(),
+                    "volume": volume,
+                    "open_price": current_price,
+                    "current_price": current_price,
+                    "stop_loss": order.get("stop_loss"),
+                    "take_profit": order.get("take_profit"),
+                    "profit_loss": 0.0,
+                    "closed": False,
+                    "open_time": datetime.now().isoformat()
+                })
+                new_indexes.append(i)
+                margin_used += volume * current_price * 0.01  # Simplified margin calculation (1% margin)
+            
+            if new_positions:
+                position_ids = add_virtual_positions(user_id, new_positions)
+                
+                for i, position_id, position in zip(new_indexes, position_ids, new_positions):
+                    results[i] = {
+                        "success": True,
+                        "position_id": position_id,
+                        "symbol": position["symbol"],
+                        "order_type": orders[i]["order_type"],
+                        "volume": position["volume"],
+                        "price": position["open_price"],
+                        "message": f"Order placed successfully: {orders[i]['order_type']} {position['volume']} {position['symbol']} at {position['open_price']}"
+                    }
+                
+                # Update account margin once for the whole batch (reading the account creates it for new users)
+                get_virtual_account(user_id)
+                adjust_virtual_account(user_id, {"margin": margin_used, "free_margin": -margin_used})
+            
+            return {
+                "success": True,
+                "results": results
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error placing orders: {str(e)}"
+            }
+    
     def close_position(self, user_id: str, position_id: str) -> Dict[str, Any]:
         """Close a virtual position using real market prices"""
-        # Get positions to find the one we want to close
-        positions = get_virtual_positions(user_id)
-        
-        position = None
-        for pos in positions:
-            if pos.get("position_id") == position_id:
-                position = pos
-                break
+        position = get_virtual_position(user_id, position_id)
         
         if position is None:
             return {"success": False, "error": "Position not found"}
@@ -217,10 +363,11 @@ class TradingBot:
             
             quote = self.market_data.get_forex_quote(symbol)
             
-            if "error" in quote and quote["error"]:
+            quote_error = self._trade_quote_error(quote)
+            if quote_error:
                 return {
                     "success": False,
-                    "error": f"Failed to get market price: {quote['error']}"
+                    "error": f"Failed to get market price: {quote_error}"
                 }
             
             # Use appropriate price based on order type (opposite of open)
@@ -240,21 +387,12 @@ class TradingBot:
             # Using smaller multiplier for more reasonable P&L values in demo account
             profit_loss = price_diff * volume * 100
             
-            # Close the position in Firestore
-            result = close_virtual_position(user_id, position_id, close_price, profit_loss)
+            # Archive the position, add history and credit the P&L in one write
+            result = close_virtual_position(user_id, position_id, close_price, profit_loss, position=position)
             
             if not result:
                 return {"success": False, "error": "Failed to close position"}
             
-            # Update account balance
-            account = get_virtual_account(user_id)
-            account["balance"] = account.get("balance", 1000.0) + profit_loss
-            account["margin"] = max(0, account.get("margin", 0.0) - (volume * open_price * 0.01))
-            account["free_margin"] = account["balance"] - account["margin"]
-            account["equity"] = account["balance"]
-            
-            update_virtual_account(user_id, account)
-            
             return {
                 "success": True,
                 "position_id": position_id,
@@ -266,6 +404,102 @@ class TradingBot:
         except Exception as e:
             return {"success": False, "error": f"Error closing position: {str(e)}"}
 
+    def close_positions(self, user_id: str, symbol: Optional[str] = None, side: Optional[str] = None,
+                        profit: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Close all virtual positions matching the filters in one transaction.
+        
+        Positions are read once, each symbol's quote is fetched once, and the
+        closes, history entries and account update are written together.
+        
+        Args:
+            user_id: The user identifier
+            symbol: Optional symbol filter
+            side: Optional "BUY" or "SELL" filter
+            profit: Optional "positive" or "negative" filter (based on the current quote)
+        
+        Returns:
+            Dictionary with one result per position matching the filters
+        """
+        try:
+            positions = get_virtual_positions(user_id)
+            quotes = {}
+            closes = []
+            results = []
+            
+            for position in positions:
+                if symbol and position.get("symbol") != symbol:
+                    continue
+                if side and position.get("order_type") != side.upper():
+                    continue
+                
+                position_symbol = position["symbol"]
+                if position_symbol not in quotes:
+                    quotes[position_symbol] = self.market_data.get_forex_quote(position_symbol)
+                quote = quotes[position_symbol]
+                
+                quote_error = self._trade_quote_error(quote)
+                if quote_error:
+                    results.append({
+                        "success": False,
+                        "position_id": position.get("position_id"),
+                        "error": f"Failed to get market price: {quote_error}"
+                    })
+                    continue
+                
+                # Use appropriate price based on order type (opposite of open)
+                order_type = position["order_type"]
+                close_price = quote["bid"] if order_type == "BUY" else quote["ask"]
+                
+                # Calculate profit/loss (volume in lots * price difference * 100)
+                if order_type == "BUY":
+                    price_diff = close_price - position["open_price"]
+                else:  # SELL
+                    price_diff = position["open_price"] - close_price
+                profit_loss = price_diff * position["volume"] * 100
+                
+                if profit == "positive" and profit_loss <= 0:
+                    continue
+                if profit == "negative" and profit_loss >= 0:
+                    continue
+                
+                closes.append({
+                    "position": position,
+                    "close_price": close_price,
+                    "profit_loss": profit_loss
+                })
+            
+            closed_ids = set(close_virtual_positions(user_id, closes)) if closes else set()
+            
+            for close in closes:
+                position_id = close["position"].get("position_id")
+                if position_id in closed_ids:
+                    results.append({
+                        "success": True,
+                        "position_id": position_id,
+                        "symbol": close["position"]["symbol"],
+                        "close_price": close["close_price"],
+                        "profit_loss": round(close["profit_loss"], 2)
+                    })
+                else:
+                    results.append({
+                        "success": False,
+                        "position_id": position_id,
+                        "error": "Failed to close position"
+                    })
+            
+            return {
+                "success": True,
+                "closed": len(closed_ids),
+                "results": results
+            }
+        except Exception as e:
+            return {"success": False, "error": f"Error closing positions: {str(e)}"}
+
+# Trace the bot's stages per request (pricing is usually where the time goes)
+trace_methods(TradingBot, "trading_bot")
+trace_methods(TradingBot, "trading_bot", ["_price_positions"])
+
 # Singleton instance
 _trading_bot = None
 
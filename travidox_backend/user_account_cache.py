@@ -0,0 +1,122 @@
+"""
+User Account Cache - cached Firebase user -> MetaTrader account mapping
+
+Every real-trading endpoint starts by looking up the user's linked
+MetaTrader account. Lookups are served from a process-local dict (L1) and a
+small SQLite file shared by all workers on the machine (L2), and only fall
+through to the database on a miss. /connect-account writes the new mapping
+through both levels, so reconnects are visible immediately in the writing
+worker and within USER_ACCOUNT_L1_TTL seconds in the others.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Seconds a mapping is served from process memory
+USER_ACCOUNT_L1_TTL = float(os.getenv("USER_ACCOUNT_L1_TTL", "10"))
+# Seconds a mapping is served from the shared local store
+USER_ACCOUNT_L2_TTL = float(os.getenv("USER_ACCOUNT_L2_TTL", "3600"))
+# Shared local store (SQLite file)
+USER_ACCOUNT_CACHE_PATH = os.getenv("USER_ACCOUNT_CACHE_PATH", "user_account_cache.db")
+
+class UserAccountCache:
+    """Two-level cache of user_id -> linked MetaTrader account"""
+
+    def __init__(self,
+                 path: str = USER_ACCOUNT_CACHE_PATH,
+                 l1_ttl: float = USER_ACCOUNT_L1_TTL,
+                 l2_ttl: float = USER_ACCOUNT_L2_TTL):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite file shared with the other workers
+            l1_ttl: Seconds entries stay in process memory
+            l2_ttl: Seconds entries stay in the shared store
+        """
+        self.l1_ttl = l1_ttl
+        self.l2_ttl = l2_ttl
+        self._l1: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_accounts (user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, loader: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Get a user's linked account.
+
+        Args:
+            user_id: Firebase user ID
+            loader: Reads the mapping from the database on a miss
+
+        Returns:
+            The account mapping, or None if the user has no linked account
+        """
+        now = time.time()
+        cached = self._l1.get(user_id)
+        if cached and now - cached[0] < self.l1_ttl:
+            self.l1_hits += 1
+            return cached[1]
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM user_accounts WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row and now - row[1] < self.l2_ttl:
+            self.l2_hits += 1
+            account = json.loads(row[0])
+            self._l1[user_id] = (now, account)
+            return account
+
+        self.misses += 1
+        account = loader(user_id)
+        # Users without a linked account are not cached, so a connect made by
+        # another worker is seen on the next request
+        if account:
+            self._store(user_id, account)
+        return account
+
+    def set(self, user_id: str, account: Dict[str, Any]) -> None:
+        """Store a new mapping (after /connect-account) in both levels"""
+        self._store(user_id, account)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's mapping from both levels"""
+        self._l1.pop(user_id, None)
+        with self._lock:
+            self._conn.execute("DELETE FROM user_accounts WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    def _store(self, user_id: str, account: Dict[str, Any]) -> None:
+        """Write a mapping to both levels"""
+        now = time.time()
+        self._l1[user_id] = (now, account)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_accounts (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(account), now)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache metrics"""
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "size": len(self._l1),
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.l1_hits + self.l2_hits) / lookups if lookups else 0.0
+        }
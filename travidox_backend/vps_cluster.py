@@ -0,0 +1,291 @@
+"""
+VPS Cluster - shards MetaTrader accounts across several VPS hosts
+
+Each VPS host gets its own MetaTraderManager. New accounts are placed on a
+host by consistent hashing (a hash ring with virtual nodes, so adding a host
+only moves a proportional share of keys), and every placement is recorded in
+a placement table, which stays authoritative for routing.
+
+Hosts are configured at startup (VPS_HOSTS); to add one, extend the list and
+restart the workers. Nothing moves existing accounts: the VPS does not keep
+account passwords, so an account cannot be reconnected on another host by the
+backend. rebalance_plan() (shown by /vps-load) lists the accounts whose ring
+host changed; each moves when its user next calls /connect-account, which
+connects it on the new host and replaces its placement.
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from vps_manager import MetaTraderManager
+
+logger = logging.getLogger(__name__)
+
+# Placement table (account_id -> host) shared by all backend workers
+ACCOUNT_PLACEMENT_PATH = os.getenv("ACCOUNT_PLACEMENT_PATH", "account_placement.json")
+# Virtual nodes per host on the hash ring
+VPS_RING_VNODES = int(os.getenv("VPS_RING_VNODES", "100"))
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on a lock file shared by all workers on the machine"""
+    with open(path, "a+") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash of a key"""
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes: List[str], vnodes: int = VPS_RING_VNODES):
+        """
+        Build the ring.
+
+        Args:
+            nodes: Node names (VPS hosts)
+            vnodes: Virtual nodes per node
+        """
+        self.vnodes = vnodes
+        self._keys: List[int] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        """Add a node"""
+        for i in range(self.vnodes):
+            key = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._keys, key)
+            self._keys.insert(index, key)
+            self._nodes.insert(index, node)
+
+    def get(self, key: str) -> str:
+        """Get the node owning a key"""
+        if not self._keys:
+            raise ValueError("Hash ring is empty")
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+class PlacementTable:
+    """Persistent account_id -> host mapping (JSON file)"""
+
+    def __init__(self, path: str = ACCOUNT_PLACEMENT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._placements: Dict[str, Dict[str, Any]] = {}
+        self.reload()
+
+    def _read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Read the table file (None if it cannot be read)"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read placement table {self.path}: {str(e)}")
+            return None
+
+    def reload(self) -> None:
+        """Re-read the table (picks up placements made by other workers)"""
+        placements = self._read()
+        if placements is None:
+            return
+        with self._lock:
+            self._placements = placements
+
+    def get(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """Get the placement of an account ({"host", "key"}), re-reading the file on a miss"""
+        placement = self._placements.get(account_id)
+        if placement is None:
+            self.reload()
+            placement = self._placements.get(account_id)
+        return placement
+
+    def set(self, account_id: str, host: str, key: str) -> None:
+        """Record where an account lives, replacing older placements of the same login"""
+        # Other workers write the same file: merge into its current content under a file lock
+        with self._lock, _file_lock(f"{self.path}.lock"):
+            placements = self._read()
+            if placements is None:
+                raise OSError(f"Placement table {self.path} is unreadable; not overwriting it")
+            self._placements = placements
+            for old_account_id, placement in list(self._placements.items()):
+                if placement["key"] == key:
+                    del self._placements[old_account_id]
+            self._placements[account_id] = {"host": host, "key": key}
+            self._save()
+
+    def items(self) -> List:
+        """Get all (account_id, placement) pairs"""
+        return list(self._placements.items())
+
+    def _save(self) -> None:
+        """Write the table atomically (called with the lock held)"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._placements, f)
+        os.replace(temp_path, self.path)
+
+class MetaTraderCluster:
+    """
+    Routes MetaTrader operations to the VPS host holding each account.
+
+    Exposes the same methods as MetaTraderManager, so it can be used in its place.
+    """
+
+    def __init__(self,
+                 managers: Dict[str, MetaTraderManager],
+                 placement_table: Optional[PlacementTable] = None,
+                 vnodes: int = VPS_RING_VNODES):
+        """
+        Initialize the cluster.
+
+        Args:
+            managers: MetaTraderManager per VPS host, in configuration order; the
+                first host also serves accounts missing from the placement table
+                (accounts connected before sharding was enabled)
+            placement_table: Account placements (loaded from ACCOUNT_PLACEMENT_PATH by default)
+            vnodes: Virtual nodes per host on the hash ring
+        """
+        if not managers:
+            raise ValueError("At least one VPS host is required")
+        self.managers = managers
+        self.default_host = next(iter(managers))
+        self.ring = HashRing(list(managers), vnodes)
+        self.placements = placement_table or PlacementTable()
+        self._lock = threading.Lock()
+        self._inflight = {host: 0 for host in managers}
+        self._requests = {host: 0 for host in managers}
+        self._errors = {host: 0 for host in managers}
+
+    def host_for(self, account_id: str) -> str:
+        """Get the host an account lives on"""
+        placement = self.placements.get(account_id)
+        return placement["host"] if placement else self.default_host
+
+    def rebalance_plan(self) -> Dict[str, Any]:
+        """
+        List accounts whose ring host differs from where they live.
+
+        This is a report only: the accounts move when their users reconnect
+        (connect_account places them on their ring host).
+        """
+        moves = []
+        for account_id, placement in self.placements.items():
+            target = self.ring.get(placement["key"])
+            if target != placement["host"]:
+                moves.append({"account_id": account_id, "from": placement["host"], "to": target})
+        return {"success": True, "moves": moves}
+
+    def host_load(self) -> Dict[str, Any]:
+        """Get per-host load: placed accounts, in-flight and total requests, errors"""
+        accounts = {host: 0 for host in self.managers}
+        for _, placement in self.placements.items():
+            if placement["host"] in accounts:
+                accounts[placement["host"]] += 1
+
+        return {
+            "success": True,
+            "hosts": [
+                {
+                    "host": host,
+                    "accounts": accounts[host],
+                    "inflight": self._inflight[host],
+                    "requests": self._requests[host],
+                    "errors": self._errors[host]
+                }
+                for host in self.managers
+            ]
+        }
+
+    def _call(self, host: str, method: Callable[..., Dict[str, Any]], *args, **kwargs) -> Dict[str, Any]:
+        """Call a manager method on a host, tracking its load"""
+        with self._lock:
+            self._inflight[host] += 1
+            self._requests[host] += 1
+        failed = True
+        try:
+            result = method(*args, **kwargs)
+            failed = not result.get("success", False)
+            return result
+        finally:
+            with self._lock:
+                self._inflight[host] -= 1
+                if failed:
+                    self._errors[host] += 1
+
+    def _route(self, name: str, account_id: str, *args, **kwargs) -> Dict[str, Any]:
+        """Call a per-account manager method on the account's host"""
+        host = self.host_for(account_id)
+        if host not in self.managers:
+            return {"success": False, "error": f"VPS host {host} of account {account_id} is not available"}
+        return self._call(host, getattr(self.managers[host], name), account_id, *args, **kwargs)
+
+    def connect_account(self,
+                        login: str,
+                        password: str,
+                        server: str,
+                        platform: str = "mt5") -> Dict[str, Any]:
+        """Connect an account on its ring host and record the placement"""
+        key = f"{login}@{server}"
+        host = self.ring.get(key)
+        result = self._call(host, self.managers[host].connect_account, login, password, server, platform)
+        if result.get("success", False):
+            self.placements.set(result["account_id"], host, key)
+            result["vps_host"] = host
+        return result
+
+    def list_symbols(self) -> Dict[str, Any]:
+        """List symbols (all hosts run the same broker terminals, so the default host is used)"""
+        return self._call(self.default_host, self.managers[self.default_host].list_symbols)
+
+    def get_account_info(self, account_id: str) -> Dict[str, Any]:
+        return self._route("get_account_info", account_id)
+
+    def get_account_snapshot(self, account_id: str) -> Dict[str, Any]:
+        return self._route("get_account_snapshot", account_id)
+
+    def get_positions(self, account_id: str) -> Dict[str, Any]:
+        return self._route("get_positions", account_id)
+
+    def place_market_order(self, account_id: str, **order) -> Dict[str, Any]:
+        return self._route("place_market_order", account_id, **order)
+
+    def place_market_orders(self, account_id: str, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self._route("place_market_orders", account_id, orders)
+
+    def close_position(self, account_id: str, position_id: int) -> Dict[str, Any]:
+        return self._route("close_position", account_id, position_id)
+
+    def close_positions(self, account_id: str, *filters) -> Dict[str, Any]:
+        return self._route("close_positions", account_id, *filters)
+
+    def get_order_history(self, account_id: str, *args) -> Dict[str, Any]:
+        return self._route("get_order_history", account_id, *args)
@@ -1,14 +1,21 @@
 import os
 import paramiko
 import json
+import shlex
 import time
 import logging
 from typing import Dict, Any, Optional, List, Tuple
+from circuit_breaker import get_breaker
+from instrumentation import instrument_methods
+from tracing import trace_methods
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Seconds a VPS command may stay silent before it is treated as failed
+VPS_COMMAND_TIMEOUT = float(os.getenv("VPS_COMMAND_TIMEOUT", "120"))
+
 class VPSManager:
     """
     Manages communication with the VPS running MetaTrader terminal.
@@ -37,6 +44,7 @@ class VPSManager:
         self.key_path = key_path
         self.port = port
         self.client = None
+        self.breaker = get_breaker(f"vps:{host}")
         self._connect()
     
     def _connect(self) -> None:
@@ -65,24 +73,41 @@ class VPSManager:
             logger.error(f"Failed to connect to VPS: {str(e)}")
             raise
     
-    def execute_command(self, command: str) -> Tuple[str, str]:
+    def execute_command(self, command: str, input_data: Optional[str] = None) -> Tuple[str, str]:
         """
         Execute a command on the VPS via SSH.
         
+        Calls go through the host's circuit breaker: after repeated failures
+        they fail fast with CircuitOpenError until a probe succeeds.
+        
         Args:
             command: The command to execute
+            input_data: Optional data written to the command's stdin
             
         Returns:
             Tuple of (stdout, stderr)
         """
+        return self.breaker.call(self._execute_command, command, input_data)
+    
+    def _execute_command(self, command: str, input_data: Optional[str] = None) -> Tuple[str, str]:
+        """Execute a command on the VPS via SSH (without the circuit breaker)"""
         if not self.client:
             self._connect()
             
         try:
-            stdin, stdout, stderr = self.client.exec_command(command)
+            stdin, stdout, stderr = self.client.exec_command(command, timeout=VPS_COMMAND_TIMEOUT)
+            if input_data is not None:
+                stdin.write(input_data)
+                stdin.channel.shutdown_write()
             return stdout.read().decode('utf-8'), stderr.read().decode('utf-8')
         except Exception as e:
             logger.error(f"Failed to execute command '{command}': {str(e)}")
+            # The client is shared by concurrent callers: only drop it (and reconnect on
+            # the next call) when the SSH transport itself is gone, not on a command
+            # timeout, which would also abort the other callers' running commands
+            transport = self.client.get_transport() if self.client else None
+            if transport is None or not transport.is_active():
+                self.close()
             raise
     
     def upload_file(self, local_path: str, remote_path: str) -> None:
@@ -137,22 +162,29 @@ class VPSManager:
         self.close()
 
 
+# Count VPS round trips per request
+instrument_methods(VPSManager, "vps", ["execute_command", "upload_file", "download_file"])
+
+
 class MetaTraderManager:
     """
     Manages MetaTrader operations on the VPS.
     This class provides methods for account management and trading operations.
     """
     
-    def __init__(self, vps_manager: VPSManager, mt_scripts_dir: str):
+    def __init__(self, vps_manager: VPSManager, mt_scripts_dir: str, use_terminal_pool: bool = False):
         """
         Initialize the MetaTrader manager.
         
         Args:
             vps_manager: VPSManager instance for VPS communication
             mt_scripts_dir: Directory on the VPS where MetaTrader scripts are located
+            use_terminal_pool: Route account calls through the terminal pool daemon
+                (vps_scripts/terminal_pool.py) instead of one-shot scripts
         """
         self.vps = vps_manager
         self.mt_scripts_dir = mt_scripts_dir
+        self.use_terminal_pool = use_terminal_pool
     
     def connect_account(self, 
                        login: str, 
@@ -171,7 +203,7 @@ class MetaTraderManager:
         Returns:
             Dictionary with connection status and details
         """
-        # Create a JSON config file for the account
+        # Account configuration, streamed to the script's stdin
         config = {
             "login": login,
             "password": password,
@@ -179,36 +211,7 @@ class MetaTraderManager:
             "platform": platform
         }
         
-        config_json = json.dumps(config)
-        
-        # Create a temporary config file
-        temp_config = f"/tmp/mt_config_{login}.json"
-        
-        try:
-            # Save config to VPS
-            command = f"echo '{config_json}' > {temp_config}"
-            self.vps.execute_command(command)
-            
-            # Run the connection script
-            script_path = f"{self.mt_scripts_dir}/connect_account.py"
-            command = f"python {script_path} --config {temp_config}"
-            stdout, stderr = self.vps.execute_command(command)
-            
-            if stderr:
-                logger.error(f"Error connecting account: {stderr}")
-                return {"success": False, "error": stderr}
-            
-            # Parse the output as JSON
-            try:
-                result = json.loads(stdout)
-                return result
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse connection result: {stdout}")
-                return {"success": False, "error": "Invalid response format", "raw_output": stdout}
-                
-        finally:
-            # Clean up the temporary config file
-            self.vps.execute_command(f"rm -f {temp_config}")
+        return self._run_with_payload("connect_account.py", "--config", config, "connecting account")
     
     def get_account_info(self, account_id: str) -> Dict[str, Any]:
         """
@@ -220,6 +223,9 @@ class MetaTraderManager:
         Returns:
             Dictionary with account information
         """
+        if self.use_terminal_pool:
+            return self._pool_call("account_info", account_id, action="getting account info")
+        
         script_path = f"{self.mt_scripts_dir}/get_account_info.py"
         command = f"python {script_path} --account_id {account_id}"
         stdout, stderr = self.vps.execute_command(command)
@@ -235,6 +241,45 @@ class MetaTraderManager:
             logger.error(f"Failed to parse account info: {stdout}")
             return {"success": False, "error": "Invalid response format", "raw_output": stdout}
     
+    def get_account_snapshot(self, account_id: str) -> Dict[str, Any]:
+        """
+        Get account information and open positions in a single SSH round trip.
+        
+        Args:
+            account_id: The account identifier
+            
+        Returns:
+            Dictionary with "account" and "positions"
+        """
+        if self.use_terminal_pool:
+            return self._pool_call("snapshot", account_id, action="getting account snapshot")
+        
+        account_script = f"{self.mt_scripts_dir}/get_account_info.py"
+        positions_script = f"{self.mt_scripts_dir}/get_positions.py"
+        command = (f"python {account_script} --account_id {account_id}; "
+                   f"python {positions_script} --account_id {account_id}")
+        stdout, stderr = self.vps.execute_command(command)
+        
+        if stderr:
+            logger.error(f"Error getting account snapshot: {stderr}")
+            return {"success": False, "error": stderr}
+        
+        try:
+            account_result, positions_result = [json.loads(line) for line in stdout.strip().splitlines()]
+        except ValueError:
+            logger.error(f"Failed to parse account snapshot: {stdout}")
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout}
+        
+        for result in (account_result, positions_result):
+            if not result.get("success", False):
+                return result
+        
+        return {
+            "success": True,
+            "account": account_result["account"],
+            "positions": positions_result.get("positions", [])
+        }
+    
     def place_market_order(self, 
                           account_id: str, 
                           symbol: str, 
@@ -270,35 +315,172 @@ class MetaTraderManager:
         if take_profit is not None:
             order_params["take_profit"] = take_profit
         
-        order_json = json.dumps(order_params)
+        if self.use_terminal_pool:
+            return self._pool_call("place_order", account_id, order_params, "placing order")
+        
+        return self._run_with_payload("place_market_order.py", "--order", order_params, "placing order")
+    
+    def place_market_orders(self, account_id: str, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Place a batch of market orders in one request to the VPS.
         
-        # Create a temporary order file
-        temp_order = f"/tmp/mt_order_{account_id}_{int(time.time())}.json"
+        The orders are executed back to back within a single MetaTrader
+        session (one initialize/login for the whole batch).
         
-        try:
-            # Save order to VPS
-            command = f"echo '{order_json}' > {temp_order}"
-            self.vps.execute_command(command)
+        Args:
+            account_id: The account identifier
+            orders: List of orders with symbol, order_type, volume and
+                optional stop_loss/take_profit
             
-            # Run the order placement script
-            script_path = f"{self.mt_scripts_dir}/place_market_order.py"
-            command = f"python {script_path} --order {temp_order}"
-            stdout, stderr = self.vps.execute_command(command)
+        Returns:
+            Dictionary with a "results" list holding one result per order
+        """
+        batch = {
+            "account_id": account_id,
+            "orders": [
+                {key: value for key, value in order.items() if value is not None}
+                for order in orders
+            ]
+        }
+        
+        if self.use_terminal_pool:
+            return self._pool_call("place_orders", account_id, batch, "placing orders")
+        
+        return self._run_with_payload("place_market_order.py", "--orders", batch, "placing orders")
+    
+    def close_positions(self, 
+                        account_id: str, 
+                        symbol: Optional[str] = None, 
+                        side: Optional[str] = None, 
+                        profit: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Close all positions matching the filters in one MetaTrader session.
+        
+        Args:
+            account_id: The account identifier
+            symbol: Optional symbol filter
+            side: Optional "BUY" or "SELL" filter
+            profit: Optional "positive" or "negative" filter
             
-            if stderr:
-                logger.error(f"Error placing order: {stderr}")
-                return {"success": False, "error": stderr}
+        Returns:
+            Dictionary with one result per closed position
+        """
+        if self.use_terminal_pool:
+            filters = {"symbol": symbol, "side": side.upper() if side else None, "profit": profit}
+            return self._pool_call("close_positions", account_id, filters, "closing positions")
+        
+        script_path = f"{self.mt_scripts_dir}/close_position.py"
+        command = f"python {script_path} --account_id {account_id} --all"
+        if symbol:
+            command += f" --symbol {shlex.quote(symbol)}"
+        if side:
+            command += f" --side {shlex.quote(side.upper())}"
+        if profit:
+            command += f" --profit {shlex.quote(profit)}"
+        stdout, stderr = self.vps.execute_command(command)
+        
+        if stderr:
+            logger.error(f"Error closing positions: {stderr}")
+            return {"success": False, "error": stderr}
+        
+        try:
+            result = json.loads(stdout)
+            return result
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse close result: {stdout}")
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout}
+    
+    def _run_with_payload(self, script: str, flag: str, payload: Dict[str, Any], action: str) -> Dict[str, Any]:
+        """
+        Run a MetaTrader script with its JSON parameters streamed to stdin.
+        
+        The payload never touches the VPS disk or the shell command line, and
+        the whole call is a single SSH round trip.
+        
+        Args:
+            script: Script name in the scripts directory
+            flag: Command line flag the script expects the payload under ("-" means stdin)
+            payload: Parameters passed to the script
+            action: Description used in log messages
             
-            try:
-                result = json.loads(stdout)
-                return result
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse order result: {stdout}")
-                return {"success": False, "error": "Invalid response format", "raw_output": stdout}
-                
-        finally:
-            # Clean up the temporary order file
-            self.vps.execute_command(f"rm -f {temp_order}")
+        Returns:
+            Parsed JSON output of the script
+        """
+        script_path = f"{self.mt_scripts_dir}/{script}"
+        command = f"python {script_path} {flag} -"
+        stdout, stderr = self.vps.execute_command(command, input_data=json.dumps(payload))
+        
+        if stderr:
+            logger.error(f"Error {action}: {stderr}")
+            return {"success": False, "error": stderr}
+        
+        try:
+            result = json.loads(stdout)
+            return result
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse result of {action}: {stdout}")
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout}
+    
+    def _pool_call(self, 
+                   pool_action: str, 
+                   account_id: str, 
+                   payload: Optional[Dict[str, Any]] = None, 
+                   action: str = "calling terminal pool") -> Dict[str, Any]:
+        """
+        Run an action on the VPS terminal pool, where the account's terminal
+        stays logged in between calls.
+        
+        Args:
+            pool_action: Pool action name (see vps_scripts/terminal_pool.py)
+            account_id: The account identifier
+            payload: Action parameters, streamed to stdin
+            action: Description used in log messages
+            
+        Returns:
+            Parsed JSON result of the action
+        """
+        script_path = f"{self.mt_scripts_dir}/pool_client.py"
+        command = f"python {script_path} --action {pool_action} --account_id {account_id} --payload -"
+        stdout, stderr = self.vps.execute_command(command, input_data=json.dumps(payload or {}))
+        
+        if stderr:
+            logger.error(f"Error {action}: {stderr}")
+            return {"success": False, "error": stderr}
+        
+        try:
+            result = json.loads(stdout)
+            return result
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse result of {action}: {stdout}")
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout}
+    
+    def list_symbols(self) -> Dict[str, Any]:
+        """
+        Get all tradable symbols from the MetaTrader terminal.
+        
+        Returns:
+            Dictionary with the list of formatted symbols
+        """
+        script_path = f"{self.mt_scripts_dir}/list_symbols.py"
+        command = f"python {script_path}"
+        stdout, stderr = self.vps.execute_command(command)
+        
+        if stderr:
+            logger.error(f"Error listing symbols: {stderr}")
+            return {"success": False, "error": stderr}
+        
+        # The script prints the symbol list, preceded by an error object on failure
+        try:
+            outputs = [json.loads(line) for line in stdout.strip().splitlines()]
+        except ValueError:
+            logger.error(f"Failed to parse symbols: {stdout[:500]}")
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout}
+        
+        for output in outputs:
+            if isinstance(output, dict):
+                return output
+        
+        return {"success": True, "symbols": outputs[-1] if outputs else []}
     
     def get_positions(self, account_id: str) -> Dict[str, Any]:
         """
@@ -310,6 +492,9 @@ class MetaTraderManager:
         Returns:
             Dictionary with positions information
         """
+        if self.use_terminal_pool:
+            return self._pool_call("positions", account_id, action="getting positions")
+        
         script_path = f"{self.mt_scripts_dir}/get_positions.py"
         command = f"python {script_path} --account_id {account_id}"
         stdout, stderr = self.vps.execute_command(command)
@@ -325,6 +510,42 @@ class MetaTraderManager:
             logger.error(f"Failed to parse positions: {stdout}")
             return {"success": False, "error": "Invalid response format", "raw_output": stdout}
     
+    def get_order_history(self, 
+                          account_id: str, 
+                          start: Optional[str] = None, 
+                          end: Optional[str] = None, 
+                          limit: int = 100) -> Dict[str, Any]:
+        """
+        List the orders placed for an account, newest first.
+        
+        Args:
+            account_id: The account identifier
+            start: Optional ISO timestamp; only orders at or after it
+            end: Optional ISO timestamp; only orders before it
+            limit: Maximum number of orders
+            
+        Returns:
+            Dictionary with an "orders" list
+        """
+        script_path = f"{self.mt_scripts_dir}/get_order_history.py"
+        command = f"python {script_path} --account_id {account_id} --limit {int(limit)}"
+        if start:
+            command += f" --start {shlex.quote(start)}"
+        if end:
+            command += f" --end {shlex.quote(end)}"
+        stdout, stderr = self.vps.execute_command(command)
+        
+        if stderr:
+            logger.error(f"Error getting order history: {stderr}")
+            return {"success": False, "error": stderr}
+        
+        try:
+            result = json.loads(stdout)
+            return result
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse order history: {stdout}")
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout}
+    
     def close_position(self, account_id: str, position_id: int) -> Dict[str, Any]:
         """
         Close a specific position.
@@ -336,6 +557,9 @@ class MetaTraderManager:
         Returns:
             Dictionary with close operation result
         """
+        if self.use_terminal_pool:
+            return self._pool_call("close_position", account_id, {"position_id": position_id}, "closing position")
+        
         script_path = f"{self.mt_scripts_dir}/close_position.py"
         command = f"python {script_path} --account_id {account_id} --position_id {position_id}"
         stdout, stderr = self.vps.execute_command(command)
@@ -349,4 +573,7 @@ class MetaTraderManager:
             return result
         except json.JSONDecodeError:
             logger.error(f"Failed to parse close result: {stdout}")
-            return {"success": False, "error": "Invalid response format", "raw_output": stdout} 
\ No newline at end of file
+            return {"success": False, "error": "Invalid response format", "raw_output": stdout} 
+
+# Trace MetaTrader operations per request (their SSH round trips are child spans)
+trace_methods(MetaTraderManager, "mt_manager")
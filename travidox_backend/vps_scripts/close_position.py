@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 """
-Script to close a position for a MetaTrader account.
+Script to close positions for a MetaTrader account.
 This script is executed on the VPS by the backend server.
 """
 
@@ -12,114 +12,189 @@ import MetaTrader5 as mt5
 from datetime import datetime
 
 # Import configuration
-from config import MT_TERMINAL_PATH, ACCOUNTS_DIR
+from mt_session import open_session
+
+def close_position_in_session(position, price=None):
+    """
+    Close one position in an already logged-in MetaTrader session.
+
+    Args:
+        position: Position dictionary (from positions_get()._asdict())
+        price: Closing price; defaults to the position's current price
+
+    Returns:
+        Dictionary with close operation result
+    """
+    position_id = position["ticket"]
+
+    # Prepare close request
+    request = {
+        "action": mt5.TRADE_ACTION_DEAL,
+        "symbol": position["symbol"],
+        "volume": position["volume"],
+        "type": mt5.ORDER_TYPE_SELL if position["type"] == 0 else mt5.ORDER_TYPE_BUY,  # Opposite direction
+        "position": int(position_id),
+        "price": price if price is not None else position["price_current"],
+        "deviation": 20,
+        "magic": 12345,
+        "comment": "Travidox close position",
+        "type_time": mt5.ORDER_TIME_GTC,
+        "type_filling": mt5.ORDER_FILLING_IOC,
+    }
+
+    # Send order
+    result = mt5.order_send(request)
+
+    if result.retcode != mt5.TRADE_RETCODE_DONE:
+        return {
+            "success": False,
+            "position_id": position_id,
+            "error": f"Close position failed: {result.comment} (Code: {result.retcode})"
+        }
+
+    return {
+        "success": True,
+        "message": f"Position {position_id} closed successfully",
+        "close_details": {
+            "order_id": result.order,
+            "position_id": position_id,
+            "symbol": position["symbol"],
+            "volume": position["volume"],
+            "price": result.price,
+            "time": datetime.now().isoformat()
+        }
+    }
+
+def matches_filter(position, side=None, profit=None):
+    """
+    Check a position against the bulk close filters.
+
+    Args:
+        position: Position dictionary
+        side: Optional "BUY" or "SELL"
+        profit: Optional "positive" or "negative"
+    """
+    if side and ("BUY" if position["type"] == 0 else "SELL") != side.upper():
+        return False
+    if profit == "positive" and position["profit"] <= 0:
+        return False
+    if profit == "negative" and position["profit"] >= 0:
+        return False
+    return True
+
+def close_positions_in_session(symbol=None, side=None, profit=None):
+    """
+    Close every open position matching the filters in an already logged-in session.
+
+    The tick of each symbol is fetched once and used for all of its positions.
+
+    Returns:
+        Dictionary with one result per closed position
+    """
+    positions = mt5.positions_get(symbol=symbol) if symbol else mt5.positions_get()
+
+    results = []
+    ticks = {}
+    for position in positions or []:
+        position = position._asdict()
+        if not matches_filter(position, side, profit):
+            continue
+
+        if position["symbol"] not in ticks:
+            ticks[position["symbol"]] = mt5.symbol_info_tick(position["symbol"])
+        tick = ticks[position["symbol"]]
+
+        # A BUY position is closed at the bid, a SELL position at the ask
+        price = None
+        if tick:
+            price = tick.bid if position["type"] == 0 else tick.ask
+
+        try:
+            results.append(close_position_in_session(position, price))
+        except Exception as e:
+            results.append({"success": False, "position_id": position["ticket"], "error": str(e)})
+
+    return {
+        "success": True,
+        "closed": sum(1 for result in results if result["success"]),
+        "results": results
+    }
 
 def close_position(account_id, position_id):
     """
     Close a position for the specified account.
-    
+
     Args:
         account_id: The account identifier
         position_id: The position identifier
-        
+
     Returns:
         Dictionary with close operation result
     """
     try:
-        # Check if the account exists
-        account_file = os.path.join(ACCOUNTS_DIR, f"{account_id}.json")
-        if not os.path.exists(account_file):
-            return {
-                "success": False,
-                "error": f"Account {account_id} not found"
-            }
-        
-        # Read account information
-        with open(account_file, 'r') as f:
-            account_info = json.load(f)
-            
-        login = account_info.get('login')
-        server = account_info.get('server')
-        
-        # Initialize MetaTrader
-        if not mt5.initialize(path=MT_TERMINAL_PATH):
-            return {
-                "success": False,
-                "error": f"Failed to initialize MetaTrader: {mt5.last_error()}"
-            }
-        
+        error = open_session(account_id)
+        if error:
+            return error
+
         try:
-            # Login to the account
-            authorized = mt5.login(
-                login=int(login),
-                server=server
-            )
-            
-            if not authorized:
-                return {
-                    "success": False,
-                    "error": f"Failed to login: {mt5.last_error()}"
-                }
-            
             # Get position info
             position = mt5.positions_get(ticket=int(position_id))
-            
+
             if not position:
                 return {
                     "success": False,
                     "error": f"Position {position_id} not found"
                 }
-            
-            position = position[0]._asdict()
-            
-            # Prepare close request
-            request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": position["symbol"],
-                "volume": position["volume"],
-                "type": mt5.ORDER_TYPE_SELL if position["type"] == 0 else mt5.ORDER_TYPE_BUY,  # Opposite direction
-                "position": int(position_id),
-                "price": position["price_current"],
-                "deviation": 20,
-                "magic": 12345,
-                "comment": "Travidox close position",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC,
-            }
-            
-            # Send order
-            result = mt5.order_send(request)
-            
-            if result.retcode != mt5.TRADE_RETCODE_DONE:
-                return {
-                    "success": False,
-                    "error": f"Close position failed: {result.comment} (Code: {result.retcode})"
-                }
-            
-            return {
-                "success": True,
-                "message": f"Position {position_id} closed successfully",
-                "close_details": {
-                    "order_id": result.order,
-                    "position_id": position_id,
-                    "symbol": position["symbol"],
-                    "volume": position["volume"],
-                    "price": result.price,
-                    "time": datetime.now().isoformat()
-                }
-            }
-            
+
+            return close_position_in_session(position[0]._asdict())
+
         finally:
             # Always shutdown MetaTrader
             mt5.shutdown()
-        
+
     except Exception as e:
         # Make sure to shutdown MetaTrader if there was an error
         try:
             mt5.shutdown()
         except:
             pass
-            
+
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def close_positions(account_id, symbol=None, side=None, profit=None):
+    """
+    Close all positions of the specified account matching the filters in one session.
+
+    Args:
+        account_id: The account identifier
+        symbol: Optional symbol filter
+        side: Optional "BUY" or "SELL" filter
+        profit: Optional "positive" or "negative" filter
+
+    Returns:
+        Dictionary with one result per closed position
+    """
+    try:
+        error = open_session(account_id)
+        if error:
+            return error
+
+        try:
+            return close_positions_in_session(symbol, side, profit)
+        finally:
+            # Always shutdown MetaTrader
+            mt5.shutdown()
+
+    except Exception as e:
+        # Make sure to shutdown MetaTrader if there was an error
+        try:
+            mt5.shutdown()
+        except:
+            pass
+
         return {
             "success": False,
             "error": str(e)
@@ -127,13 +202,21 @@ def close_position(account_id, position_id):
 
 def main():
     """Main entry point"""
-    parser = argparse.ArgumentParser(description="Close a position")
+    parser = argparse.ArgumentParser(description="Close positions")
     parser.add_argument('--account_id', required=True, help='The account identifier')
-    parser.add_argument('--position_id', required=True, help='The position identifier')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--position_id', help='The position identifier')
+    group.add_argument('--all', action='store_true', help='Close all positions matching the filters')
+    parser.add_argument('--symbol', help='Only close positions in this symbol (with --all)')
+    parser.add_argument('--side', choices=['BUY', 'SELL'], help='Only close BUY or SELL positions (with --all)')
+    parser.add_argument('--profit', choices=['positive', 'negative'], help='Only close winning or losing positions (with --all)')
     args = parser.parse_args()
-    
-    result = close_position(args.account_id, args.position_id)
+
+    if args.all:
+        result = close_positions(args.account_id, args.symbol, args.side, args.profit)
+    else:
+        result = close_position(args.account_id, args.position_id)
     print(json.dumps(result))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
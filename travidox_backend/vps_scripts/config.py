@@ -4,20 +4,49 @@ Configuration file for VPS scripts.
 This file contains paths and settings for the MetaTrader terminal.
 """
 
+import json
 import os
+import sys
 
 # Path to MetaTrader terminal (can be overridden by environment variable)
 MT_TERMINAL_PATH = os.getenv("MT_TERMINAL_PATH", "/home/your-user/.wine/drive_c/Program Files/MetaTrader 5")
 
+# Terminals used by the terminal pool (separated by os.pathsep); defaults to the single terminal above
+MT_TERMINAL_PATHS = [path for path in os.getenv("MT_TERMINAL_PATHS", "").split(os.pathsep) if path] or [MT_TERMINAL_PATH]
+
+# Address and key of the terminal pool daemon (terminal_pool.py); the key has
+# no default and must be set for both the daemon and pool_client.py
+POOL_ADDRESS = (os.getenv("MT_POOL_HOST", "127.0.0.1"), int(os.getenv("MT_POOL_PORT", "6789")))
+POOL_AUTHKEY = os.getenv("MT_POOL_AUTHKEY", "").encode()
+
 # Path to store account information
 ACCOUNTS_DIR = os.path.expanduser("~/mt_accounts")
 
 # Path to store order information
 ORDERS_DIR = os.path.expanduser("~/mt_orders")
 
+# Account and order registry (SQLite); replaces the per-record JSON files above,
+# which are only read once to import data from older installs
+REGISTRY_PATH = os.path.expanduser(os.getenv("MT_REGISTRY_PATH", "~/mt_registry.db"))
+
 # Ensure directories exist
 def ensure_directories():
     """Ensure required directories exist"""
     for directory in [ACCOUNTS_DIR, ORDERS_DIR]:
         if not os.path.exists(directory):
-            os.makedirs(directory) 
\ No newline at end of file
+            os.makedirs(directory)
+
+def load_payload(path):
+    """
+    Load a JSON payload passed to a script.
+
+    Args:
+        path: Path to a JSON file, or "-" to read the payload from stdin
+
+    Returns:
+        The decoded payload
+    """
+    if path == "-":
+        return json.load(sys.stdin)
+    with open(path, 'r') as f:
+        return json.load(f)
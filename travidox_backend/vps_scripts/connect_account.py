@@ -14,25 +14,22 @@ from datetime import datetime
 import MetaTrader5 as mt5
 
 # Import configuration
-from config import MT_TERMINAL_PATH, ACCOUNTS_DIR, ensure_directories
+from config import MT_TERMINAL_PATH, load_payload
+from registry import get_registry
 
 def connect_account(config_file):
     """
     Connect to a MetaTrader account using the provided configuration.
     
     Args:
-        config_file: Path to the JSON configuration file
+        config_file: Path to the JSON configuration file, or "-" for stdin
         
     Returns:
         Dictionary with connection result
     """
     try:
-        # Ensure directories exist
-        ensure_directories()
-        
-        # Read the configuration file
-        with open(config_file, 'r') as f:
-            config = json.load(f)
+        # Read the configuration
+        config = load_payload(config_file)
         
         # Extract account details
         login = config.get('login')
@@ -102,9 +99,7 @@ def connect_account(config_file):
         }
         
         # Save the account information (excluding the password)
-        account_file = os.path.join(ACCOUNTS_DIR, f"{account_id}.json")
-        with open(account_file, 'w') as f:
-            json.dump(account_info, f)
+        get_registry().save_account(account_info)
         
         # Shutdown MetaTrader
         mt5.shutdown()
@@ -133,7 +128,7 @@ def connect_account(config_file):
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="Connect to a MetaTrader account")
-    parser.add_argument('--config', required=True, help='Path to the account configuration JSON file')
+    parser.add_argument('--config', required=True, help='Path to the account configuration JSON file, or - to read it from stdin')
     args = parser.parse_args()
     
     result = connect_account(args.config)
@@ -11,7 +11,65 @@ import sys
 import MetaTrader5 as mt5
 
 # Import configuration
-from config import MT_TERMINAL_PATH, ACCOUNTS_DIR
+from mt_session import open_session
+from registry import get_registry
+
+def get_account_info_in_session(account_id):
+    """
+    Get the account information in an already logged-in MetaTrader session
+    and update the stored account with it.
+    
+    Args:
+        account_id: The account identifier
+        
+    Returns:
+        Dictionary with account information
+    """
+    registry = get_registry()
+    stored_account_info = registry.get_account(account_id)
+    if not stored_account_info:
+        return {
+            "success": False,
+            "error": f"Account {account_id} not found"
+        }
+    
+    # Get account information
+    account_info = mt5.account_info()
+    
+    if not account_info:
+        return {
+            "success": False,
+            "error": f"Failed to get account info: {mt5.last_error()}"
+        }
+    
+    # Convert account info to dictionary
+    account_info_dict = account_info._asdict()
+    
+    # Update the stored account info with the latest data
+    updated_account_info = {
+        "id": account_id,
+        "login": stored_account_info.get('login'),
+        "server": stored_account_info.get('server'),
+        "platform": stored_account_info.get('platform', 'mt5'),
+        "name": account_info_dict.get('name', stored_account_info.get('name', 'Unknown')),
+        "currency": account_info_dict.get('currency', stored_account_info.get('currency', 'USD')),
+        "leverage": account_info_dict.get('leverage', stored_account_info.get('leverage', 100)),
+        "balance": account_info_dict.get('balance', 0.0),
+        "equity": account_info_dict.get('equity', 0.0),
+        "margin": account_info_dict.get('margin', 0.0),
+        "free_margin": account_info_dict.get('margin_free', 0.0),
+        "margin_level": account_info_dict.get('margin_level', 0.0),
+        "connected_at": stored_account_info.get('connected_at'),
+        "status": "connected"
+    }
+    
+    # Save the updated account information
+    registry.save_account(updated_account_info)
+    
+    return {
+        "success": True,
+        "account": updated_account_info
+    }
 
 def get_account_info(account_id):
     """
@@ -24,80 +82,12 @@ def get_account_info(account_id):
         Dictionary with account information
     """
     try:
-        # Check if the account exists
-        account_file = os.path.join(ACCOUNTS_DIR, f"{account_id}.json")
-        if not os.path.exists(account_file):
-            return {
-                "success": False,
-                "error": f"Account {account_id} not found"
-            }
-        
-        # Read the account information from file
-        with open(account_file, 'r') as f:
-            stored_account_info = json.load(f)
-        
-        login = stored_account_info.get('login')
-        server = stored_account_info.get('server')
-        
-        # Initialize MetaTrader
-        if not mt5.initialize(path=MT_TERMINAL_PATH):
-            return {
-                "success": False,
-                "error": f"Failed to initialize MetaTrader: {mt5.last_error()}"
-            }
+        error = open_session(account_id)
+        if error:
+            return error
         
         try:
-            # Login to the account
-            authorized = mt5.login(
-                login=int(login),
-                server=server
-            )
-            
-            if not authorized:
-                return {
-                    "success": False,
-                    "error": f"Failed to login: {mt5.last_error()}"
-                }
-            
-            # Get account information
-            account_info = mt5.account_info()
-            
-            if not account_info:
-                return {
-                    "success": False,
-                    "error": f"Failed to get account info: {mt5.last_error()}"
-                }
-            
-            # Convert account info to dictionary
-            account_info_dict = account_info._asdict()
-            
-            # Update the stored account info with the latest data
-            updated_account_info = {
-                "id": account_id,
-                "login": login,
-                "server": server,
-                "platform": stored_account_info.get('platform', 'mt5'),
-                "name": account_info_dict.get('name', stored_account_info.get('name', 'Unknown')),
-                "currency": account_info_dict.get('currency', stored_account_info.get('currency', 'USD')),
-                "leverage": account_info_dict.get('leverage', stored_account_info.get('leverage', 100)),
-                "balance": account_info_dict.get('balance', 0.0),
-                "equity": account_info_dict.get('equity', 0.0),
-                "margin": account_info_dict.get('margin', 0.0),
-                "free_margin": account_info_dict.get('margin_free', 0.0),
-                "margin_level": account_info_dict.get('margin_level', 0.0),
-                "connected_at": stored_account_info.get('connected_at'),
-                "status": "connected"
-            }
-            
-            # Save the updated account information
-            with open(account_file, 'w') as f:
-                json.dump(updated_account_info, f)
-            
-            return {
-                "success": True,
-                "account": updated_account_info
-            }
-            
+            return get_account_info_in_session(account_id)
         finally:
             # Always shutdown MetaTrader
             mt5.shutdown()
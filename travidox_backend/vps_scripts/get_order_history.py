@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Script to list the filled orders of a connected MetaTrader account.
+This script is executed on the VPS by the backend server.
+"""
+
+import argparse
+import json
+
+# Import configuration
+from registry import get_registry
+
+def get_order_history(account_id, start=None, end=None, limit=100):
+    """
+    List the orders placed through Travidox for an account, newest first.
+
+    Args:
+        account_id: The account identifier
+        start: Optional ISO timestamp; only orders at or after it
+        end: Optional ISO timestamp; only orders before it
+        limit: Maximum number of orders
+
+    Returns:
+        Dictionary with the orders
+    """
+    try:
+        registry = get_registry()
+        if not registry.get_account(account_id):
+            return {
+                "success": False,
+                "error": f"Account {account_id} not found"
+            }
+
+        return {
+            "success": True,
+            "orders": registry.list_orders(account_id, start, end, limit)
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="List order history")
+    parser.add_argument('--account_id', required=True, help='The account identifier')
+    parser.add_argument('--start', help='Only orders at or after this ISO timestamp')
+    parser.add_argument('--end', help='Only orders before this ISO timestamp')
+    parser.add_argument('--limit', type=int, default=100, help='Maximum number of orders')
+    args = parser.parse_args()
+
+    result = get_order_history(args.account_id, args.start, args.end, args.limit)
+    print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
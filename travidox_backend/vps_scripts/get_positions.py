@@ -12,7 +12,50 @@ import MetaTrader5 as mt5
 from datetime import datetime
 
 # Import configuration
-from config import MT_TERMINAL_PATH, ACCOUNTS_DIR
+from mt_session import open_session
+
+def get_positions_in_session():
+    """
+    Get the open positions in an already logged-in MetaTrader session.
+    
+    Returns:
+        Dictionary with positions information
+    """
+    # Get all positions
+    positions = mt5.positions_get()
+    
+    if positions is None:
+        return {
+            "success": True,
+            "positions": []
+        }
+    
+    # Format positions
+    formatted_positions = []
+    for position in positions:
+        pos_dict = position._asdict()
+        
+        # Convert timestamp to ISO format
+        time_open = datetime.fromtimestamp(pos_dict["time"]).isoformat() if pos_dict["time"] else None
+        
+        formatted_positions.append({
+            "position_id": pos_dict["ticket"],
+            "symbol": pos_dict["symbol"],
+            "type": "BUY" if pos_dict["type"] == 0 else "SELL",
+            "volume": pos_dict["volume"],
+            "open_price": pos_dict["price_open"],
+            "current_price": pos_dict["price_current"],
+            "open_time": time_open,
+            "profit": pos_dict["profit"],
+            "swap": pos_dict["swap"],
+            "stop_loss": pos_dict["sl"],
+            "take_profit": pos_dict["tp"]
+        })
+    
+    return {
+        "success": True,
+        "positions": formatted_positions
+    }
 
 def get_positions(account_id):
     """
@@ -25,77 +68,12 @@ def get_positions(account_id):
         Dictionary with positions information
     """
     try:
-        # Check if the account exists
-        account_file = os.path.join(ACCOUNTS_DIR, f"{account_id}.json")
-        if not os.path.exists(account_file):
-            return {
-                "success": False,
-                "error": f"Account {account_id} not found"
-            }
-        
-        # Read account information
-        with open(account_file, 'r') as f:
-            account_info = json.load(f)
-            
-        login = account_info.get('login')
-        server = account_info.get('server')
-        
-        # Initialize MetaTrader
-        if not mt5.initialize(path=MT_TERMINAL_PATH):
-            return {
-                "success": False,
-                "error": f"Failed to initialize MetaTrader: {mt5.last_error()}"
-            }
+        error = open_session(account_id)
+        if error:
+            return error
         
         try:
-            # Login to the account
-            authorized = mt5.login(
-                login=int(login),
-                server=server
-            )
-            
-            if not authorized:
-                return {
-                    "success": False,
-                    "error": f"Failed to login: {mt5.last_error()}"
-                }
-            
-            # Get all positions
-            positions = mt5.positions_get()
-            
-            if positions is None:
-                return {
-                    "success": True,
-                    "positions": []
-                }
-            
-            # Format positions
-            formatted_positions = []
-            for position in positions:
-                pos_dict = position._asdict()
-                
-                # Convert timestamp to ISO format
-                time_open = datetime.fromtimestamp(pos_dict["time"]).isoformat() if pos_dict["time"] else None
-                
-                formatted_positions.append({
-                    "position_id": pos_dict["ticket"],
-                    "symbol": pos_dict["symbol"],
-                    "type": "BUY" if pos_dict["type"] == 0 else "SELL",
-                    "volume": pos_dict["volume"],
-                    "open_price": pos_dict["price_open"],
-                    "current_price": pos_dict["price_current"],
-                    "open_time": time_open,
-                    "profit": pos_dict["profit"],
-                    "swap": pos_dict["swap"],
-                    "stop_loss": pos_dict["sl"],
-                    "take_profit": pos_dict["tp"]
-                })
-            
-            return {
-                "success": True,
-                "positions": formatted_positions
-            }
-            
+            return get_positions_in_session()
         finally:
             # Always shutdown MetaTrader
             mt5.shutdown()
@@ -11,6 +11,7 @@ import MetaTrader5 as mt5
 
 # Import configuration
 from config import MT_TERMINAL_PATH
+from symbol_classifier import classify_symbol
 
 def get_symbols():
     """
@@ -45,17 +46,8 @@ def get_symbols():
                     continue
                 
                 # Determine category based on symbol name
-                category = "other"
                 name = symbol_dict.get('name', '').upper()
-                
-                if any(pair in name for pair in ['USD', 'EUR', 'GBP', 'JPY', 'AUD', 'NZD', 'CAD', 'CHF']):
-                    category = "forex"
-                elif any(crypto in name for crypto in ['BTC', 'ETH', 'LTC', 'XRP']):
-                    category = "crypto"
-                elif any(metal in name for metal in ['GOLD', 'SILVER', 'XAU', 'XAG']):
-                    category = "commodity"
-                elif any(index in name for index in ['SPX', 'NDX', 'DJI', 'DAX', 'FTSE']):
-                    category = "index"
+                category = classify_symbol(name)
                 
                 # Extract base and profit currencies if available
                 base_currency = symbol_dict.get('currency_base', '')
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+MetaTrader session helper shared by the VPS scripts.
+"""
+
+import MetaTrader5 as mt5
+
+# Import configuration
+from config import MT_TERMINAL_PATH
+from registry import get_registry
+
+def login_account(account_id):
+    """
+    Log an already initialized terminal in to a connected account.
+
+    Args:
+        account_id: The account identifier
+
+    Returns:
+        None on success, or a dictionary with the error
+    """
+    # Look up the account
+    account_info = get_registry().get_account(account_id)
+    if not account_info:
+        return {
+            "success": False,
+            "error": f"Account {account_id} not found"
+        }
+
+    # Login to the account
+    authorized = mt5.login(
+        login=int(account_info.get('login')),
+        server=account_info.get('server')
+    )
+
+    if not authorized:
+        return {
+            "success": False,
+            "error": f"Failed to login: {mt5.last_error()}"
+        }
+
+    return None
+
+def ensure_login(account_id):
+    """
+    Make sure an initialized terminal is logged in to a connected account.
+
+    The terminal may have been switched to another account since it was last
+    used (e.g. by a one-shot script using the same terminal), so the current
+    login is checked and the account logged in again if it differs.
+
+    Args:
+        account_id: The account identifier
+
+    Returns:
+        None on success, or a dictionary with the error
+    """
+    account_info = get_registry().get_account(account_id)
+    if not account_info:
+        return {
+            "success": False,
+            "error": f"Account {account_id} not found"
+        }
+
+    current = mt5.account_info()
+    if current is not None and current.login == int(account_info.get('login')) and current.server == account_info.get('server'):
+        return None
+
+    return login_account(account_id)
+
+def open_session(account_id, terminal_path=MT_TERMINAL_PATH):
+    """
+    Initialize MetaTrader and log in to a connected account.
+
+    Args:
+        account_id: The account identifier
+        terminal_path: Path to the MetaTrader terminal to start
+
+    Returns:
+        None on success, or a dictionary with the error
+    """
+    if not get_registry().get_account(account_id):
+        return {
+            "success": False,
+            "error": f"Account {account_id} not found"
+        }
+
+    # Initialize MetaTrader
+    if not mt5.initialize(path=terminal_path):
+        return {
+            "success": False,
+            "error": f"Failed to initialize MetaTrader: {mt5.last_error()}"
+        }
+
+    error = login_account(account_id)
+    if error:
+        mt5.shutdown()
+    return error
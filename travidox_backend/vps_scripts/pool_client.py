@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Script to send a request to the terminal pool (terminal_pool.py).
+This script is executed on the VPS by the backend server.
+"""
+
+import argparse
+import json
+from multiprocessing.connection import Client
+
+# Import configuration
+from config import POOL_ADDRESS, POOL_AUTHKEY, load_payload
+
+def call_pool(account_id, action, payload=None):
+    """
+    Run an action for an account on the terminal pool.
+
+    Args:
+        account_id: The account identifier
+        action: Pool action (account_info, positions, snapshot, place_order,
+            place_orders, close_position, close_positions or stats)
+        payload: Action parameters
+
+    Returns:
+        Dictionary with the action result
+    """
+    if not POOL_AUTHKEY:
+        return {
+            "success": False,
+            "error": "MT_POOL_AUTHKEY is not set"
+        }
+
+    try:
+        conn = Client(POOL_ADDRESS, authkey=POOL_AUTHKEY)
+    except OSError as e:
+        return {
+            "success": False,
+            "error": f"Terminal pool is not running: {e}"
+        }
+
+    try:
+        conn.send({"account_id": account_id, "action": action, "payload": payload or {}})
+        return conn.recv()
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        conn.close()
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Send a request to the terminal pool")
+    parser.add_argument('--action', required=True, help='The pool action')
+    parser.add_argument('--account_id', help='The account identifier')
+    parser.add_argument('--payload', help='Path to the action parameters JSON file, or - for stdin')
+    args = parser.parse_args()
+
+    payload = load_payload(args.payload) if args.payload else None
+    result = call_pool(args.account_id, args.action, payload)
+    print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Indexed registry of connected accounts and filled orders on the VPS.
+
+Accounts and orders are stored in one SQLite database instead of one JSON
+file per record, so account lookups are a primary key read and order
+history can be queried by account and time range through an index. Order
+times are indexed in UTC (naive timestamps are taken as the VPS's local
+time), so range filters compare correctly whatever offset either side uses.
+Legacy ~/mt_accounts and ~/mt_orders files are imported on first use.
+"""
+
+import glob
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+# Import configuration
+from config import REGISTRY_PATH, ACCOUNTS_DIR, ORDERS_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    time TEXT NOT NULL,
+    symbol TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_by_account_time ON orders (account_id, time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def to_utc(timestamp):
+    """
+    Normalize an ISO timestamp to a sortable UTC string.
+
+    Args:
+        timestamp: ISO timestamp, with or without an offset (naive means local time)
+
+    Returns:
+        The timestamp as YYYY-MM-DDTHH:MM:SS.ffffff+00:00
+    """
+    value = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+class Registry:
+    """SQLite-backed account and order store"""
+
+    def __init__(self, path=REGISTRY_PATH):
+        """
+        Open (and create if needed) the registry.
+
+        Args:
+            path: Path to the SQLite database file
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.conn = sqlite3.connect(path, timeout=10)
+        # WAL lets concurrent script runs read while one of them writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.import_legacy_files()
+        self.normalize_order_times()
+
+    def get_account(self, account_id):
+        """
+        Get a connected account.
+
+        Returns:
+            The account dictionary, or None if the account is unknown
+        """
+        row = self.conn.execute("SELECT data FROM accounts WHERE id = ?", (account_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_account(self, account):
+        """Insert or replace an account (dictionary with an "id")"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO accounts (id, data, updated_at) VALUES (?, ?, ?)",
+                (account["id"], json.dumps(account), datetime.now().isoformat())
+            )
+
+    def save_order(self, order):
+        """Insert or replace a filled order (dictionary with "order_id", "account_id" and "time")"""
+        with self.conn:
+            self._insert_order(order)
+
+    def list_orders(self, account_id, start=None, end=None, limit=100):
+        """
+        List an account's orders, newest first.
+
+        Args:
+            account_id: The account identifier
+            start: Optional ISO timestamp; only orders at or after it
+            end: Optional ISO timestamp; only orders before it
+            limit: Maximum number of orders
+
+        Returns:
+            List of order dictionaries
+        """
+        query = "SELECT data FROM orders WHERE account_id = ?"
+        params = [account_id]
+        if start:
+            query += " AND time >= ?"
+            params.append(to_utc(start))
+        if end:
+            query += " AND time < ?"
+            params.append(to_utc(end))
+        query += " ORDER BY time DESC LIMIT ?"
+        params.append(int(limit))
+
+        return [json.loads(row[0]) for row in self.conn.execute(query, params)]
+
+    def import_legacy_files(self):
+        """Import the per-record JSON files written by older scripts (runs once)"""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+
+        with self.conn:
+            for account_file in glob.glob(os.path.join(ACCOUNTS_DIR, "*.json")):
+                try:
+                    with open(account_file, 'r') as f:
+                        account = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                account.setdefault("id", os.path.splitext(os.path.basename(account_file))[0])
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO accounts (id, data, updated_at) VALUES (?, ?, ?)",
+                    (account["id"], json.dumps(account), account.get("connected_at") or datetime.now().isoformat())
+                )
+
+            for order_file in glob.glob(os.path.join(ORDERS_DIR, "*.json")):
+                try:
+                    with open(order_file, 'r') as f:
+                        order = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if order.get("order_id") is not None and order.get("account_id"):
+                    self._insert_order(order)
+
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                              (datetime.now().isoformat(),))
+
+    def normalize_order_times(self):
+        """Convert the indexed times of orders saved by older versions to UTC (runs once)"""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'order_times_utc'").fetchone():
+            return
+
+        with self.conn:
+            for order_id, time in self.conn.execute("SELECT order_id, time FROM orders").fetchall():
+                try:
+                    normalized = to_utc(time)
+                except ValueError:
+                    continue
+                self.conn.execute("UPDATE orders SET time = ? WHERE order_id = ?", (normalized, order_id))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('order_times_utc', ?)",
+                              (datetime.now().isoformat(),))
+
+    def _insert_order(self, order):
+        """Write an order row (caller manages the transaction)"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO orders (order_id, account_id, time, symbol, data) VALUES (?, ?, ?, ?, ?)",
+            (int(order["order_id"]), order["account_id"], to_utc(order.get("time") or datetime.now().isoformat()),
+             order.get("symbol"), json.dumps(order))
+        )
+
+_registry = None
+
+def get_registry():
+    """Get the registry of this process (opened on first use)"""
+    global _registry
+    if _registry is None:
+        _registry = Registry()
+    return _registry
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Symbol classifier shared by the backend and the VPS scripts.
+Assigns each MetaTrader symbol to a category based on keywords in its name.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+# Keywords per category, in priority order: a symbol matching keywords from
+# several categories gets the first one (e.g. "XAUUSD" is classified as forex)
+CATEGORY_KEYWORDS = [
+    ("forex", ['USD', 'EUR', 'GBP', 'JPY', 'AUD', 'CAD', 'CHF', 'NZD']),
+    ("crypto", ['BTC', 'ETH', 'LTC', 'XRP', 'DOGE']),
+    ("index", ['SPX', 'NDX', 'DJI', 'UK100', 'DE30', 'JP225', 'DAX', 'FTSE']),
+    ("commodity", ['GOLD', 'SILVER', 'OIL', 'GAS', 'XAU', 'XAG']),
+    ("stock", ['VOL', 'AAPL', 'MSFT', 'GOOGL', 'AMZN']),
+]
+
+CATEGORIES = [category for category, _ in CATEGORY_KEYWORDS] + ["other"]
+
+# Rank of every keyword (index into CATEGORIES)
+_KEYWORD_RANK = {
+    keyword: rank
+    for rank, (_, keywords) in enumerate(CATEGORY_KEYWORDS)
+    for keyword in keywords
+}
+
+# A single lookahead alternation finds every keyword occurrence, including
+# overlapping ones, in one scan of the name
+_KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(sorted(map(re.escape, _KEYWORD_RANK), key=len, reverse=True)) + "))"
+)
+
+_OTHER_RANK = len(CATEGORIES) - 1
+
+@lru_cache(maxsize=65536)
+def classify_symbol(name: str) -> str:
+    """
+    Get the category of a symbol.
+
+    Args:
+        name: Symbol name (e.g. "EURUSD")
+
+    Returns:
+        One of 'forex', 'crypto', 'index', 'commodity', 'stock' or 'other'
+    """
+    best = _OTHER_RANK
+    for match in _KEYWORD_PATTERN.finditer(name.upper()):
+        rank = _KEYWORD_RANK[match.group(1)]
+        if rank < best:
+            best = rank
+            if best == 0:
+                break
+    return CATEGORIES[best]
+
+def classify_symbols(names: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Group symbol names by category in a single pass.
+
+    Args:
+        names: Symbol names
+
+    Returns:
+        Dictionary mapping each category to its symbol names
+    """
+    groups = {category: [] for category in CATEGORIES}
+    for name in names:
+        groups[classify_symbol(name)].append(name)
+    return groups
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Pool of logged-in MetaTrader terminals on the VPS.
+
+A MetaTrader terminal can only be logged in to one account at a time, so the
+one-shot scripts initialize and log in on every call. This daemon keeps one
+worker process per terminal in MT_TERMINAL_PATHS, each staying initialized
+and logged in to the account it last served. Accounts are assigned to
+terminals with LRU eviction and requests are routed to the account's
+terminal, so repeat calls for an active account skip login and different
+accounts are served in parallel. Before every action the worker checks the
+terminal's current login, since one-shot scripts (connect_account.py,
+list_symbols.py) may have switched a shared terminal to another account.
+
+Run it once on the VPS (python terminal_pool.py) and call it through
+pool_client.py.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Listener
+
+# Import configuration
+from config import MT_TERMINAL_PATHS, POOL_ADDRESS, POOL_AUTHKEY
+
+def run_action(account_id, action, payload):
+    """
+    Run one action in the worker's logged-in session.
+
+    Args:
+        account_id: The account the session is logged in to
+        action: Action name (see the branches below)
+        payload: Action parameters
+
+    Returns:
+        Dictionary with the action result
+    """
+    import MetaTrader5 as mt5
+    from get_account_info import get_account_info_in_session
+    from get_positions import get_positions_in_session
+    from place_market_order import send_market_order
+    from close_position import close_position_in_session, close_positions_in_session
+
+    if action == "account_info":
+        return get_account_info_in_session(account_id)
+    if action == "positions":
+        return get_positions_in_session()
+    if action == "snapshot":
+        account_result = get_account_info_in_session(account_id)
+        if not account_result.get("success", False):
+            return account_result
+        return {
+            "success": True,
+            "account": account_result["account"],
+            "positions": get_positions_in_session()["positions"]
+        }
+    if action == "place_order":
+        return send_market_order(account_id, payload)
+    if action == "place_orders":
+        results = []
+        for order_params in payload.get("orders") or []:
+            try:
+                results.append(send_market_order(account_id, order_params))
+            except Exception as e:
+                results.append({"success": False, "error": str(e)})
+        return {"success": True, "results": results}
+    if action == "close_position":
+        position = mt5.positions_get(ticket=int(payload["position_id"]))
+        if not position:
+            return {"success": False, "error": f"Position {payload['position_id']} not found"}
+        return close_position_in_session(position[0]._asdict())
+    if action == "close_positions":
+        return close_positions_in_session(payload.get("symbol"), payload.get("side"), payload.get("profit"))
+
+    return {"success": False, "error": f"Unknown action: {action}"}
+
+def terminal_worker(terminal_path, conn):
+    """
+    Worker process owning one MetaTrader terminal.
+
+    The terminal is initialized once and stays logged in to the last account
+    it served; it only logs in again when the terminal is logged in to
+    another account (checked before every action).
+    """
+    import MetaTrader5 as mt5
+    from mt_session import ensure_login
+
+    initialized = False
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+
+        account_id = request["account_id"]
+        try:
+            if not initialized:
+                if not mt5.initialize(path=terminal_path):
+                    conn.send({"success": False, "error": f"Failed to initialize MetaTrader: {mt5.last_error()}"})
+                    continue
+                initialized = True
+
+            error = ensure_login(account_id)
+            if error:
+                conn.send(error)
+                continue
+
+            conn.send(run_action(account_id, request["action"], request.get("payload") or {}))
+        except Exception as e:
+            conn.send({"success": False, "error": str(e)})
+
+    if initialized:
+        mt5.shutdown()
+
+class Terminal:
+    """Handle on one terminal worker process"""
+
+    def __init__(self, index, path):
+        self.index = index
+        self.path = path
+        self.account_id = None
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.last_used = None
+        self.start()
+
+    def start(self):
+        """Start (or restart) the worker process"""
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=terminal_worker, args=(self.path, child_conn), daemon=True)
+        self.process.start()
+
+    def call(self, account_id, action, payload):
+        """Send a request to the worker and wait for its result (caller holds the lock)"""
+        self.requests += 1
+        self.last_used = time.time()
+        try:
+            self.conn.send({"account_id": account_id, "action": action, "payload": payload})
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            # The worker died (e.g. the terminal crashed); start a fresh one
+            self.process.kill()
+            self.start()
+            return {"success": False, "error": f"Terminal worker failed: {e}"}
+
+class TerminalPool:
+    """Routes account requests to terminals with LRU account assignment"""
+
+    def __init__(self, terminal_paths=MT_TERMINAL_PATHS):
+        """
+        Start one worker per terminal.
+
+        Args:
+            terminal_paths: Paths of the MetaTrader terminals to use
+        """
+        self.terminals = [Terminal(index, path) for index, path in enumerate(terminal_paths)]
+        self._assignments = OrderedDict()  # account_id -> Terminal, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def terminal_for(self, account_id):
+        """Get the terminal assigned to an account, assigning one if needed"""
+        with self._lock:
+            terminal = self._assignments.get(account_id)
+            if terminal is not None:
+                self._assignments.move_to_end(account_id)
+                self.hits += 1
+                return terminal
+
+            self.misses += 1
+            idle = [terminal for terminal in self.terminals if terminal.account_id is None]
+            if idle:
+                terminal = idle[0]
+            else:
+                # Take over the terminal of the least recently used account
+                evicted_account, terminal = self._assignments.popitem(last=False)
+                self.evictions += 1
+
+            terminal.account_id = account_id
+            self._assignments[account_id] = terminal
+            return terminal
+
+    def call(self, account_id, action, payload=None):
+        """
+        Run an action for an account on its terminal.
+
+        Requests for the same terminal run one at a time; different terminals
+        run in parallel. If the terminal is reassigned while a request waits,
+        the worker simply logs in to the request's account again.
+        """
+        terminal = self.terminal_for(account_id)
+        with terminal.lock:
+            return terminal.call(account_id, action, payload or {})
+
+    def stats(self):
+        """Get pool metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "success": True,
+            "terminals": [
+                {
+                    "index": terminal.index,
+                    "path": terminal.path,
+                    "account_id": terminal.account_id,
+                    "requests": terminal.requests,
+                    "last_used": terminal.last_used,
+                    "busy": terminal.lock.locked()
+                }
+                for terminal in self.terminals
+            ],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+def handle_client(pool, conn):
+    """Serve the requests of one client connection"""
+    try:
+        while True:
+            request = conn.recv()
+            if request.get("action") == "stats":
+                conn.send(pool.stats())
+            else:
+                conn.send(pool.call(request["account_id"], request["action"], request.get("payload")))
+    except EOFError:
+        pass
+    finally:
+        conn.close()
+
+def serve(pool, address=POOL_ADDRESS, authkey=POOL_AUTHKEY):
+    """Accept client connections forever"""
+    listener = Listener(address, authkey=authkey)
+    print(json.dumps({"success": True, "message": f"Terminal pool listening on {address[0]}:{address[1]}",
+                      "terminals": len(pool.terminals)}), flush=True)
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception:
+            # Failed handshake (e.g. wrong auth key)
+            continue
+        threading.Thread(target=handle_client, args=(pool, conn), daemon=True).start()
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Run the MetaTrader terminal pool")
+    parser.parse_args()
+
+    if not POOL_AUTHKEY:
+        print(json.dumps({"success": False, "error": "MT_POOL_AUTHKEY is not set"}), flush=True)
+        sys.exit(1)
+
+    serve(TerminalPool())
+
+if __name__ == "__main__":
+    main()